@@ -0,0 +1,121 @@
+from django.contrib import admin, messages
+from django.http import FileResponse, Http404
+from django.shortcuts import render
+from django.utils import timezone
+
+from . import memory, outbox, profiling
+from .models import OutgoingEmail, Task
+from .paginator import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список объектов без точного COUNT(*) по всей таблице и без
+    глубокого OFFSET по полным строкам.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+def retry_tasks(modeladmin, request, queryset):
+    count = queryset.filter(status=Task.FAILED).update(
+        status=Task.QUEUED, attempts=0, run_at=timezone.now(),
+        finished=None, locked_until=None)
+    modeladmin.message_user(request, f'Снова в очереди: {count}',
+                            messages.SUCCESS)
+
+
+retry_tasks.short_description = 'Повторить упавшие задачи'
+
+
+class TaskAdmin(LargeTableAdmin):
+    list_display = ('pk', 'name', 'status', 'priority', 'attempts',
+                    'run_at', 'worker', 'created', 'finished')
+    list_filter = ('status', 'name')
+    search_fields = ('key',)
+    readonly_fields = ('name', 'payload', 'priority', 'status', 'key',
+                       'attempts', 'max_attempts', 'run_at',
+                       'locked_until', 'worker', 'error', 'created',
+                       'finished')
+    actions = (retry_tasks,)
+
+    def has_add_permission(self, request):
+        return False
+
+
+def resend_emails(modeladmin, request, queryset):
+    count = queryset.filter(status=OutgoingEmail.FAILED).update(
+        status=OutgoingEmail.QUEUED, attempts=0)
+    if count:
+        outbox.schedule_delivery(urgent=True)
+    modeladmin.message_user(request, f'Снова в очереди: {count}',
+                            messages.SUCCESS)
+
+
+resend_emails.short_description = 'Отправить заново'
+
+
+class OutgoingEmailAdmin(LargeTableAdmin):
+    list_display = ('pk', 'to', 'subject', 'status', 'attempts', 'created',
+                    'sent')
+    list_filter = ('status',)
+    search_fields = ('to',)
+    readonly_fields = ('to', 'from_email', 'subject', 'body', 'html_body',
+                       'priority', 'status', 'attempts', 'error', 'batch',
+                       'claimed', 'created', 'sent')
+    actions = (resend_emails,)
+
+    def has_add_permission(self, request):
+        return False
+
+
+def profile_list(request):
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Профили запросов',
+        'profiles': profiling.list_profiles(),
+    }
+    return render(request, 'admin/core/profile_list.html', context)
+
+
+def profile_detail(request, name):
+    sort = request.GET.get('sort', 'cumulative')
+    if sort not in ('cumulative', 'tottime', 'ncalls'):
+        sort = 'cumulative'
+    try:
+        stats = profiling.format_stats(name, sort)
+    except (OSError, ValueError):
+        raise Http404
+    context = {
+        **admin.site.each_context(request),
+        'title': f'Профиль {name}',
+        'name': name,
+        'sort': sort,
+        'stats': stats,
+    }
+    return render(request, 'admin/core/profile_detail.html', context)
+
+
+def profile_download(request, name, kind):
+    try:
+        suffix = {'stats': profiling.STATS_SUFFIX,
+                  'stacks': profiling.STACKS_SUFFIX}[kind]
+        path = profiling.get_profile_path(name, suffix)
+        return FileResponse(open(path, 'rb'), as_attachment=True,
+                            filename=name + suffix)
+    except (KeyError, OSError, ValueError):
+        raise Http404
+
+
+def memory_report(request):
+    reports = memory.load_reports()
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Память по представлениям и командам',
+        'summary': memory.summarize(reports),
+        'reports': reports[:20],
+    }
+    return render(request, 'admin/core/memory.html', context)
+
+
+admin.site.register(Task, TaskAdmin)
+admin.site.register(OutgoingEmail, OutgoingEmailAdmin)
@@ -0,0 +1,114 @@
+import hashlib
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django.template.backends.base import BaseEngine
+from django.template.backends.django import DjangoTemplates, Template
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.images import ImageFile
+
+from .metrics import registry
+from .template_timing import TimedEngine, record
+
+MISSING = object()
+_local = threading.local()
+
+
+class InstrumentedLocMemCache(LocMemCache):
+    """LocMemCache, считающий попадания и промахи. get_many базового
+    класса вызывает get, поэтому учитывается и он.
+    """
+
+    def get(self, key, default=None, version=None):
+        value = super().get(key, MISSING, version)
+        registry.inc('yatube_cache_requests_total',
+                     result='miss' if value is MISSING else 'hit')
+        return default if value is MISSING else value
+
+
+class InstrumentedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            seconds = time.perf_counter() - started
+            name = self.template.origin.template_name or '<string>'
+            registry.observe('yatube_template_render_seconds', seconds,
+                             template=name)
+            record(f'template {name}', seconds)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Шаблонизатор Django, замеряющий время рендеринга шаблона,
+    переданного в render(), а при TEMPLATE_TIMING ещё и время include
+    и тегов внутри него.
+    """
+
+    def __init__(self, params):
+        # Повторяет DjangoTemplates.__init__, но создаёт TimedEngine.
+        params = params.copy()
+        options = params.pop('OPTIONS').copy()
+        options.setdefault('autoescape', True)
+        options.setdefault('debug', settings.DEBUG)
+        options.setdefault('file_charset', 'utf-8')
+        libraries = options.get('libraries', {})
+        options['libraries'] = self.get_templatetag_libraries(libraries)
+        BaseEngine.__init__(self, params)
+        self.engine = TimedEngine(self.dirs, self.app_dirs, **options)
+
+    def from_string(self, template_code):
+        return InstrumentedTemplate(self.engine.from_string(template_code),
+                                    self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return InstrumentedTemplate(template.template, self)
+
+
+class ThumbnailDeferred(Exception):
+    pass
+
+
+class InstrumentedThumbnailBackend(ThumbnailBackend):
+    """При THUMBNAIL_ASYNC отсутствующая миниатюра не создаётся в
+    запросе: ставится задача, а до её выполнения отдаётся исходная
+    картинка.
+    """
+
+    def get_thumbnail(self, file_, geometry_string, sync=False, **options):
+        if sync or not settings.THUMBNAIL_ASYNC:
+            return super().get_thumbnail(file_, geometry_string, **options)
+        _local.deferred = True
+        try:
+            return super().get_thumbnail(file_, geometry_string, **options)
+        except ThumbnailDeferred:
+            # Бэкенды загружаются вместе с настройками, раньше моделей.
+            from .taskqueue import enqueue
+            name = getattr(file_, 'name', file_)
+            key = hashlib.sha1(json.dumps(
+                [name, geometry_string, options], sort_keys=True,
+            ).encode()).hexdigest()
+            enqueue('core.tasks.create_thumbnail',
+                    (name, geometry_string, options),
+                    key=f'thumbnail:{key}')
+            return ImageFile(file_)
+        finally:
+            _local.deferred = False
+
+    def _create_thumbnail(self, source_image, geometry_string, options,
+                          thumbnail):
+        if getattr(_local, 'deferred', False):
+            raise ThumbnailDeferred
+        started = time.perf_counter()
+        try:
+            return super()._create_thumbnail(source_image, geometry_string,
+                                             options, thumbnail)
+        finally:
+            registry.observe('yatube_thumbnail_seconds',
+                             time.perf_counter() - started,
+                             geometry=geometry_string)
@@ -0,0 +1,162 @@
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import DataChange
+from .taskqueue import enqueue
+
+# Ключ, по которому процессы перечитывают данные целиком.
+RELOAD = '*'
+
+_pruning_window = None
+
+
+def schedule_pruning():
+    """Одна чистка журнала на окно CHANGE_LOG_RETENTION; процесс
+    ставит её не чаще раза за окно.
+    """
+    global _pruning_window
+    retention = settings.CHANGE_LOG_RETENTION
+    now = time.time()
+    window = int(now // retention)
+    if window == _pruning_window:
+        return
+    enqueue('core.tasks.prune_changes', key=f'prune_changes:{window}',
+            delay=(window + 1) * retention - now)
+    _pruning_window = window
+
+
+def prune_changes():
+    border = timezone.now() - timedelta(
+        seconds=settings.CHANGE_LOG_RETENTION)
+    return DataChange.objects.filter(created__lt=border).delete()[0]
+
+
+class ChangeLog:
+    """Журнал изменённых ключей одного набора данных. Запись делается
+    после фиксации транзакции одним INSERT в автокоммите, поэтому на
+    SQLite, где запись в базу идёт по очереди, номера записей видны
+    читателям по возрастанию.
+
+    Не потокобезопасен: вызывается под блокировкой своего индекса.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.last_id = None
+        self.polled = 0
+
+    def record(self, key, on_recorded=None):
+        """После фиксации текущей транзакции записывает ключ и вызывает
+        on_recorded(key). При откате не делает ничего.
+        """
+        def callback():
+            DataChange.objects.using('default').create(name=self.name,
+                                                       key=key)
+            schedule_pruning()
+            if on_recorded is not None:
+                on_recorded(key)
+
+        transaction.on_commit(callback)
+
+    def reset(self):
+        """Запоминает конец журнала перед полной загрузкой данных: всё,
+        что запишут позже, придёт изменениями.
+        """
+        self.polled = time.monotonic()
+        self.last_id = DataChange.objects.using('default').aggregate(
+            last_id=Max('pk'))['last_id'] or 0
+
+    def poll(self):
+        """Ключи, изменённые с прошлого опроса, не чаще раза в
+        CHANGE_LOG_POLL_INTERVAL секунд. None значит, что данные проще
+        перечитать целиком: изменений слишком много, записи могли уже
+        вычистить или кто-то попросил перезагрузку.
+        """
+        now = time.monotonic()
+        if now - self.polled < settings.CHANGE_LOG_POLL_INTERVAL:
+            return []
+        if now - self.polled > settings.CHANGE_LOG_RETENTION:
+            return None
+        limit = settings.CHANGE_LOG_MAX_KEYS
+        rows = list(DataChange.objects.using('default')
+                    .filter(name=self.name, pk__gt=self.last_id)
+                    .order_by('pk').values_list('pk', 'key')[:limit + 1])
+        self.polled = now
+        if rows:
+            self.last_id = rows[-1][0]
+        keys = list(dict.fromkeys(key for _, key in rows))
+        if len(rows) > limit or RELOAD in keys:
+            return None
+        return keys
+
+
+class SharedIndex:
+    """Данные в памяти процесса, которые догоняют изменения других
+    процессов по журналу. Подкласс загружает данные целиком в _load и
+    перечитывает отдельные ключи в _refresh.
+
+    Копия процесса собирается только из зафиксированных данных: внутри
+    транзакции чтение может увидеть чужие для остальных процессов
+    строки, которые ещё откатятся, поэтому там строится временная копия.
+    """
+    name = None
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self.changes = ChangeLog(self.name)
+
+    def _load(self):
+        raise NotImplementedError
+
+    def _refresh(self, keys):
+        raise NotImplementedError
+
+    def _reload(self):
+        self.changes.reset()
+        self._load()
+        self._loaded = True
+
+    def current(self):
+        """Индекс, готовый к чтению: свой, догнавший журнал, или
+        временный внутри транзакции.
+        """
+        if transaction.get_connection('default').in_atomic_block:
+            index = type(self)()
+            index._load()
+            return index
+        with self._lock:
+            if not self._loaded:
+                self._reload()
+                return self
+            keys = self.changes.poll()
+            if keys is None:
+                self._reload()
+            elif keys:
+                self._refresh(keys)
+        return self
+
+    def refresh(self, keys):
+        """Сразу перечитывает ключи, не дожидаясь опроса журнала."""
+        with self._lock:
+            if self._loaded:
+                self._refresh(keys)
+
+    def changed(self, key):
+        """Сообщает об изменении ключа: после фиксации транзакции оно
+        попадёт в журнал и сразу в копию этого процесса.
+        """
+        self.changes.record(key, self._apply_recorded)
+
+    def _apply_recorded(self, key):
+        if key == RELOAD:
+            with self._lock:
+                self._loaded = False
+        else:
+            self.refresh([key])
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+W001 = Warning(
+    'QUERY_CACHE_ALIAS указывает на кеш в памяти процесса.',
+    hint=('Поколения таблиц хранятся в каждом процессе отдельно: запись '
+          'в одном процессе не сбросит запросы, закешированные другими, '
+          'до QUERY_CACHE_TIMEOUT. Укажите общий кеш (Memcached, Redis).'),
+    id='core.W001',
+)
+
+W002 = Warning(
+    'RATE_LIMIT_CACHE_ALIAS указывает на кеш в памяти процесса.',
+    hint=('Счётчики запросов ведутся в каждом процессе отдельно, и '
+          'лимит умножается на число процессов. Укажите общий кеш '
+          '(Memcached, Redis).'),
+    id='core.W002',
+)
+
+
+@register(Tags.caches, deploy=True)
+def check_query_cache(app_configs, **kwargs):
+    if isinstance(caches[settings.QUERY_CACHE_ALIAS], LocMemCache):
+        return [W001]
+    return []
+
+
+@register(Tags.caches, Tags.security, deploy=True)
+def check_rate_limit_cache(app_configs, **kwargs):
+    if isinstance(caches[settings.RATE_LIMIT_CACHE_ALIAS], LocMemCache):
+        return [W002]
+    return []
@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+_identity_map = ContextVar('identity_map', default=None)
+
+
+class IdentityMap:
+    """Хранит загруженные за запрос объекты по паре (модель, pk)."""
+
+    def __init__(self):
+        self._objects = {}
+
+    def add(self, obj):
+        self._objects[(type(obj), obj.pk)] = obj
+
+    def get_many(self, model, pks):
+        """Возвращает словарь pk -> объект, догружая недостающие
+        объекты одним запросом ``IN``.
+        """
+        found = {}
+        missing = set()
+        for pk in pks:
+            obj = self._objects.get((model, pk))
+            if obj is None:
+                missing.add(pk)
+            else:
+                found[pk] = obj
+        if missing:
+            for pk, obj in model._default_manager.in_bulk(missing).items():
+                self._objects[(model, pk)] = obj
+                found[pk] = obj
+        return found
+
+
+def get_identity_map():
+    identity_map = _identity_map.get()
+    return identity_map if identity_map is not None else IdentityMap()
+
+
+@contextmanager
+def use_identity_map():
+    token = _identity_map.set(IdentityMap())
+    try:
+        yield
+    finally:
+        _identity_map.reset(token)
+
+
+def load_related(instances, *field_names):
+    """Проставляет объектам связанные по ForeignKey объекты, собирая их
+    идентификаторы и загружая каждую модель одним запросом.
+    """
+    instances = list(instances)
+    if not instances:
+        return instances
+    identity_map = get_identity_map()
+    opts = instances[0]._meta
+    for name in field_names:
+        field = opts.get_field(name)
+        pks = set()
+        for obj in instances:
+            if not field.is_cached(obj):
+                pks.add(getattr(obj, field.attname))
+            elif field.get_cached_value(obj) is not None:
+                identity_map.add(field.get_cached_value(obj))
+        pks.discard(None)
+        related = identity_map.get_many(field.related_model, pks)
+        for obj in instances:
+            pk = getattr(obj, field.attname)
+            if pk in related and not field.is_cached(obj):
+                field.set_cached_value(obj, related[pk])
+    return instances
+
+
+class IdentityMapMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with use_identity_map():
+            return self.get_response(request)
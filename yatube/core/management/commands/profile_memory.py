@@ -0,0 +1,27 @@
+import argparse
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from core.memory import MemoryProfile
+
+
+class Command(BaseCommand):
+    help = ('Выполняет команду manage.py и показывает, сколько памяти '
+            'она заняла и где')
+
+    def add_arguments(self, parser):
+        parser.add_argument('command_name')
+        parser.add_argument('args', nargs=argparse.REMAINDER)
+
+    def handle(self, *args, **options):
+        command_name = options['command_name']
+        with MemoryProfile(f'command {command_name}') as profile:
+            call_command(command_name, *args)
+        report = profile.report
+        self.stdout.write(f'Пик {report["peak"] // 1024} КиБ, удерживается '
+                          f'{report["retained"] // 1024} КиБ')
+        for site in report['top']:
+            self.stdout.write(f'{site["size_diff"] // 1024:>8} КиБ '
+                              f'{site["file"]}:{site["line"]} '
+                              f'{site["code"]}')
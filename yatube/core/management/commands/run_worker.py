@@ -0,0 +1,34 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from core.taskqueue import Worker, purge_finished
+
+
+class Command(BaseCommand):
+    help = 'Выполняет фоновые задачи из очереди в базе'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=None,
+                            help='Размер пула потоков; 0 — без пула')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Пауза между опросами пустой очереди')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить накопившиеся задачи и выйти')
+
+    def handle(self, *args, **options):
+        worker = Worker(threads=options['threads'])
+
+        def stop(signum, frame):
+            self.stdout.write('Завершаем начатые задачи...')
+            worker.stopping.set()
+
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+        purged = purge_finished()
+        if purged:
+            self.stdout.write(f'Удалено старых задач: {purged}')
+        self.stdout.write(f'Воркер {worker.name}, потоков: '
+                          f'{worker.threads}')
+        worker.run(once=options['once'],
+                   poll_interval=options['poll_interval'])
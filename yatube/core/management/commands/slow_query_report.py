@@ -0,0 +1,48 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from core.slow_queries import read_log
+
+
+class Command(BaseCommand):
+    help = ('Сводка журнала медленных запросов, сгруппированная по '
+            'отпечатку SQL')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20,
+                            help='Сколько групп показать')
+        parser.add_argument('--sort', choices=('total', 'count', 'max'),
+                            default='total', help='Порядок групп')
+
+    def handle(self, *args, **options):
+        groups = defaultdict(list)
+        for entry in read_log():
+            groups[entry['fingerprint']].append(entry)
+        if not groups:
+            self.stdout.write('Медленных запросов нет')
+            return
+        sort_keys = {
+            'total': lambda entries: sum(e['duration'] for e in entries),
+            'count': len,
+            'max': lambda entries: max(e['duration'] for e in entries),
+        }
+        ordered = sorted(groups.items(), reverse=True,
+                         key=lambda item: sort_keys[options['sort']](item[1]))
+        for fingerprint, entries in ordered[:options['limit']]:
+            durations = [entry['duration'] for entry in entries]
+            slowest = max(entries, key=lambda entry: entry['duration'])
+            views = sorted({entry['view'] for entry in entries
+                            if entry['view']})
+            self.stdout.write(
+                f'{len(entries)} раз, всего {sum(durations):.3f} с, '
+                f'в среднем {sum(durations) / len(durations):.3f} с, '
+                f'максимум {max(durations):.3f} с')
+            self.stdout.write(f'  {fingerprint}')
+            if views:
+                self.stdout.write(f'  представления: {", ".join(views)}')
+            for origin in ('template', 'code'):
+                if slowest[origin]:
+                    self.stdout.write(f'  {origin}: {slowest[origin]}')
+            for line in slowest['plan'] or ():
+                self.stdout.write(f'  plan: {line}')
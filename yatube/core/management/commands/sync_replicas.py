@@ -0,0 +1,29 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.routers import PRIMARY, copy_database
+
+
+class Command(BaseCommand):
+    help = ('Копирует основную базу SQLite в файлы реплик: локальная '
+            'замена репликации')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Повторять каждые столько секунд')
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('Реплики не настроены: задайте '
+                               'YATUBE_REPLICAS')
+        primary = settings.DATABASES[PRIMARY]['NAME']
+        while True:
+            for alias in settings.DATABASE_REPLICAS:
+                copy_database(primary, settings.DATABASES[alias]['NAME'])
+            self.stdout.write(
+                f'Реплики обновлены: {", ".join(settings.DATABASE_REPLICAS)}')
+            if options['interval'] is None:
+                return
+            time.sleep(options['interval'])
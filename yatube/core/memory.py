@@ -0,0 +1,160 @@
+import json
+import linecache
+import logging
+import os
+import random
+import threading
+import tracemalloc
+from collections import defaultdict, deque
+from datetime import datetime
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# Последние приросты удерживаемой памяти по представлениям.
+_retained = defaultdict(
+    lambda: deque(maxlen=settings.MEMORY_LEAK_WINDOW))
+
+
+def get_top_allocations(before, after, limit):
+    """Места в коде, где за время запроса больше всего выросла память."""
+    top = []
+    for stat in after.compare_to(before, 'lineno')[:limit]:
+        frame = stat.traceback[0]
+        top.append({
+            'file': frame.filename,
+            'line': frame.lineno,
+            'code': linecache.getline(frame.filename, frame.lineno).strip(),
+            'size_diff': stat.size_diff,
+            'count_diff': stat.count_diff,
+        })
+    return top
+
+
+def is_leak_suspected(name, retained):
+    """Утечка подозревается, если несколько замеров подряд память
+    после запроса только прирастает.
+    """
+    with _lock:
+        history = _retained[name]
+        history.append(retained)
+        return (len(history) == history.maxlen
+                and all(size > 0 for size in history)
+                and sum(history) >= settings.MEMORY_LEAK_MIN_BYTES)
+
+
+def save_report(report):
+    directory = settings.MEMORY_PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    name = (f'{datetime.now().strftime("%Y%m%d-%H%M%S%f")}'
+            f'-{os.getpid()}-{random.getrandbits(16):04x}.json')
+    with open(os.path.join(directory, name), 'w') as file:
+        json.dump(report, file)
+    names = sorted(os.listdir(directory), reverse=True)
+    for old_name in names[settings.MEMORY_PROFILING_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(directory, old_name))
+        except FileNotFoundError:
+            pass
+
+
+def load_reports():
+    """Сохранённые замеры, новые первыми."""
+    directory = settings.MEMORY_PROFILING_DIR
+    try:
+        names = sorted(os.listdir(directory), reverse=True)
+    except FileNotFoundError:
+        return []
+    reports = []
+    for name in names:
+        try:
+            with open(os.path.join(directory, name)) as file:
+                reports.append(json.load(file))
+        except (OSError, ValueError):
+            continue
+    return reports
+
+
+def summarize(reports):
+    """Пиковая и удерживаемая память по представлениям и командам."""
+    summary = {}
+    for report in reports:
+        item = summary.setdefault(report['name'], {
+            'name': report['name'], 'samples': 0, 'max_peak': 0,
+            'retained': 0, 'leak_suspected': report['leak_suspected']})
+        item['samples'] += 1
+        item['max_peak'] = max(item['max_peak'], report['peak'])
+        item['retained'] += report['retained']
+    for item in summary.values():
+        item['avg_retained'] = item['retained'] // item['samples']
+    return sorted(summary.values(), key=lambda item: item['max_peak'],
+                  reverse=True)
+
+
+class MemoryProfile:
+    """Замер памяти вокруг запроса или команды. tracemalloc после
+    первого замера остаётся включённым, чтобы прирост между замерами
+    был виден. Трассировка общая на процесс, поэтому параллельные
+    запросы попадают в замеры друг друга.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(settings.MEMORY_PROFILING_FRAMES)
+        tracemalloc.reset_peak()
+        self.before = tracemalloc.take_snapshot()
+        self.start_size = tracemalloc.get_traced_memory()[0]
+        return self
+
+    def __exit__(self, *exc_info):
+        size, peak = tracemalloc.get_traced_memory()
+        after = tracemalloc.take_snapshot()
+        retained = size - self.start_size
+        self.report = {
+            'name': self.name,
+            'time': datetime.now().isoformat(),
+            'pid': os.getpid(),
+            'peak': peak - self.start_size,
+            'retained': retained,
+            'leak_suspected': is_leak_suspected(self.name, retained),
+            'top': get_top_allocations(self.before, after,
+                                       settings.MEMORY_PROFILING_TOP),
+        }
+        save_report(self.report)
+        log = logger.warning if self.report['leak_suspected'] else logger.info
+        log('%s: peak %d KiB, retained %d KiB%s', self.name,
+            self.report['peak'] // 1024, retained // 1024,
+            ', possible leak' if self.report['leak_suspected'] else '')
+
+
+class MemoryProfilingMiddleware:
+    """Замеряет память для доли запросов MEMORY_PROFILING_SAMPLE_RATE
+    или по параметру MEMORY_PROFILING_QUERY_PARAM от сотрудника.
+    Работает, только если включён MEMORY_PROFILING.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+        with MemoryProfile(request.path) as profile:
+            response = self.get_response(request)
+            resolver_match = getattr(request, 'resolver_match', None)
+            if resolver_match is not None:
+                profile.name = resolver_match.view_name
+        return response
+
+    def should_profile(self, request):
+        if not settings.MEMORY_PROFILING:
+            return False
+        if (settings.MEMORY_PROFILING_QUERY_PARAM in request.GET
+                and request.user.is_staff):
+            return True
+        return random.random() < settings.MEMORY_PROFILING_SAMPLE_RATE
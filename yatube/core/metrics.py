@@ -0,0 +1,316 @@
+import atexit
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Сумма значений завершившихся процессов.
+AGGREGATE_FILE = 'aggregate.json'
+LOCK_FILE = 'aggregate.lock'
+
+# Имя метрики: (тип, описание).
+METRICS = {
+    'yatube_view_duration_seconds': (
+        'histogram', 'Время обработки запроса по представлениям.'),
+    'yatube_db_queries_total': (
+        'counter', 'Число SQL-запросов по представлениям.'),
+    'yatube_db_query_duration_seconds': (
+        'histogram', 'Суммарное время SQL-запросов одного ответа.'),
+    'yatube_cache_requests_total': (
+        'counter', 'Обращения к кешу: попадания и промахи.'),
+    'yatube_template_render_seconds': (
+        'histogram', 'Время рендеринга шаблонов.'),
+    'yatube_template_node_calls_total': (
+        'counter', 'Вызовы шаблонов, include и тегов.'),
+    'yatube_template_node_seconds_total': (
+        'counter', 'Суммарное время шаблонов, include и тегов.'),
+    'yatube_thumbnail_seconds': (
+        'histogram', 'Время создания миниатюр.'),
+    'yatube_rate_limited_total': (
+        'counter', 'Запросы, отклонённые ограничением частоты.'),
+    'yatube_emails_total': (
+        'counter', 'Отправленные и неотправленные письма.'),
+}
+
+
+class Registry:
+    """Метрики процесса. Каждый процесс периодически сбрасывает свои
+    значения в отдельный файл METRICS_DIR, а /metrics складывает файлы
+    всех процессов, как multiprocess-режим prometheus_client.
+
+    Имя файла содержит случайную метку процесса, а не только PID:
+    новый процесс с тем же PID не перезапишет чужие значения, и
+    счётчики не пойдут назад. Файлы завершившихся процессов
+    вливаются в общий AGGREGATE_FILE и удаляются.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+        self._flushed = time.monotonic()
+        self.filename = f'{os.getpid()}-{uuid.uuid4().hex}.json'
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {
+                    'buckets': [0] * len(DEFAULT_BUCKETS), 'sum': 0.0,
+                    'count': 0}
+            position = bisect_left(DEFAULT_BUCKETS, value)
+            if position < len(DEFAULT_BUCKETS):
+                histogram['buckets'][position] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def dump(self):
+        with self._lock:
+            return serialize(self._counters, self._histograms)
+
+    def flush(self):
+        """Атомарно перезаписывает файл процесса текущими значениями."""
+        directory = settings.METRICS_DIR
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        write_json(os.path.join(directory, self.filename), self.dump())
+        self._flushed = time.monotonic()
+
+    def maybe_flush(self):
+        if time.monotonic() - self._flushed >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+
+registry = Registry()
+
+
+def serialize(counters, histograms):
+    return {
+        'counters': [[name, labels, value] for (name, labels), value
+                     in counters.items()],
+        'histograms': [[name, labels, histogram]
+                       for (name, labels), histogram in histograms.items()],
+    }
+
+
+def write_json(path, data):
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                     suffix='.tmp')
+    with os.fdopen(fd, 'w') as file:
+        json.dump(data, file)
+    os.replace(temp_path, path)
+
+
+def read_json(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def add_data(counters, histograms, data):
+    for metric, labels, value in data['counters']:
+        counters[metric, tuple(map(tuple, labels))] += value
+    for metric, labels, histogram in data['histograms']:
+        key = (metric, tuple(map(tuple, labels)))
+        total = histograms.setdefault(key, {
+            'buckets': [0] * len(DEFAULT_BUCKETS), 'sum': 0.0,
+            'count': 0})
+        for position, count in enumerate(histogram['buckets']):
+            total['buckets'][position] += count
+        total['sum'] += histogram['sum']
+        total['count'] += histogram['count']
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю.
+        pass
+    return True
+
+
+def get_process_files(directory):
+    """Файлы процессов и их PID."""
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    files = []
+    for name in names:
+        pid = name.split('-', 1)[0]
+        if name.endswith('.json') and pid.isdigit():
+            files.append((name, int(pid)))
+    return files
+
+
+@contextmanager
+def locked(operation):
+    """Файловая блокировка каталога метрик: слияние берёт её
+    монопольно, чтение — совместно, чтобы не увидеть файл процесса
+    дважды или ни разу.
+    """
+    directory = settings.METRICS_DIR
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    with open(os.path.join(directory, LOCK_FILE), 'a') as lock:
+        fcntl.flock(lock, operation)
+        yield directory
+
+
+def merge_finished(names=None):
+    """Вливает файлы завершившихся процессов (или перечисленные) в
+    AGGREGATE_FILE и удаляет их.
+    """
+    with locked(fcntl.LOCK_EX) as directory:
+        if names is None:
+            names = [name for name, pid in get_process_files(directory)
+                     if not is_alive(pid)]
+        if not names:
+            return
+        aggregate_path = os.path.join(directory, AGGREGATE_FILE)
+        counters = defaultdict(float)
+        histograms = {}
+        merged = []
+        for path in [os.path.join(directory, name) for name in names]:
+            data = read_json(path)
+            if data is not None:
+                add_data(counters, histograms, data)
+                merged.append(path)
+        aggregate = read_json(aggregate_path)
+        if aggregate is not None:
+            add_data(counters, histograms, aggregate)
+        write_json(aggregate_path, serialize(counters, histograms))
+        for path in merged:
+            os.remove(path)
+
+
+@atexit.register
+def flush_at_exit():
+    if settings.configured and settings.METRICS_ENABLED:
+        try:
+            registry.flush()
+            merge_finished([registry.filename])
+        except OSError:
+            pass
+
+
+def collect():
+    """Складывает значения всех процессов, живых и завершившихся."""
+    merge_finished()
+    counters = defaultdict(float)
+    histograms = {}
+    with locked(fcntl.LOCK_SH) as directory:
+        names = [name for name, _ in get_process_files(directory)]
+        for name in names + [AGGREGATE_FILE]:
+            data = read_json(os.path.join(directory, name))
+            if data is not None:
+                add_data(counters, histograms, data)
+    return counters, histograms
+
+
+def escape_label(value):
+    return (str(value).replace('\\', '\\\\').replace('\n', '\\n')
+            .replace('"', '\\"'))
+
+
+def format_labels(labels, **extra):
+    labels = list(labels) + list(extra.items())
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{escape_label(value)}"'
+                          for key, value in labels) + '}'
+
+
+def render_metrics():
+    """Текстовый формат экспозиции Prometheus."""
+    counters, histograms = collect()
+    by_name = defaultdict(list)
+    for (name, labels), value in counters.items():
+        by_name[name].append(f'{name}{format_labels(labels)} {value}')
+    for (name, labels), histogram in histograms.items():
+        cumulative = 0
+        for bound, count in zip(DEFAULT_BUCKETS, histogram['buckets']):
+            cumulative += count
+            by_name[name].append(
+                f'{name}_bucket{format_labels(labels, le=bound)} '
+                f'{cumulative}')
+        by_name[name].append(
+            f'{name}_bucket{format_labels(labels, le="+Inf")} '
+            f'{histogram["count"]}')
+        by_name[name].append(
+            f'{name}_sum{format_labels(labels)} {histogram["sum"]}')
+        by_name[name].append(
+            f'{name}_count{format_labels(labels)} {histogram["count"]}')
+    lines = []
+    for name, (kind, description) in METRICS.items():
+        if name in by_name:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(sorted(by_name[name]))
+    return '\n'.join(lines) + '\n'
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Время ответа и SQL-запросы каждого представления. Стоит первым,
+    чтобы учитывать и работу остальных middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is not None:
+            view = resolver_match.view_name
+        elif response.get('X-Page-Cache') == 'hit':
+            view = 'page_cache'
+        else:
+            view = 'unresolved'
+        registry.observe('yatube_view_duration_seconds', duration, view=view)
+        registry.inc('yatube_db_queries_total', timer.count, view=view)
+        registry.observe('yatube_db_query_duration_seconds', timer.duration,
+                         view=view)
+        registry.maybe_flush()
+        return response
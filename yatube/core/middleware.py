@@ -0,0 +1,84 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.dispatch import Signal
+
+from .utils import new_generation
+
+PAGE_CACHE_GENERATION_KEY = 'page_cache:generation'
+# Заголовки, описывающие один конкретный ответ: в кеш они не попадают.
+PER_RESPONSE_HEADERS = ('X-Profile', 'Server-Timing')
+
+# Отправляется, когда страница отдана из кеша и представление не
+# вызывалось: так можно учесть побочные эффекты вроде счётчиков.
+# Аргументы: request, view_name, kwargs.
+page_cache_hit = Signal()
+
+
+def invalidate_page_cache():
+    """Сбрасывает все закешированные страницы сменой поколения."""
+    try:
+        cache.incr(PAGE_CACHE_GENERATION_KEY)
+    except ValueError:
+        pass
+
+
+def get_page_cache_key(request):
+    # Схема и хост входят в ключ: сайт может отвечать на нескольких
+    # доменах, и страница одного не должна уйти посетителю другого.
+    url = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    return f'page_cache:{request.method}:{url}'
+
+
+class AnonymousPageCacheMiddleware:
+    """Отдаёт анонимным посетителям готовый HTML без обращения к сессии,
+    авторизации и шаблонам. Пользователи с сессионной кукой проходят
+    мимо кеша.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.is_cacheable_request(request):
+            return self.get_response(request)
+        key = get_page_cache_key(request)
+        cached = cache.get_many([PAGE_CACHE_GENERATION_KEY, key])
+        generation = cached.get(PAGE_CACHE_GENERATION_KEY)
+        if generation is None:
+            generation = new_generation()
+            cache.set(PAGE_CACHE_GENERATION_KEY, generation, None)
+        elif key in cached and cached[key][0] == generation:
+            _, response, view_name, kwargs = cached[key]
+            page_cache_hit.send(sender=self.__class__, request=request,
+                                view_name=view_name, kwargs=kwargs)
+            response['X-Page-Cache'] = 'hit'
+            return response
+        response = self.get_response(request)
+        if self.is_cacheable_response(request, response):
+            resolver_match = request.resolver_match
+            own_headers = {header: response[header]
+                           for header in PER_RESPONSE_HEADERS
+                           if response.has_header(header)}
+            for header in own_headers:
+                del response[header]
+            cache.set(key, (generation, response, resolver_match.view_name,
+                            resolver_match.kwargs),
+                      settings.PAGE_CACHE_TIMEOUT)
+            for header, value in own_headers.items():
+                response[header] = value
+            response['X-Page-Cache'] = 'miss'
+        return response
+
+    def is_cacheable_request(self, request):
+        return (request.method in ('GET', 'HEAD')
+                and settings.SESSION_COOKIE_NAME not in request.COOKIES)
+
+    def is_cacheable_response(self, request, response):
+        resolver_match = getattr(request, 'resolver_match', None)
+        return (resolver_match is not None
+                and resolver_match.view_name in settings.PAGE_CACHE_VIEWS
+                and response.status_code == 200
+                and not response.streaming
+                and not response.cookies)
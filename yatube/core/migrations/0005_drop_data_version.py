@@ -0,0 +1,16 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:11
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_data_change'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='DataVersion',
+        ),
+    ]
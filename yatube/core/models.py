@@ -0,0 +1,111 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """Фоновая задача очереди. Воркер берёт задачу, продлевая
+    locked_until; если он упал, по истечении этого срока задачу
+    заберёт другой.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = ((QUEUED, 'В очереди'),
+                      (RUNNING, 'Выполняется'),
+                      (DONE, 'Выполнена'),
+                      (FAILED, 'Ошибка'))
+
+    name = models.CharField(max_length=200, verbose_name='Задача')
+    payload = models.TextField(default='{}', verbose_name='Аргументы')
+    priority = models.SmallIntegerField(default=0,
+                                        verbose_name='Приоритет')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=QUEUED, verbose_name='Состояние')
+    key = models.CharField(max_length=200, unique=True, null=True,
+                           blank=True, verbose_name='Ключ идемпотентности')
+    attempts = models.PositiveSmallIntegerField(default=0,
+                                                verbose_name='Попыток')
+    max_attempts = models.PositiveSmallIntegerField(
+        default=5, verbose_name='Наибольшее число попыток')
+    run_at = models.DateTimeField(default=timezone.now,
+                                  verbose_name='Выполнить не раньше')
+    locked_until = models.DateTimeField(null=True, blank=True,
+                                        verbose_name='Занята до')
+    worker = models.CharField(max_length=100, blank=True,
+                              verbose_name='Воркер')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Создана')
+    finished = models.DateTimeField(null=True, blank=True,
+                                    verbose_name='Завершена')
+
+    class Meta:
+        ordering = ['-created']
+        indexes = [models.Index(fields=['status', 'priority', 'run_at'])]
+        verbose_name = 'фоновая задача'
+        verbose_name_plural = 'фоновые задачи'
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
+
+
+class OutgoingEmail(models.Model):
+    """Письмо в очереди на отправку. Отправляются пачками через одно
+    соединение с почтовым сервером.
+    """
+    QUEUED = 'queued'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = ((QUEUED, 'В очереди'),
+                      (SENDING, 'Отправляется'),
+                      (SENT, 'Отправлено'),
+                      (FAILED, 'Ошибка'))
+
+    to = models.EmailField(verbose_name='Кому')
+    from_email = models.CharField(max_length=200, blank=True,
+                                  verbose_name='От кого')
+    subject = models.CharField(max_length=255, verbose_name='Тема')
+    body = models.TextField(verbose_name='Текст')
+    html_body = models.TextField(blank=True, verbose_name='HTML')
+    priority = models.SmallIntegerField(default=0,
+                                        verbose_name='Приоритет')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=QUEUED, verbose_name='Состояние')
+    attempts = models.PositiveSmallIntegerField(default=0,
+                                                verbose_name='Попыток')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    batch = models.CharField(max_length=32, blank=True, db_index=True,
+                             verbose_name='Пачка')
+    claimed = models.DateTimeField(null=True, blank=True,
+                                   verbose_name='Взято в отправку')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Создано')
+    sent = models.DateTimeField(null=True, blank=True,
+                                verbose_name='Отправлено')
+
+    class Meta:
+        ordering = ['-created']
+        indexes = [models.Index(fields=['status', 'priority', 'created'])]
+        verbose_name = 'исходящее письмо'
+        verbose_name_plural = 'исходящие письма'
+
+    def __str__(self):
+        return f'{self.subject} → {self.to}'
+
+
+class DataChange(models.Model):
+    """Запись журнала изменений данных, которые процессы держат у себя
+    в памяти: какой ключ изменился. Процессы читают журнал с последней
+    увиденной записи и перечитывают из базы только изменённые ключи.
+    """
+    name = models.CharField(max_length=100)
+    key = models.CharField(max_length=100)
+    created = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['name', 'id'])]
+
+    def __str__(self):
+        return f'{self.name}: {self.key}'
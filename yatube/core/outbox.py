@@ -0,0 +1,134 @@
+import logging
+import time
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db.models import F
+from django.utils import timezone
+
+from .metrics import registry
+from .models import OutgoingEmail
+from .taskqueue import enqueue
+
+logger = logging.getLogger(__name__)
+
+# Письма с таким приоритетом, как сброс пароля, уходят ближайшей
+# пачкой, не дожидаясь окна EMAIL_BATCH_INTERVAL.
+URGENT = 10
+
+
+def schedule_delivery(urgent=False):
+    """Ставит отправку пачки на конец текущего окна. Ключ задачи общий
+    для окна, поэтому все письма, попавшие в outbox за это время,
+    уходят одной задачей.
+    """
+    interval = 1 if urgent else settings.EMAIL_BATCH_INTERVAL
+    now = time.time()
+    window = int(now // interval)
+    enqueue('core.tasks.deliver_outbox', priority=URGENT if urgent else 0,
+            key=f'deliver_outbox:{interval}:{window}',
+            delay=(window + 1) * interval - now)
+
+
+def queue_email(to, subject, body, from_email='', html_body='',
+                priority=0):
+    email = OutgoingEmail.objects.create(
+        to=to, subject=subject, body=body, from_email=from_email or '',
+        html_body=html_body or '', priority=priority)
+    schedule_delivery(urgent=priority >= URGENT)
+    return email
+
+
+def queue_emails(emails):
+    """Ставит в outbox много несохранённых OutgoingEmail разом."""
+    OutgoingEmail.objects.bulk_create(emails,
+                                      batch_size=settings.EMAIL_BATCH_SIZE)
+    if emails:
+        schedule_delivery()
+
+
+def requeue_stale():
+    """Возвращает в очередь письма воркера, упавшего посреди пачки.
+    Часть из них могла уйти, так что письмо может прийти дважды.
+    """
+    border = timezone.now() - timedelta(
+        seconds=settings.EMAIL_SENDING_TIMEOUT)
+    return OutgoingEmail.objects.filter(
+        status=OutgoingEmail.SENDING, claimed__lt=border,
+    ).update(status=OutgoingEmail.QUEUED, batch='')
+
+
+def claim_batch(size):
+    """Помечает пачку писем своей меткой; письма, которые успел забрать
+    другой воркер, в неё не попадут.
+    """
+    pks = list(OutgoingEmail.objects.filter(
+        status=OutgoingEmail.QUEUED,
+    ).order_by('-priority', 'created').values_list('pk', flat=True)[:size])
+    if not pks:
+        return []
+    batch = uuid.uuid4().hex
+    OutgoingEmail.objects.filter(
+        pk__in=pks, status=OutgoingEmail.QUEUED,
+    ).update(status=OutgoingEmail.SENDING, batch=batch,
+             claimed=timezone.now())
+    return list(OutgoingEmail.objects.filter(batch=batch))
+
+
+def build_message(email, connection):
+    message = EmailMultiAlternatives(
+        email.subject, email.body, email.from_email or None, [email.to],
+        connection=connection)
+    if email.html_body:
+        message.attach_alternative(email.html_body, 'text/html')
+    return message
+
+
+def mark_failed(email, error):
+    attempts = email.attempts + 1
+    status = (OutgoingEmail.FAILED
+              if attempts >= settings.EMAIL_MAX_ATTEMPTS
+              else OutgoingEmail.QUEUED)
+    OutgoingEmail.objects.filter(pk=email.pk).update(
+        status=status, attempts=attempts, error=repr(error), batch='')
+    registry.inc('yatube_emails_total', status='failed')
+    logger.warning('Письмо %s не отправлено: %r', email.pk, error)
+
+
+def deliver_batch(size=None):
+    """Отправляет одну пачку через одно соединение. Ошибка одного
+    письма не мешает остальным; недоступность сервера возвращает всю
+    пачку в очередь. Возвращает размер пачки.
+    """
+    size = size or settings.EMAIL_BATCH_SIZE
+    requeue_stale()
+    emails = claim_batch(size)
+    if not emails:
+        return 0
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception:
+        OutgoingEmail.objects.filter(pk__in=[e.pk for e in emails]).update(
+            status=OutgoingEmail.QUEUED, batch='')
+        raise
+    sent = []
+    try:
+        for email in emails:
+            try:
+                connection.send_messages([build_message(email, connection)])
+            except Exception as error:
+                mark_failed(email, error)
+            else:
+                sent.append(email.pk)
+    finally:
+        connection.close()
+    OutgoingEmail.objects.filter(pk__in=sent).update(
+        status=OutgoingEmail.SENT, sent=timezone.now(),
+        attempts=F('attempts') + 1, error='', batch='')
+    registry.inc('yatube_emails_total', len(sent), status='sent')
+    if len(sent) < len(emails):
+        schedule_delivery()
+    return len(emails)
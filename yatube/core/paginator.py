@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Page, Paginator
+from django.db import connections
+from django.db.models import Max
+from django.utils.functional import cached_property
+
+
+def estimate_table_rows(model, using):
+    """Быстрая оценка числа строк таблицы без COUNT(*)."""
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE relname = %s',
+                           [model._meta.db_table])
+            row = cursor.fetchone()
+        if row and row[0] > 0:
+            return int(row[0])
+    # Для автоинкрементного ключа максимум берётся из индекса и
+    # ограничивает число строк сверху.
+    return model._base_manager.using(using).aggregate(
+        max_pk=Max('pk'))['max_pk'] or 0
+
+
+def get_where(queryset):
+    query = queryset.query
+    try:
+        return query.get_compiler(queryset.db).compile(query.where)
+    except EmptyResultSet:
+        return None
+
+
+def is_unfiltered(queryset):
+    """Нет условий сверх тех, что добавляет менеджер по умолчанию,
+    например скрытия объектов, ждущих фонового удаления.
+    """
+    return get_where(queryset) == get_where(
+        queryset.model._default_manager.all())
+
+
+class EstimatedCountPaginator(Paginator):
+    """Пагинатор для больших таблиц админки. Строки всей таблицы
+    считаются точно только до ADMIN_EXACT_COUNT_LIMIT, дальше число
+    оценивается. Список с поиском или фильтрами всегда считается
+    точно: оценка по таблице для него ничего не говорит.
+    Страница выбирается отложенным соединением: OFFSET проходит только
+    по первичным ключам, а строки загружаются по списку ключей.
+    Страница остаётся queryset'ом с исходным порядком: list_editable
+    строит по ней формсет.
+    """
+
+    @cached_property
+    def count(self):
+        if not is_unfiltered(self.object_list):
+            return self.object_list.count()
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        count = self.object_list.order_by()[:limit + 1].count()
+        if count <= limit:
+            return count
+        return max(count, estimate_table_rows(self.object_list.model,
+                                              self.object_list.db))
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        pks = list(self.object_list.values_list('pk', flat=True)
+                   [bottom:bottom + self.per_page])
+        return Page(self.object_list.filter(pk__in=pks), number, self)
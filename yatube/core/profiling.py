@@ -0,0 +1,133 @@
+import cProfile
+import io
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+from django.conf import settings
+
+PROFILE_NAME_RE = re.compile(r'^[\w.-]+$')
+STATS_SUFFIX = '.prof'
+STACKS_SUFFIX = '.collapsed'
+
+
+class StackSampler(threading.Thread):
+    """Раз в ``interval`` секунд снимает стек потока запроса. Результат
+    в формате collapsed stacks (``a;b;c 12``), который понимают
+    flamegraph.pl и speedscope.
+    """
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{frame.f_globals.get("__name__")}'
+                             f':{code.co_name}:{frame.f_lineno}')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def get_collapsed(self):
+        return ''.join(f'{stack} {count}\n'
+                       for stack, count in self.stacks.items())
+
+
+def get_profile_dir():
+    return settings.PROFILING_DIR
+
+
+def get_profile_path(name, suffix):
+    if not PROFILE_NAME_RE.match(name):
+        raise ValueError(name)
+    return os.path.join(get_profile_dir(), name + suffix)
+
+
+def list_profiles():
+    """Сохранённые профили, новые первыми."""
+    try:
+        names = os.listdir(get_profile_dir())
+    except FileNotFoundError:
+        return []
+    return sorted((name[:-len(STATS_SUFFIX)] for name in names
+                   if name.endswith(STATS_SUFFIX)), reverse=True)
+
+
+def save_profile(name, profiler, sampler):
+    os.makedirs(get_profile_dir(), exist_ok=True)
+    profiler.dump_stats(get_profile_path(name, STATS_SUFFIX))
+    with open(get_profile_path(name, STACKS_SUFFIX), 'w') as stacks:
+        stacks.write(sampler.get_collapsed())
+    for old_name in list_profiles()[settings.PROFILING_MAX_FILES:]:
+        for suffix in (STATS_SUFFIX, STACKS_SUFFIX):
+            try:
+                os.remove(get_profile_path(old_name, suffix))
+            except FileNotFoundError:
+                pass
+
+
+def format_stats(name, sort='cumulative', limit=50):
+    stream = io.StringIO()
+    stats = pstats.Stats(get_profile_path(name, STATS_SUFFIX),
+                         stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+class ProfilingMiddleware:
+    """Профилирует представление вместе с рендерингом шаблона для доли
+    запросов ``PROFILING_SAMPLE_RATE`` или по параметру
+    ``PROFILING_QUERY_PARAM`` от сотрудника. Сохраняются pstats и
+    collapsed stacks, имя профиля приходит в заголовке X-Profile.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not self.should_profile(request):
+            return self.get_response(request)
+        profiler = cProfile.Profile()
+        sampler = StackSampler(threading.get_ident(),
+                               settings.PROFILING_SAMPLE_INTERVAL)
+        started = time.perf_counter()
+        sampler.start()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+            sampler.stop()
+        duration = time.perf_counter() - started
+        resolver_match = getattr(request, 'resolver_match', None)
+        view_name = (resolver_match.view_name.replace(':', '.')
+                     if resolver_match else 'unresolved')
+        name = (f'{datetime.now().strftime("%Y%m%d-%H%M%S%f")}-{view_name}'
+                f'-{int(duration * 1000)}ms-{random.getrandbits(16):04x}')
+        save_profile(name, profiler, sampler)
+        response['X-Profile'] = name
+        return response
+
+    def should_profile(self, request):
+        if (settings.PROFILING_QUERY_PARAM in request.GET
+                and request.user.is_staff):
+            return True
+        return random.random() < settings.PROFILING_SAMPLE_RATE
@@ -0,0 +1,143 @@
+import hashlib
+import re
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import EmptyResultSet
+from django.db import transaction
+from django.db.models import QuerySet
+
+from .utils import new_generation
+
+WRITE_RE = re.compile(r'\s*(?:UPDATE|INSERT\s+INTO|DELETE\s+FROM)\s+"(\w+)"',
+                      re.IGNORECASE)
+# Все таблицы запроса, включая подзапросы: Django берёт имена в кавычки.
+TABLE_RE = re.compile(r'\b(?:FROM|JOIN)\s+"(\w+)"', re.IGNORECASE)
+_local = threading.local()
+
+
+def get_query_cache():
+    return caches[settings.QUERY_CACHE_ALIAS]
+
+
+def get_table_generation_key(table):
+    return f'querycache:table:{table}'
+
+
+def bump_generation(table):
+    # Кеш в базе сам пишет в таблицу и снова попал бы в обёртку.
+    if getattr(_local, 'bumping', False):
+        return
+    _local.bumping = True
+    try:
+        get_query_cache().incr(get_table_generation_key(table))
+    except ValueError:
+        pass
+    finally:
+        _local.bumping = False
+
+
+def invalidate_table(table, using='default'):
+    """Сдвигает поколение таблицы, делая недействительными все
+    закешированные запросы, которые её читали.
+
+    Внутри транзакции поколение сдвигается ещё раз после фиксации:
+    иначе другой процесс до фиксации успел бы закешировать старые
+    строки уже под новым поколением.
+    """
+    bump_generation(table)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(lambda: bump_generation(table), using=using)
+
+
+def invalidation_wrapper(execute, sql, params, many, context):
+    """Обёртка execute: любой INSERT, UPDATE и DELETE сдвигает
+    поколение своей таблицы, в том числе .update() и bulk_create()
+    обычных менеджеров, удаление каскадом и сырой SQL.
+    """
+    result = execute(sql, params, many, context)
+    match = WRITE_RE.match(sql)
+    if match:
+        invalidate_table(match.group(1), context['connection'].alias)
+    return result
+
+
+def install(connection):
+    if invalidation_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, invalidation_wrapper)
+
+
+def get_table_generations(tables):
+    query_cache = get_query_cache()
+    keys = sorted(get_table_generation_key(table) for table in tables)
+    generations = query_cache.get_many(keys)
+    missing = {key: new_generation()
+               for key in keys if key not in generations}
+    if missing:
+        query_cache.set_many(missing, None)
+        generations.update(missing)
+    return [generations[key] for key in keys]
+
+
+class CachedQuerySet(QuerySet):
+    """QuerySet, результаты которого по запросу ``cached()`` берутся из
+    кеша. Ключ строится по SQL, параметрам и поколениям всех таблиц,
+    участвующих в запросе, в том числе в подзапросах.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._query_cache_timeout = None
+
+    def cached(self, timeout=None):
+        clone = self._chain()
+        clone._query_cache_timeout = timeout or settings.QUERY_CACHE_TIMEOUT
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._query_cache_timeout = self._query_cache_timeout
+        return clone
+
+    def _fetch_all(self):
+        if self._result_cache is None and self._query_cache_timeout:
+            self._result_cache = self._get_or_cache(
+                'rows', lambda: list(self._iterable_class(self)))
+        super()._fetch_all()
+
+    def count(self):
+        if self._result_cache is not None or not self._query_cache_timeout:
+            return super().count()
+        return self._get_or_cache('count', super().count)
+
+    def _get_or_cache(self, kind, fetch):
+        query = self.query.chain()
+        try:
+            sql, params = query.get_compiler(using=self.db).as_sql()
+        except EmptyResultSet:
+            return fetch()
+        tables = {self.model._meta.db_table}
+        tables.update(TABLE_RE.findall(sql))
+        generations = get_table_generations(tables)
+        digest = hashlib.md5(
+            repr((self.db, sql, params, generations)).encode()).hexdigest()
+        key = f'querycache:{kind}:{digest}'
+        query_cache = get_query_cache()
+        result = query_cache.get(key)
+        if result is None:
+            result = fetch()
+            if kind != 'rows' or len(result) <= settings.QUERY_CACHE_MAX_ROWS:
+                query_cache.set(key, result, self._query_cache_timeout)
+        return result
+
+
+def cached(queryset, timeout=None):
+    """Оборачивает любой queryset (например, ``User.objects.all()``)
+    в кешируемый.
+    """
+    clone = CachedQuerySet(model=queryset.model,
+                           query=queryset.query.chain(),
+                           using=queryset._db,
+                           hints=queryset._hints)
+    return clone.cached(timeout)
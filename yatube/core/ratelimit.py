@@ -0,0 +1,75 @@
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.dispatch import Signal
+from django.http import JsonResponse
+from django.shortcuts import render
+
+# Аргументы: request, scope.
+rate_limited = Signal()
+RATE_LIMITED_MESSAGE = 'Слишком много запросов. Попробуйте повторить позже.'
+
+
+def get_rate_limit_cache():
+    return caches[settings.RATE_LIMIT_CACHE_ALIAS]
+
+
+def get_client_ident(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f'ip:{request.META.get("REMOTE_ADDR", "")}'
+
+
+def hit(scope, ident, limit, period):
+    """Учитывает запрос в окне фиксированной длины и возвращает число
+    секунд до конца окна, если лимит превышен, иначе ``None``.
+
+    Обычно это один ``incr``; ``add`` нужен только первому запросу окна.
+    """
+    now = int(time.time())
+    window = now // period
+    key = f'ratelimit:{scope}:{ident}:{window}'
+    rate_limit_cache = get_rate_limit_cache()
+    try:
+        count = rate_limit_cache.incr(key)
+    except ValueError:
+        if rate_limit_cache.add(key, 1, period):
+            count = 1
+        else:
+            count = rate_limit_cache.incr(key)
+    if count > limit:
+        return (window + 1) * period - now
+    return None
+
+
+def ratelimit(scope, methods=None, json=False):
+    """Ограничивает частоту запросов к представлению для каждого
+    пользователя или IP-адреса анонима. Лимит берётся из
+    ``settings.RATE_LIMITS[scope]`` в виде ``(запросов, секунд)``;
+    несколько представлений с одной областью делят общий лимит.
+    Представления с ``json=True`` получают отказ в JSON, как и
+    остальные свои ошибки.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            rate = settings.RATE_LIMITS.get(scope)
+            if rate and (methods is None or request.method in methods):
+                retry_after = hit(scope, get_client_ident(request), *rate)
+                if retry_after is not None:
+                    rate_limited.send(sender=view, request=request,
+                                      scope=scope)
+                    if json:
+                        response = JsonResponse(
+                            {'error': RATE_LIMITED_MESSAGE,
+                             'retry_after': retry_after}, status=429)
+                    else:
+                        response = render(request, 'core/429.html',
+                                          status=429)
+                    response['Retry-After'] = str(retry_after)
+                    return response
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
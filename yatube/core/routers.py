@@ -0,0 +1,116 @@
+import random
+import sqlite3
+import time
+from contextvars import ContextVar
+from fnmatch import fnmatchcase
+
+from django.conf import settings
+from django.db import connections
+
+_routing = ContextVar('db_routing', default=None)
+
+PRIMARY = 'default'
+# Сессия и пользователь читаются лениво, уже в представлении. С
+# отставшей реплики вышедший пользователь снова оказался бы в системе,
+# а заблокированный — активным.
+PRIMARY_APPS = {'auth', 'sessions', 'users'}
+
+
+class RequestRouting:
+    """Куда читать в текущем запросе. Реплика выбирается один раз на
+    запрос, чтобы все его чтения видели один снимок данных.
+    """
+
+    def __init__(self):
+        self.replica = None
+        self.written = False
+
+
+def is_replica_view(view_name):
+    return any(fnmatchcase(view_name, pattern)
+               for pattern in settings.REPLICA_VIEWS)
+
+
+class ReplicaRouter:
+    """Пишет всегда в основную базу, а читает из реплики только в
+    представлениях из REPLICA_VIEWS. Команды, задачи и остальные
+    представления, а также пользователи и сессии читают из основной базы.
+    """
+
+    def db_for_read(self, model, **hints):
+        routing = _routing.get()
+        if (model._meta.app_label in PRIMARY_APPS or routing is None
+                or routing.replica is None or routing.written
+                or connections[PRIMARY].in_atomic_block):
+            return PRIMARY
+        return routing.replica
+
+    def db_for_write(self, model, **hints):
+        routing = _routing.get()
+        if routing is not None:
+            routing.written = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {PRIMARY, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db not in settings.DATABASE_REPLICAS
+
+
+class ReplicaRoutingMiddleware:
+    """Направляет чтения безопасных запросов к перечисленным
+    представлениям в реплику. Пользователь, который только что что-то
+    записал, REPLICA_PIN_SECONDS секунд читает из основной базы, чтобы
+    видеть свои изменения, пока реплика догоняет.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        routing = RequestRouting()
+        token = _routing.set(routing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _routing.reset(token)
+        if routing.written and settings.DATABASE_REPLICAS:
+            response.set_cookie(
+                settings.REPLICA_PIN_COOKIE,
+                str(int(time.time()) + settings.REPLICA_PIN_SECONDS),
+                max_age=settings.REPLICA_PIN_SECONDS, httponly=True,
+                samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        routing = _routing.get()
+        if (routing is not None and settings.DATABASE_REPLICAS
+                and request.method in ('GET', 'HEAD')
+                and not self.is_pinned(request)
+                and is_replica_view(request.resolver_match.view_name)):
+            routing.replica = random.choice(settings.DATABASE_REPLICAS)
+
+    def is_pinned(self, request):
+        try:
+            until = int(request.COOKIES[settings.REPLICA_PIN_COOKIE])
+        except (KeyError, ValueError):
+            return False
+        return until > time.time()
+
+
+def copy_database(source, target):
+    """Копирует файл SQLite через backup API: копия согласована, даже
+    если в основную базу в это время пишут.
+    """
+    source_connection = sqlite3.connect(source)
+    target_connection = sqlite3.connect(target)
+    try:
+        with target_connection:
+            source_connection.backup(target_connection)
+    finally:
+        target_connection.close()
+        source_connection.close()
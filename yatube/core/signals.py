@@ -0,0 +1,21 @@
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import querycache, slow_queries
+from .metrics import registry
+from .ratelimit import rate_limited
+
+
+@receiver(rate_limited)
+def count_rate_limited(sender, scope, **kwargs):
+    registry.inc('yatube_rate_limited_total', scope=scope)
+
+
+@receiver(connection_created)
+def install_slow_query_log(sender, connection, **kwargs):
+    slow_queries.install(connection)
+
+
+@receiver(connection_created)
+def install_query_cache_invalidation(sender, connection, **kwargs):
+    querycache.install(connection)
@@ -0,0 +1,179 @@
+import glob
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import RotatingFileHandler
+
+from django.conf import settings
+from django.db import DatabaseError
+
+_request = ContextVar('slow_query_request', default=None)
+_local = threading.local()
+_handlers = {}
+_handlers_lock = threading.Lock()
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER_RE = re.compile(r'%s|\?')
+IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)')
+SPACE_RE = re.compile(r'\s+')
+# Общие обёртки над ORM: полезнее показать код, который их вызвал.
+SKIPPED_MODULES = {'core.metrics', 'core.slow_queries', 'core.querycache',
+                   'core.loaders'}
+
+
+def get_fingerprint(sql):
+    """SQL без значений: запросы, отличающиеся только параметрами и
+    длиной списка IN, получают один отпечаток.
+    """
+    sql = STRING_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = PLACEHOLDER_RE.sub('?', sql)
+    sql = IN_LIST_RE.sub('(...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()
+
+
+def get_log_path():
+    """Свой файл журнала у каждого процесса: RotatingFileHandler
+    переименовывает файл при ротации, и общий файл процессы ротировали
+    бы вразнобой, теряя и перемешивая записи.
+    """
+    root, ext = os.path.splitext(settings.SLOW_QUERY_LOG)
+    return f'{root}.{os.getpid()}{ext}'
+
+
+def get_handler():
+    path = get_log_path()
+    with _handlers_lock:
+        handler = _handlers.get(path)
+        if handler is None:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handler = _handlers[path] = RotatingFileHandler(
+                path, maxBytes=settings.SLOW_QUERY_LOG_MAX_BYTES,
+                backupCount=settings.SLOW_QUERY_LOG_BACKUP_COUNT,
+                encoding='utf-8', delay=True)
+        return handler
+
+
+def get_origin():
+    """Строка шаблона и место в коде проекта, откуда пришёл запрос."""
+    template = code = None
+    frame = sys._getframe(2)
+    while frame is not None and (template is None or code is None):
+        node = frame.f_locals.get('self')
+        if (template is None and frame.f_code.co_name == 'render_annotated'
+                and getattr(node, 'origin', None) is not None
+                and getattr(node, 'token', None) is not None):
+            template = f'{node.origin.template_name}:{node.token.lineno}'
+        filename = frame.f_code.co_filename
+        if (code is None and filename.startswith(settings.BASE_DIR)
+                and 'site-packages' not in filename
+                and frame.f_globals.get('__name__') not in SKIPPED_MODULES):
+            code = (f'{os.path.relpath(filename, settings.BASE_DIR)}'
+                    f':{frame.f_lineno} {frame.f_code.co_name}')
+        frame = frame.f_back
+    return template, code
+
+
+def explain(connection, sql, params):
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return None
+    prefix = ('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+              else 'EXPLAIN ')
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return [' '.join(map(str, row)) for row in cursor.fetchall()]
+    except DatabaseError:
+        return None
+    finally:
+        _local.explaining = False
+
+
+def log_slow_query(connection, sql, params, many, duration, failed):
+    request = _request.get()
+    resolver_match = getattr(request, 'resolver_match', None)
+    template, code = get_origin()
+    entry = {
+        'time': datetime.now(timezone.utc).isoformat(),
+        'duration': round(duration, 6),
+        'database': connection.alias,
+        'sql': sql,
+        'params': None if many else params,
+        'fingerprint': get_fingerprint(sql),
+        'path': request.path if request is not None else None,
+        'view': resolver_match.view_name if resolver_match else None,
+        'template': template,
+        'code': code,
+        'failed': failed,
+        # После ошибки транзакция может быть уже прервана, и EXPLAIN
+        # упал бы вместо исходного исключения.
+        'plan': (None if many or failed
+                 else explain(connection, sql, params)),
+    }
+    # handle, а не emit: он берёт блокировку обработчика, и потоки не
+    # перемешивают строки и не переименовывают файл одновременно.
+    handler = get_handler()
+    handler.handle(logging.makeLogRecord(
+        {'msg': json.dumps(entry, ensure_ascii=False, default=str)}))
+
+
+def slow_query_wrapper(execute, sql, params, many, context):
+    """Обёртка execute, записывающая запросы дольше
+    SLOW_QUERY_THRESHOLD секунд.
+    """
+    started = time.perf_counter()
+    failed = True
+    try:
+        result = execute(sql, params, many, context)
+        failed = False
+        return result
+    finally:
+        duration = time.perf_counter() - started
+        threshold = settings.SLOW_QUERY_THRESHOLD
+        if (threshold is not None and duration >= threshold
+                and not getattr(_local, 'explaining', False)):
+            log_slow_query(context['connection'], sql, params, many,
+                           duration, failed)
+
+
+def install(connection):
+    # В начало списка: execute_wrapper() других обёрток снимает
+    # последний элемент и не должен задеть этот.
+    if slow_query_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, slow_query_wrapper)
+
+
+def read_log():
+    """Записи файлов всех процессов и их ротированных копий."""
+    root, ext = os.path.splitext(settings.SLOW_QUERY_LOG)
+    for path in glob.glob(f'{root}.*{ext}*'):
+        with open(path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+
+class SlowQueryMiddleware:
+    """Запоминает текущий запрос, чтобы медленный SQL можно было
+    связать с представлением.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = _request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
@@ -0,0 +1,259 @@
+import json
+import logging
+import os
+import random
+import socket
+import threading
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+TaskSpec = namedtuple('TaskSpec', 'func priority max_attempts timeout')
+
+# Имя задачи: TaskSpec. Заполняется декоратором task при импорте
+# модулей tasks приложений.
+registry = {}
+
+
+def task(name=None, priority=0, max_attempts=5, timeout=None):
+    """Регистрирует функцию как фоновую задачу. Аргументы задачи
+    хранятся в базе в JSON, поэтому передавать нужно ключи и строки, а
+    не объекты моделей.
+    """
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        registry[task_name] = TaskSpec(func, priority, max_attempts,
+                                       timeout)
+        func.task_name = task_name
+        return func
+    return decorator
+
+
+def get_spec(name):
+    try:
+        return registry[name]
+    except KeyError:
+        raise LookupError(f'Неизвестная задача {name}')
+
+
+def enqueue(name, args=(), kwargs=None, priority=None, key=None,
+            delay=None):
+    """Ставит задачу в очередь и сразу возвращает её. Пока задача с тем
+    же ключом ждёт или выполняется, новая не создаётся; выполненная или
+    упавшая задача с этим ключом ставится в очередь заново. Запись
+    делается в текущей транзакции, так что задача появится, только
+    если она зафиксирована.
+
+    В режиме TASKS_EAGER задача выполняется сразу, и delay не
+    учитывается: без воркера отложенную задачу выполнить некому.
+    """
+    name = getattr(name, 'task_name', name)
+    spec = get_spec(name)
+    if settings.TASKS_EAGER:
+        delay = None
+    fields = {
+        'name': name,
+        'payload': json.dumps({'args': list(args),
+                               'kwargs': kwargs or {}}),
+        'priority': spec.priority if priority is None else priority,
+        'max_attempts': spec.max_attempts,
+        'run_at': timezone.now() + timedelta(seconds=delay or 0),
+    }
+    task = None
+    if key is not None:
+        existing = Task.objects.filter(key=key).first()
+        if existing is not None:
+            # Условный UPDATE: из одновременных вызовов задачу
+            # перезапустит только один.
+            requeued = Task.objects.filter(
+                pk=existing.pk, status__in=(Task.DONE, Task.FAILED),
+            ).update(status=Task.QUEUED, attempts=0, error='', worker='',
+                     locked_until=None, finished=None, **fields)
+            if not requeued:
+                return existing
+            task = Task.objects.get(pk=existing.pk)
+    if task is None:
+        task = Task(key=key, **fields)
+        try:
+            with transaction.atomic():
+                task.save()
+        except IntegrityError:
+            if key is None:
+                raise
+            return Task.objects.get(key=key)
+    if settings.TASKS_EAGER:
+        Worker(threads=0).execute(claim_task(task.pk, 'eager'))
+        task.refresh_from_db()
+    return task
+
+
+def get_backoff(attempts):
+    """Экспоненциальная пауза перед повтором со случайным разбросом,
+    чтобы упавшие разом задачи не повторялись тоже разом.
+    """
+    delay = min(settings.TASKS_RETRY_MAX_DELAY,
+                settings.TASKS_RETRY_BASE_DELAY * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1)
+
+
+def get_timeout(name):
+    spec = registry.get(name)
+    if spec is None or spec.timeout is None:
+        return settings.TASKS_VISIBILITY_TIMEOUT
+    return spec.timeout
+
+
+def get_available(now):
+    """Задачи, которые можно брать: ждущие своего срока и брошенные
+    воркерами, у которых истёк тайм-аут видимости.
+    """
+    return (Q(status=Task.QUEUED, run_at__lte=now)
+            | Q(status=Task.RUNNING, locked_until__lt=now))
+
+
+def claim_task(pk, worker):
+    """Забирает задачу условным UPDATE: из нескольких воркеров строку
+    изменит только один, остальные получат None. Так очередь работает
+    и на SQLite, где нет SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    now = timezone.now()
+    task = Task.objects.filter(pk=pk).only('name').first()
+    if task is None:
+        return None
+    claimed = Task.objects.filter(
+        get_available(now), pk=pk, attempts__lt=F('max_attempts'),
+    ).update(
+        status=Task.RUNNING, worker=worker, attempts=F('attempts') + 1,
+        locked_until=now + timedelta(seconds=get_timeout(task.name)),
+    )
+    if not claimed:
+        return None
+    return Task.objects.get(pk=pk)
+
+
+def fail_expired():
+    """Задачи, чей воркер пропал на последней попытке, больше не
+    повторяются.
+    """
+    now = timezone.now()
+    return Task.objects.filter(
+        status=Task.RUNNING, locked_until__lt=now,
+        attempts__gte=F('max_attempts'),
+    ).update(status=Task.FAILED, finished=now,
+             error='Истёк тайм-аут видимости')
+
+
+def get_due(limit):
+    tasks = Task.objects.filter(
+        get_available(timezone.now()), attempts__lt=F('max_attempts'),
+    ).order_by('-priority', 'run_at', 'pk')
+    return list(tasks.values_list('pk', flat=True)[:limit])
+
+
+def purge_finished():
+    border = timezone.now() - timedelta(seconds=settings.TASKS_RETENTION)
+    return Task.objects.filter(status=Task.DONE,
+                               finished__lt=border).delete()[0]
+
+
+def log_failure(future):
+    """Ошибки самого воркера (например, база недоступна при взятии
+    задачи) иначе остались бы внутри future незамеченными.
+    """
+    error = future.exception()
+    if error is not None:
+        logger.error('Воркер не смог обработать задачу', exc_info=error)
+
+
+class Worker:
+    """Выполняет задачи из базы в пуле потоков. С threads=0 задачи
+    выполняются по очереди в текущем потоке.
+    """
+
+    def __init__(self, threads=None, name=None):
+        self.threads = (settings.TASKS_WORKER_THREADS if threads is None
+                        else threads)
+        self.name = name or (f'{socket.gethostname()}:{os.getpid()}'
+                             f':{random.getrandbits(16):04x}')
+        self.stopping = threading.Event()
+
+    def execute(self, task):
+        """Выполняет забранную задачу и записывает результат, если
+        задачу за это время не забрал другой воркер.
+        """
+        if task is None:
+            return
+        current = Task.objects.filter(pk=task.pk, worker=task.worker,
+                                      attempts=task.attempts)
+        try:
+            payload = json.loads(task.payload)
+            get_spec(task.name).func(*payload['args'], **payload['kwargs'])
+        except Exception as error:
+            logger.exception('Задача %s упала', task)
+            now = timezone.now()
+            if task.attempts >= task.max_attempts:
+                current.update(status=Task.FAILED, error=repr(error),
+                               finished=now)
+            else:
+                current.update(
+                    status=Task.QUEUED, error=repr(error), locked_until=None,
+                    run_at=now + timedelta(
+                        seconds=get_backoff(task.attempts)))
+        else:
+            current.update(status=Task.DONE, error='',
+                           finished=timezone.now())
+
+    def run_in_thread(self, pk):
+        close_old_connections()
+        try:
+            self.execute(claim_task(pk, self.name))
+        finally:
+            close_old_connections()
+
+    def work_off(self):
+        """Выполняет все задачи, срок которых наступил, в текущем
+        потоке. Возвращает их число.
+        """
+        count = 0
+        fail_expired()
+        while True:
+            due = get_due(1)
+            if not due:
+                return count
+            task = claim_task(due[0], self.name)
+            if task is not None:
+                self.execute(task)
+                count += 1
+
+    def run(self, once=False, poll_interval=None):
+        if not self.threads:
+            self.work_off()
+            return
+        poll_interval = (settings.TASKS_POLL_INTERVAL if poll_interval is None
+                         else poll_interval)
+        running = set()
+        with ThreadPoolExecutor(self.threads) as executor:
+            while not self.stopping.is_set():
+                fail_expired()
+                free = self.threads - len(running)
+                due = get_due(free) if free else []
+                for pk in due:
+                    future = executor.submit(self.run_in_thread, pk)
+                    future.add_done_callback(log_failure)
+                    running.add(future)
+                if once and not due and not running:
+                    break
+                if running:
+                    _, running = wait(running, timeout=poll_interval,
+                                      return_when=FIRST_COMPLETED)
+                else:
+                    self.stopping.wait(poll_interval)
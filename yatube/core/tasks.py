@@ -0,0 +1,25 @@
+from django.conf import settings
+from sorl.thumbnail import get_thumbnail
+
+from . import changelog
+from .outbox import deliver_batch
+from .taskqueue import enqueue, task
+
+
+@task(priority=5)
+def deliver_outbox():
+    """Отправляет пачку писем; если пачка полная, следом ставит
+    следующую.
+    """
+    if deliver_batch() >= settings.EMAIL_BATCH_SIZE:
+        enqueue(deliver_outbox)
+
+
+@task(max_attempts=3)
+def create_thumbnail(name, geometry_string, options):
+    get_thumbnail(name, geometry_string, sync=True, **options)
+
+
+@task(priority=-10)
+def prune_changes():
+    changelog.prune_changes()
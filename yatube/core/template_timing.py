@@ -0,0 +1,149 @@
+import logging
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.template import Engine
+from django.template.base import TokenType, VariableNode
+from django.template.loader_tags import IncludeNode
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+_timings = ContextVar('template_timings', default=None)
+
+
+class TemplateTimings:
+    """Число вызовов и суммарное время шаблонов, include и тегов за
+    один запрос. Время вложенных узлов входит и в родительские.
+    """
+
+    def __init__(self):
+        self.calls = defaultdict(int)
+        self.seconds = defaultdict(float)
+
+    def add(self, label, seconds):
+        self.calls[label] += 1
+        self.seconds[label] += seconds
+
+    def top(self, limit):
+        return sorted(self.seconds, key=self.seconds.get,
+                      reverse=True)[:limit]
+
+
+def record(label, seconds):
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(label, seconds)
+
+
+def get_node_label(node, builtins):
+    """Что замерять: include, теги и фильтры из подключаемых
+    библиотек. Встроенные теги вроде for и if только обрамляют другие
+    узлы и в отчёте были бы шумом.
+    """
+    if isinstance(node, IncludeNode):
+        return f'include {node.template.token}'
+    if isinstance(node, VariableNode):
+        names = [func.__name__ for func, _
+                 in node.filter_expression.filters
+                 if func.__name__ not in builtins['filters']]
+        return f'filter {"|".join(names)}' if names else None
+    token = getattr(node, 'token', None)
+    if token is None or token.token_type != TokenType.BLOCK:
+        return None
+    name = token.contents.split()[0]
+    return None if name in builtins['tags'] else f'tag {name}'
+
+
+def get_header_text(label):
+    return (label.replace('"', "'").encode('ascii', 'backslashreplace')
+            .decode())
+
+
+def wrap_node(node, label):
+    render = node.render
+
+    def timed_render(context):
+        if _timings.get() is None:
+            return render(context)
+        started = time.perf_counter()
+        try:
+            return render(context)
+        finally:
+            record(label, time.perf_counter() - started)
+
+    node.render = timed_render
+
+
+class TimedEngine(Engine):
+    """Engine, который после загрузки шаблона оборачивает замеряемые
+    узлы. Через find_template проходят и include, и extends.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.builtin_names = {'tags': set(), 'filters': set()}
+        for library in self.template_builtins:
+            self.builtin_names['tags'].update(library.tags)
+            self.builtin_names['filters'].update(library.filters)
+
+    def instrument(self, template):
+        if getattr(template, 'timed', False):
+            return template
+        for node in template.nodelist.get_nodes_by_type(object):
+            label = get_node_label(node, self.builtin_names)
+            if label is not None:
+                wrap_node(node, label)
+        template.timed = True
+        return template
+
+    def find_template(self, name, dirs=None, skip=None):
+        template, origin = super().find_template(name, dirs, skip)
+        if settings.TEMPLATE_TIMING:
+            self.instrument(template)
+        return template, origin
+
+    def from_string(self, template_code):
+        template = super().from_string(template_code)
+        if settings.TEMPLATE_TIMING:
+            self.instrument(template)
+        return template
+
+
+class TemplateTimingMiddleware:
+    """Собирает время шаблонов за запрос и сообщает его в заголовке
+    Server-Timing, строкой лога и метриками.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not settings.TEMPLATE_TIMING:
+            return self.get_response(request)
+        timings = TemplateTimings()
+        token = _timings.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        if not timings.calls:
+            return response
+        top = timings.top(settings.TEMPLATE_TIMING_HEADER_SIZE)
+        response['Server-Timing'] = ', '.join(
+            f'tpl{number};dur={timings.seconds[label] * 1000:.2f};'
+            f'desc="{get_header_text(label)} '
+            f'x{timings.calls[label]}"'
+            for number, label in enumerate(top))
+        logger.info('%s %s', request.path, ' '.join(
+            f'[{label}] {timings.calls[label]}x '
+            f'{timings.seconds[label] * 1000:.1f}ms' for label in top))
+        for label in timings.calls:
+            registry.inc('yatube_template_node_calls_total',
+                         timings.calls[label], node=label)
+            registry.inc('yatube_template_node_seconds_total',
+                         timings.seconds[label], node=label)
+        return response
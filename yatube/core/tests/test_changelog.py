@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from ..changelog import RELOAD, ChangeLog, prune_changes
+from ..models import DataChange
+
+
+@override_settings(CHANGE_LOG_POLL_INTERVAL=0, CHANGE_LOG_MAX_KEYS=3)
+class ChangeLogTest(TransactionTestCase):
+
+    def setUp(self):
+        self.log = ChangeLog('test')
+        self.log.reset()
+
+    def test_keys_after_commit(self):
+        """Ключи приходят один раз, в порядке записи и без повторов."""
+        for key in ('1', '2', '1'):
+            self.log.record(key)
+        DataChange.objects.create(name='other', key='3')
+        self.assertEqual(self.log.poll(), ['1', '2'])
+        self.assertEqual(self.log.poll(), [])
+
+    def test_full_reload(self):
+        """Слишком много изменений или явная просьба — перечитать всё."""
+        for key in ('1', '2', '3', '4'):
+            self.log.record(key)
+        self.assertIsNone(self.log.poll())
+        self.log.record(RELOAD)
+        self.assertIsNone(self.log.poll())
+
+    def test_old_records_pruned(self):
+        DataChange.objects.create(name='test', key='1')
+        DataChange.objects.filter(key='1').update(
+            created=timezone.now() - timedelta(days=1))
+        self.log.record('2')
+        self.assertEqual(prune_changes(), 1)
+        self.assertEqual(list(DataChange.objects.values_list(
+            'key', flat=True)), ['2'])
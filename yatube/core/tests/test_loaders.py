@@ -0,0 +1,56 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Group, Post, User
+
+from ..loaders import load_related, use_identity_map
+
+
+class LoadRelatedTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.authors = [User.objects.create_user(username=f'author{number}')
+                       for number in range(3)]
+        for author in cls.authors:
+            post = Post.objects.create(author=author,
+                                       text='Тестовый пост',
+                                       group=cls.group)
+            Comment.objects.create(post=post, author=author,
+                                   text='Тестовый коммент')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_related_objects_loaded_in_one_query_per_model(self):
+        """Авторы и группы постов загружаются одним запросом на модель."""
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(2):
+            load_related(posts, 'author', 'group')
+            for post in posts:
+                self.assertIn(post.author, self.authors)
+                self.assertEqual(post.group, self.group)
+
+    def test_identity_map_deduplicates_within_request(self):
+        """Уже загруженные за запрос объекты не запрашиваются повторно."""
+        posts = list(Post.objects.all())
+        comments = list(Comment.objects.all())
+        with use_identity_map():
+            load_related(posts, 'author')
+            with self.assertNumQueries(0):
+                load_related(comments, 'author')
+        self.assertIs(comments[0].author,
+                      next(post.author for post in posts
+                           if post.pk == comments[0].post_id))
+
+    def test_index_query_count_does_not_depend_on_authors(self):
+        """Число запросов главной страницы не зависит от числа авторов."""
+        with self.assertNumQueries(4):
+            self.client.get(reverse('posts:index'))
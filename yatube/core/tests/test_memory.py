@@ -0,0 +1,80 @@
+import shutil
+import tempfile
+import tracemalloc
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from ..memory import MemoryProfile, load_reports
+
+TEMP_MEMORY_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+LEAK = []
+
+
+@override_settings(MEMORY_PROFILING=True, MEMORY_PROFILING_SAMPLE_RATE=0,
+                   MEMORY_PROFILING_DIR=TEMP_MEMORY_DIR,
+                   MEMORY_LEAK_WINDOW=3, MEMORY_LEAK_MIN_BYTES=1024)
+class MemoryProfilingTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_superuser(
+            username='teststaff', email='staff@example.com',
+            password='password')
+        Post.objects.create(author=cls.staff, text='Тестовый пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEMORY_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_MEMORY_DIR, ignore_errors=True)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def tearDown(self):
+        tracemalloc.stop()
+
+    def test_staff_request_profiled(self):
+        """Запрос сотрудника с параметром замеряется и виден в админке."""
+        with self.assertLogs('core.memory', 'INFO'):
+            self.staff_client.get(reverse('posts:index'), {'_memory': 1})
+        report, = load_reports()
+        self.assertEqual(report['name'], 'posts:index')
+        self.assertGreater(report['peak'], 0)
+        self.assertTrue(report['top'])
+        response = self.staff_client.get(reverse('core:memory_report'))
+        self.assertContains(response, 'posts:index')
+
+    def test_growing_memory_flagged(self):
+        """Постоянный прирост памяти отмечается как возможная утечка."""
+        with self.assertLogs('core.memory', 'INFO') as logs:
+            for _ in range(3):
+                with MemoryProfile('leaky') as profile:
+                    LEAK.append(bytearray(100 * 1024))
+        LEAK.clear()
+        self.assertTrue(profile.report['leak_suspected'])
+        self.assertIn('possible leak', logs.output[-1])
+
+    def test_command_profiled(self):
+        """profile_memory выполняет команду под замером."""
+        out = StringIO()
+        with self.assertLogs('core.memory', 'INFO'), \
+                patch('core.management.commands.profile_memory.call_command'
+                      ) as command:
+            call_command('profile_memory', 'update_suggestions', '--all',
+                         stdout=out)
+        command.assert_called_once_with('update_suggestions', '--all')
+        self.assertIn('Пик', out.getvalue())
+        self.assertEqual(load_reports()[0]['name'],
+                         'command update_suggestions')
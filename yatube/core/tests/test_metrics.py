@@ -0,0 +1,99 @@
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from ..metrics import AGGREGATE_FILE, Registry, render_metrics
+
+TEMP_METRICS_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(METRICS_DIR=TEMP_METRICS_DIR, METRICS_TOKEN='secret')
+class MetricsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='testauthor')
+        Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_METRICS_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_metrics_endpoint(self):
+        """После запроса /metrics отдаёт метрики представления, SQL,
+        кеша и шаблонов."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        for line in (
+            '# TYPE yatube_view_duration_seconds histogram',
+            'yatube_view_duration_seconds_count{view="posts:index"}',
+            'yatube_db_queries_total{view="posts:index"}',
+            'yatube_cache_requests_total{result="miss"}',
+            'yatube_template_render_seconds_bucket'
+            '{template="posts/index.html",le="+Inf"}',
+        ):
+            with self.subTest(line=line):
+                self.assertContains(response, line)
+
+    def test_processes_aggregated(self):
+        """Значения разных процессов складываются."""
+        with patch('os.getpid', return_value=1):
+            first = Registry()
+            first.inc('yatube_rate_limited_total', 2, scope='follow')
+            first.flush()
+        with patch('os.getpid', return_value=2):
+            second = Registry()
+            second.inc('yatube_rate_limited_total', 3, scope='follow')
+            second.flush()
+        self.assertIn('yatube_rate_limited_total{scope="follow"} 5.0',
+                      render_metrics())
+
+    def test_finished_process_merged(self):
+        """Файл завершившегося процесса вливается в общую сумму, и
+        новый процесс с тем же PID не уменьшает счётчик.
+        """
+        directory = tempfile.mkdtemp(dir=TEMP_METRICS_DIR)
+        with override_settings(METRICS_DIR=directory):
+            with patch('os.getpid', return_value=1):
+                finished = Registry()
+            finished.inc('yatube_emails_total', 4, status='sent')
+            finished.flush()
+            with patch('core.metrics.is_alive', return_value=False):
+                render_metrics()
+            self.assertEqual(
+                [name for name in os.listdir(directory)
+                 if name.endswith('.json')], [AGGREGATE_FILE])
+            with patch('os.getpid', return_value=1):
+                restarted = Registry()
+            restarted.inc('yatube_emails_total', 1, status='sent')
+            restarted.flush()
+            self.assertIn('yatube_emails_total{status="sent"} 5.0',
+                          render_metrics())
+
+    def test_metrics_forbidden(self):
+        """Метрики недоступны без токена и с неверным токеном."""
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'}):
+            with self.subTest(headers=headers):
+                response = self.client.get(reverse('metrics'), **headers)
+                self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_TOKEN=None)
+    def test_metrics_closed_without_token(self):
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer None')
+        self.assertEqual(response.status_code, 403)
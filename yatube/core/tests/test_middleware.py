@@ -0,0 +1,74 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, User
+
+
+class AnonymousPageCacheTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='testauthor')
+        cls.post = Post.objects.create(author=cls.author,
+                                       text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.author_client = Client()
+        self.author_client.force_login(self.author)
+
+    def test_anonymous_page_served_from_cache(self):
+        """Повторный запрос анонима отдаётся из кеша страниц."""
+        url = reverse('posts:profile', args=(self.author,))
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, self.post.text)
+
+    def test_authorized_user_bypasses_cache(self):
+        """Авторизованный пользователь не получает страницу из кеша."""
+        url = reverse('posts:profile', args=(self.author,))
+        self.client.get(url)
+        response = self.author_client.get(url)
+        self.assertFalse(response.has_header('X-Page-Cache'))
+
+    def test_new_post_invalidates_cache(self):
+        """Новый пост сбрасывает закешированные страницы."""
+        url = reverse('posts:profile', args=(self.author,))
+        self.client.get(url)
+        Post.objects.create(author=self.author, text='Свежий пост')
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Свежий пост')
+
+    def test_follow_invalidates_profile(self):
+        """Подписка сбрасывает страницу профиля со счётчиком."""
+        url = reverse('posts:profile', args=(self.author,))
+        self.client.get(url)
+        follower = User.objects.create_user(username='testfollower')
+        Follow.objects.create(user=follower, author=self.author)
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response,
+                            '<span id="followers-count">1</span>')
+
+    def test_cache_key_includes_host(self):
+        """Страница одного хоста не отдаётся посетителю другого."""
+        url = reverse('posts:profile', args=(self.author,))
+        self.client.get(url)
+        response = self.client.get(url, HTTP_HOST='localhost')
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+
+    @override_settings(TEMPLATE_TIMING=True)
+    def test_per_response_headers_not_replayed(self):
+        """Заголовки замеров одного ответа не повторяются из кеша."""
+        url = reverse('posts:index')
+        with self.assertLogs('core.template_timing', 'INFO'):
+            response = self.client.get(url)
+        self.assertTrue(response.has_header('Server-Timing'))
+        response = self.client.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertFalse(response.has_header('Server-Timing'))
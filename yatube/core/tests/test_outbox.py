@@ -0,0 +1,112 @@
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from ..models import OutgoingEmail, Task
+from ..outbox import URGENT, deliver_batch, queue_email
+from ..taskqueue import Worker
+
+User = get_user_model()
+
+
+class CountingBackend(EmailBackend):
+    """locmem, считающий открытые соединения и не принимающий адреса
+    из домена broken.example.
+    """
+    opened = 0
+    available = True
+
+    def open(self):
+        if not CountingBackend.available:
+            raise ConnectionRefusedError('Почтовый сервер недоступен')
+        CountingBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any(to.endswith('@broken.example') for to in message.to):
+                raise ValueError('Адрес отклонён')
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND='core.tests.test_outbox.CountingBackend',
+    EMAIL_BATCH_SIZE=3, EMAIL_MAX_ATTEMPTS=2)
+class OutboxTest(TestCase):
+
+    def setUp(self):
+        CountingBackend.opened = 0
+        CountingBackend.available = True
+
+    def test_batch_uses_one_connection(self):
+        """Пачка уходит через одно соединение, важные письма первыми."""
+        for number in range(4):
+            queue_email(f'user{number}@example.com', 'Тема', 'Текст')
+        queue_email('reset@example.com', 'Сброс пароля', 'Текст',
+                    priority=URGENT)
+        self.assertEqual(deliver_batch(), 3)
+        self.assertEqual(CountingBackend.opened, 1)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].to, ['reset@example.com'])
+        self.assertEqual(OutgoingEmail.objects.filter(
+            status=OutgoingEmail.SENT).count(), 3)
+        deliver_batch()
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_failed_message_does_not_block_batch(self):
+        """Отклонённое письмо повторяется, затем помечается ошибкой."""
+        broken = queue_email('user@broken.example', 'Тема', 'Текст')
+        queue_email('user@example.com', 'Тема', 'Текст')
+        with self.assertLogs('core.outbox', 'WARNING'):
+            deliver_batch()
+        self.assertEqual(len(mail.outbox), 1)
+        broken.refresh_from_db()
+        self.assertEqual(broken.status, OutgoingEmail.QUEUED)
+        self.assertIn('Адрес отклонён', broken.error)
+        with self.assertLogs('core.outbox', 'WARNING'):
+            deliver_batch()
+        broken.refresh_from_db()
+        self.assertEqual(broken.status, OutgoingEmail.FAILED)
+
+    def test_unavailable_server_requeues_batch(self):
+        queue_email('user@example.com', 'Тема', 'Текст')
+        CountingBackend.available = False
+        with self.assertRaises(ConnectionRefusedError):
+            deliver_batch()
+        self.assertEqual(OutgoingEmail.objects.get().status,
+                         OutgoingEmail.QUEUED)
+
+    def test_password_reset_mail_queued(self):
+        """Письмо сброса пароля отправляется воркером, а не в запросе."""
+        User.objects.create_user(username='testuser',
+                                 email='user@example.com',
+                                 password='password')
+        response = Client().post(reverse('users:password_reset_form'),
+                                 {'email': 'user@example.com'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.priority, URGENT)
+        Task.objects.update(run_at=timezone.now())
+        Worker(threads=0).work_off()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['user@example.com'])
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutgoingEmail.SENT)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_password_reset_mail_sent_without_worker(self):
+        """Без воркера, в режиме TASKS_EAGER, письмо сброса пароля
+        уходит сразу, хотя отправка пачки отложена до конца окна.
+        """
+        User.objects.create_user(username='testuser',
+                                 email='user@example.com',
+                                 password='password')
+        Client().post(reverse('users:password_reset_form'),
+                      {'email': 'user@example.com'})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OutgoingEmail.objects.get().status,
+                         OutgoingEmail.SENT)
@@ -0,0 +1,100 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.admin import PostAdmin
+from posts.models import Comment, Post, User
+
+from ..paginator import EstimatedCountPaginator
+
+
+class EstimatedCountPaginatorTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='testauthor')
+        cls.posts = [Post.objects.create(author=cls.author,
+                                         text=f'Тестовый пост {number}')
+                     for number in range(5)]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_exact_count_below_limit(self):
+        paginator = EstimatedCountPaginator(Post.objects.all(), 2)
+        self.assertEqual(paginator.count, 5)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=2)
+    def test_count_estimated_above_limit(self):
+        """Сверх лимита число строк оценивается по ключу."""
+        self.posts[1].delete()
+        paginator = EstimatedCountPaginator(Post.objects.all(), 2)
+        self.assertEqual(paginator.count, self.posts[-1].pk)
+
+    @override_settings(ADMIN_EXACT_COUNT_LIMIT=2)
+    def test_filtered_count_exact_above_limit(self):
+        """Отфильтрованный список считается точно и сверх лимита."""
+        paginator = EstimatedCountPaginator(
+            Post.objects.exclude(pk=self.posts[0].pk), 2)
+        self.assertEqual(paginator.count, 4)
+
+    def test_page_keeps_order(self):
+        """Страница, собранная по ключам, сохраняет порядок."""
+        paginator = EstimatedCountPaginator(Post.objects.order_by('pk'), 2)
+        self.assertEqual(list(paginator.page(2)), self.posts[2:4])
+
+
+class AdminChangelistTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            username='testadmin', email='admin@example.com',
+            password='password')
+        cls.post = Post.objects.create(author=cls.admin, text='Пост')
+        Comment.objects.create(post=cls.post, author=cls.admin,
+                               text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.admin)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_queries_do_not_grow_with_rows(self):
+        """Число запросов списка не зависит от числа строк."""
+        for name in ('admin:posts_comment_changelist',
+                     'admin:posts_post_changelist'):
+            with self.subTest(name=name):
+                url = reverse(name)
+                # Первый запрос ещё загружает пользователя в кеш.
+                self.count_queries(url)
+                before = self.count_queries(url)
+                for number in range(5):
+                    author = User.objects.create_user(
+                        username=f'{name}{number}')
+                    Comment.objects.create(post=self.post, author=author,
+                                           text='Комментарий')
+                    Post.objects.create(author=author, text='Пост')
+                self.assertEqual(self.count_queries(url), before)
+
+    def test_second_page_with_list_editable(self):
+        """Вторая страница списка постов с list_editable открывается."""
+        url = reverse('admin:posts_post_changelist')
+        per_page = PostAdmin.list_per_page
+        Post.objects.bulk_create([Post(author=self.admin, text=f'Пост {n}')
+                                  for n in range(per_page + 5)])
+        response = self.client.get(url, {'p': 1})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['cl'].result_list), 6)
+        self.assertEqual(
+            len(response.context['cl'].formset.forms), 6)
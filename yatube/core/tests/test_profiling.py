@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from ..profiling import list_profiles
+
+TEMP_PROFILING_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(PROFILING_DIR=TEMP_PROFILING_DIR, PROFILING_MAX_FILES=2)
+class ProfilingMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.staff = User.objects.create_superuser(
+            username='teststaff', email='staff@example.com',
+            password='password')
+        cls.user = User.objects.create_user(username='testuser')
+        Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_PROFILING_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_PROFILING_DIR, ignore_errors=True)
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def test_staff_flag_saves_profile(self):
+        """Сотрудник получает профиль запроса по параметру."""
+        response = self.staff_client.get(reverse('posts:index'),
+                                         {'_profile': 1})
+        name = response['X-Profile']
+        self.assertIn('posts.index', name)
+        for suffix in ('.prof', '.collapsed'):
+            self.assertTrue(os.path.exists(
+                os.path.join(TEMP_PROFILING_DIR, name + suffix)))
+        response = self.staff_client.get(
+            reverse('core:profile_detail', args=(name,)))
+        self.assertContains(response, 'function calls')
+        response = self.staff_client.get(
+            reverse('core:profile_download', args=(name, 'stacks')))
+        self.assertEqual(response.status_code, 200)
+        response = self.staff_client.get(
+            reverse('core:profile_download', args=(name, 'unknown')))
+        self.assertEqual(response.status_code, 404)
+
+    def test_flag_ignored_for_regular_user(self):
+        """Обычный пользователь не может включить профилирование."""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(reverse('posts:index'), {'_profile': 1})
+        self.assertFalse(response.has_header('X-Profile'))
+        self.assertEqual(list_profiles(), [])
+
+    def test_old_profiles_removed(self):
+        """Хранится не больше PROFILING_MAX_FILES профилей."""
+        for _ in range(3):
+            self.staff_client.get(reverse('posts:index'), {'_profile': 1})
+        self.assertEqual(len(list_profiles()), 2)
+        response = self.staff_client.get(reverse('core:profile_list'))
+        self.assertEqual(response.context['profiles'], list_profiles())
@@ -0,0 +1,118 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+
+from posts.models import Follow, Group, Post, User
+
+from ..checks import W001, check_query_cache
+from ..querycache import cached, get_table_generations
+
+
+class QueryCacheTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.author = User.objects.create_user(username='testauthor')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(author=cls.author,
+                                       text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeated_query_served_from_cache(self):
+        """Повторный запрос и подсчёт берутся из кеша."""
+        self.assertEqual(Group.objects.cached().get(slug='test-slug'),
+                         self.group)
+        self.assertEqual(Post.objects.cached().count(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(Group.objects.cached().get(slug='test-slug'),
+                             self.group)
+            self.assertEqual(Post.objects.cached().count(), 1)
+
+    def test_write_invalidates_cached_query(self):
+        """Запись в таблицу сбрасывает закешированный запрос."""
+        list(Post.objects.cached())
+        Post.objects.create(author=self.author, text='Новый пост')
+        self.assertEqual(len(Post.objects.cached()), 2)
+        Post.objects.update(text='Изменённый пост')
+        self.assertEqual(Post.objects.cached()[0].text, 'Изменённый пост')
+
+    def test_joined_table_write_invalidates_cached_query(self):
+        """Запись в присоединённую таблицу сбрасывает запрос."""
+        feed = Post.objects.filter(author__following__user=self.user)
+        self.assertEqual(len(feed.cached()), 0)
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(len(feed.cached()), 1)
+
+    def test_plain_manager_write_invalidates_cached_query(self):
+        """Обычные менеджеры тоже сбрасывают запросы: .update() и
+        bulk_create() без сигналов.
+        """
+        users = cached(User.objects.filter(first_name='Иван'))
+        self.assertEqual(len(users), 0)
+        User.objects.filter(pk=self.user.pk).update(first_name='Иван')
+        self.assertEqual(len(cached(User.objects.filter(first_name='Иван'))),
+                         1)
+        follows = cached(Follow.objects.all())
+        self.assertEqual(len(follows), 0)
+        Follow.objects.bulk_create([Follow(user=self.user,
+                                           author=self.author)])
+        self.assertEqual(len(cached(Follow.objects.all())), 1)
+
+    def test_subquery_table_write_invalidates_cached_query(self):
+        """Запись в таблицу из подзапроса сбрасывает запрос."""
+        authors = Follow.objects.filter(user=self.user).values('author')
+        self.assertEqual(
+            len(Post.objects.filter(author__in=authors).cached()), 0)
+        Follow.objects.bulk_create([Follow(user=self.user,
+                                           author=self.author)])
+        self.assertEqual(
+            len(Post.objects.filter(author__in=authors).cached()), 1)
+
+    def test_wrapped_queryset_cached(self):
+        """Произвольный queryset можно сделать кешируемым."""
+        cached(User.objects.all()).get(username='testuser')
+        with self.assertNumQueries(0):
+            user = cached(User.objects.all()).get(username='testuser')
+        self.assertEqual(user, self.user)
+
+
+class QueryCacheCommitTest(TransactionTestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_generation_bumped_again_after_commit(self):
+        """После фиксации поколение сдвигается ещё раз: запросы,
+        закешированные до неё, не переживут запись.
+        """
+        table = Group._meta.db_table
+        with transaction.atomic():
+            Group.objects.create(title='Группа', slug='group',
+                                 description='Описание')
+            inside = get_table_generations([table])
+        self.assertNotEqual(get_table_generations([table]), inside)
+
+
+class QueryCacheCheckTest(SimpleTestCase):
+
+    def test_local_cache_reported(self):
+        """check --deploy предупреждает о кеше в памяти процесса."""
+        self.assertEqual(check_query_cache(None), [W001])
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    }, QUERY_CACHE_ALIAS='shared')
+    def test_shared_cache_accepted(self):
+        self.assertEqual(check_query_cache(None), [])
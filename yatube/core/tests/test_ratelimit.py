@@ -0,0 +1,91 @@
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Follow, Post, User
+
+from ..checks import W002, check_rate_limit_cache
+from ..ratelimit import rate_limited
+
+
+@override_settings(RATE_LIMITS={'add_comment': (2, 60), 'follow': (1, 60)})
+class RateLimitTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.author = User.objects.create_user(username='testauthor')
+        cls.post = Post.objects.create(author=cls.author,
+                                       text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_requests_over_limit_rejected(self):
+        """Запросы сверх лимита получают 429 и не выполняются."""
+        url = reverse('posts:add_comment', args=(self.post.pk,))
+        scopes = []
+
+        def on_rate_limited(scope, **kwargs):
+            scopes.append(scope)
+
+        rate_limited.connect(on_rate_limited)
+        self.addCleanup(rate_limited.disconnect, on_rate_limited)
+        for text in ('Первый', 'Второй'):
+            response = self.authorized_client.post(url, {'text': text})
+            self.assertEqual(response.status_code, 302)
+        response = self.authorized_client.post(url, {'text': 'Третий'})
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(response.has_header('Retry-After'))
+        self.assertEqual(self.post.comments.count(), 2)
+        self.assertEqual(scopes, ['add_comment'])
+
+    def test_json_endpoint_gets_json_rejection(self):
+        """JSON-подписка получает отказ в JSON."""
+        self.authorized_client.post(
+            reverse('posts:profile_follow_json', args=(self.author,)))
+        response = self.authorized_client.post(
+            reverse('posts:profile_unfollow_json', args=(self.author,)))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json()['retry_after'],
+                         int(response['Retry-After']))
+
+    def test_limit_is_per_user(self):
+        """Лимит одного пользователя не влияет на другого."""
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=(self.author,)))
+        other_client = Client()
+        other_client.force_login(self.author)
+        response = other_client.get(
+            reverse('posts:profile_follow', args=(self.user,)))
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Follow.objects.count(), 2)
+
+    def test_follow_and_unfollow_share_limit(self):
+        """Подписка и отписка расходуют общий лимит."""
+        self.authorized_client.get(
+            reverse('posts:profile_follow', args=(self.author,)))
+        response = self.authorized_client.get(
+            reverse('posts:profile_unfollow', args=(self.author,)))
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(Follow.objects.filter(user=self.user).exists())
+
+
+class RateLimitCacheCheckTest(SimpleTestCase):
+
+    def test_local_cache_reported(self):
+        """check --deploy предупреждает о кеше в памяти процесса."""
+        self.assertEqual(check_rate_limit_cache(None), [W002])
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    }, RATE_LIMIT_CACHE_ALIAS='shared')
+    def test_shared_cache_accepted(self):
+        self.assertEqual(check_rate_limit_cache(None), [])
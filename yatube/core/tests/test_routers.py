@@ -0,0 +1,116 @@
+import os
+import sqlite3
+import tempfile
+
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.db import router
+from django.http import HttpResponse
+from django.test import (RequestFactory, SimpleTestCase, TestCase,
+                         override_settings)
+from django.urls import resolve
+
+from posts.duplicates import DuplicateIndex
+from posts.follow_graph import FollowGraph
+from posts.models import Post
+from posts.ranking import build_top
+from posts.related import RelatedPostsIndex
+
+from ..routers import ReplicaRoutingMiddleware, copy_database
+
+
+@override_settings(DATABASE_REPLICAS=['replica1', 'replica2'])
+class ReplicaRoutingTest(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.middleware = ReplicaRoutingMiddleware(self.get_response)
+
+    def view(self, request):
+        self.read_db = router.db_for_read(Post)
+        self.auth_dbs = {router.db_for_read(model)
+                         for model in (User, Session)}
+        if request.method == 'POST':
+            router.db_for_write(Post)
+            self.read_after_write = router.db_for_read(Post)
+        return HttpResponse()
+
+    def get_response(self, request):
+        request.resolver_match = resolve(request.path)
+        self.middleware.process_view(request, self.view, (), {})
+        return self.view(request)
+
+    def test_feed_reads_from_replica(self):
+        self.middleware(self.factory.get('/'))
+        self.assertIn(self.read_db, ('replica1', 'replica2'))
+        self.middleware(self.factory.get('/admin/posts/post/'))
+        self.assertIn(self.read_db, ('replica1', 'replica2'))
+
+    def test_users_and_sessions_read_from_primary(self):
+        """Ленивые чтения сессии и пользователя в представлении из
+        REPLICA_VIEWS идут в основную базу.
+        """
+        self.middleware(self.factory.get('/'))
+        self.assertIn(self.read_db, ('replica1', 'replica2'))
+        self.assertEqual(self.auth_dbs, {'default'})
+
+    def test_other_views_read_from_primary(self):
+        self.middleware(self.factory.get('/create/'))
+        self.assertEqual(self.read_db, 'default')
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    def test_writer_pinned_to_primary(self):
+        """После записи чтения идут в основную базу: до конца запроса
+        и несколько секунд по cookie.
+        """
+        response = self.middleware(self.factory.post('/'))
+        self.assertEqual(self.read_after_write, 'default')
+        cookie = response.cookies['read_primary_until']
+        request = self.factory.get('/')
+        request.COOKIES['read_primary_until'] = cookie.value
+        self.middleware(request)
+        self.assertEqual(self.read_db, 'default')
+        request = self.factory.get('/')
+        request.COOKIES['read_primary_until'] = '0'
+        self.middleware(request)
+        self.assertNotEqual(self.read_db, 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        response = self.middleware(self.factory.post('/'))
+        self.assertNotIn('read_primary_until', response.cookies)
+        self.middleware(self.factory.get('/'))
+        self.assertEqual(self.read_db, 'default')
+
+
+class PrimaryLoadersTest(TestCase):
+    """Общие для процесса индексы и кешируемый топ читают основную
+    базу, не спрашивая роутер.
+    """
+
+    def test_loaders_skip_router(self):
+        with patch.object(router, 'db_for_read',
+                          side_effect=AssertionError('Чтение через роутер')):
+            FollowGraph().following(1)
+            RelatedPostsIndex().current().similar(1, 5)
+            DuplicateIndex().size()
+            build_top()
+
+
+class CopyDatabaseTest(SimpleTestCase):
+
+    def test_copy(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, 'primary.sqlite3')
+            target = os.path.join(directory, 'replica.sqlite3')
+            with sqlite3.connect(source) as connection:
+                connection.execute('CREATE TABLE post (text TEXT)')
+                connection.execute("INSERT INTO post VALUES ('Тест')")
+            connection.close()
+            copy_database(source, target)
+            connection = sqlite3.connect(target)
+            self.assertEqual(connection.execute(
+                'SELECT text FROM post').fetchall(), [('Тест',)])
+            connection.close()
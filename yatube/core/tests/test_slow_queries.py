@@ -0,0 +1,87 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+from ..slow_queries import get_fingerprint, get_log_path
+
+TEMP_LOG_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+TEMP_LOG = os.path.join(TEMP_LOG_DIR, 'slow_queries.jsonl')
+
+
+@override_settings(SLOW_QUERY_THRESHOLD=0, SLOW_QUERY_LOG=TEMP_LOG)
+class SlowQueryLogTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='testauthor')
+        cls.post = Post.objects.create(author=cls.author,
+                                       text='Тестовый пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_LOG_DIR, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        # Файл открыт обработчиком журнала, поэтому он очищается, а не
+        # удаляется.
+        open(get_log_path(), 'w').close()
+
+    def read_entries(self):
+        with open(get_log_path(), encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_slow_query_logged_with_plan_and_origin(self):
+        """Медленный запрос пишется с планом, представлением и местом
+        вызова."""
+        self.client.get(reverse('posts:post_detail', args=(self.post.pk,)))
+        entries = [entry for entry in self.read_entries()
+                   if '"posts_post"' in entry['sql']
+                   and entry['view'] == 'posts:post_detail']
+        self.assertTrue(entries)
+        entry = entries[0]
+        self.assertIn(self.post.pk, entry['params'])
+        self.assertTrue(entry['plan'])
+        self.assertTrue(entry['code'].startswith('posts'))
+
+    def test_failed_query_logged_without_plan(self):
+        """Упавший запрос пишется без EXPLAIN."""
+        with patch('core.slow_queries.explain') as explain:
+            with self.assertRaises(DatabaseError):
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute('SELECT * FROM missing_table')
+        self.assertNotIn('SELECT * FROM missing_table',
+                         [call_args[0][1] for call_args
+                          in explain.call_args_list])
+        entry, = [entry for entry in self.read_entries()
+                  if 'missing_table' in entry['sql']]
+        self.assertTrue(entry['failed'])
+        self.assertIsNone(entry['plan'])
+
+    def test_report_groups_by_fingerprint(self):
+        """Сводка объединяет запросы с разными параметрами."""
+        for pk in (self.post.pk, self.post.pk + 1):
+            Post.objects.filter(pk=pk).first()
+        out = StringIO()
+        call_command('slow_query_report', stdout=out)
+        self.assertIn('2 раз', out.getvalue())
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            get_fingerprint("SELECT * FROM t WHERE a = 1 AND b IN "
+                            "(%s, %s) AND c = 'x'"),
+            'SELECT * FROM t WHERE a = ? AND b IN (...) AND c = ?')
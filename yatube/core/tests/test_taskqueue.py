@@ -0,0 +1,173 @@
+import shutil
+import tempfile
+from concurrent.futures import Future
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from sorl.thumbnail import get_thumbnail
+
+from ..models import Task
+from ..taskqueue import Worker, claim_task, enqueue, log_failure, task
+
+User = get_user_model()
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (b'\x47\x49\x46\x38\x39\x61\x02\x00\x01\x00\x80\x00\x00\x00'
+             b'\x00\x00\xFF\xFF\xFF\x21\xF9\x04\x00\x00\x00\x00\x00\x2C'
+             b'\x00\x00\x00\x00\x02\x00\x01\x00\x00\x02\x02\x0C\x0A\x00'
+             b'\x3B')
+
+calls = []
+
+
+@task(name='tests.record')
+def record(value):
+    calls.append(value)
+
+
+@task(name='tests.fail', max_attempts=2)
+def fail():
+    raise ValueError('Тестовая ошибка')
+
+
+class TaskQueueTest(TestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def test_priority_order(self):
+        """Задачи с большим приоритетом выполняются раньше."""
+        enqueue(record, ('обычная',))
+        enqueue(record, ('срочная',), priority=10)
+        enqueue(record, ('отложенная',), priority=20, delay=60)
+        self.assertEqual(Worker(threads=0).work_off(), 2)
+        self.assertEqual(calls, ['срочная', 'обычная'])
+        self.assertEqual(Task.objects.filter(status=Task.DONE).count(), 2)
+
+    def test_idempotency_key(self):
+        """Задача с тем же ключом не ставится повторно."""
+        first = enqueue(record, (1,), key='record:1')
+        second = enqueue(record, (2,), key='record:1')
+        self.assertEqual(first.pk, second.pk)
+        Worker(threads=0).work_off()
+        self.assertEqual(calls, [1])
+
+    def test_finished_keyed_task_requeued(self):
+        """Выполненная или упавшая задача с ключом ставится заново с
+        новыми аргументами.
+        """
+        first = enqueue(record, (1,), key='record:1')
+        Worker(threads=0).work_off()
+        second = enqueue(record, (2,), key='record:1')
+        self.assertEqual(second.pk, first.pk)
+        self.assertEqual(second.status, Task.QUEUED)
+        Worker(threads=0).work_off()
+        self.assertEqual(calls, [1, 2])
+        Task.objects.filter(pk=first.pk).update(status=Task.FAILED,
+                                                attempts=5)
+        third = enqueue(record, (3,), key='record:1')
+        self.assertEqual((third.status, third.attempts), (Task.QUEUED, 0))
+
+    def test_integrity_error_without_key_raised(self):
+        with patch.object(Task, 'save',
+                          side_effect=IntegrityError('NOT NULL')):
+            with self.assertRaises(IntegrityError):
+                enqueue(record, (1,))
+
+    def test_worker_error_logged(self):
+        """Ошибка внутри потока воркера попадает в журнал."""
+        future = Future()
+        future.set_exception(DatabaseError('database is locked'))
+        with self.assertLogs('core.taskqueue', 'ERROR'):
+            log_failure(future)
+
+    def test_retry_with_backoff(self):
+        """Упавшая задача откладывается, а после последней попытки
+        помечается ошибкой.
+        """
+        queued = enqueue(fail)
+        with self.assertLogs('core.taskqueue', 'ERROR'):
+            Worker(threads=0).work_off()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.QUEUED)
+        self.assertEqual(queued.attempts, 1)
+        self.assertGreater(queued.run_at, timezone.now())
+        self.assertIn('Тестовая ошибка', queued.error)
+        Task.objects.filter(pk=queued.pk).update(run_at=timezone.now())
+        with self.assertLogs('core.taskqueue', 'ERROR'):
+            Worker(threads=0).work_off()
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Task.FAILED)
+        self.assertIsNotNone(queued.finished)
+
+    def test_visibility_timeout(self):
+        """Задачу пропавшего воркера забирает другой, а результат
+        первого уже не записывается.
+        """
+        queued = enqueue(record, ('первый',))
+        stale = claim_task(queued.pk, 'пропавший')
+        self.assertIsNone(claim_task(queued.pk, 'другой'))
+        Task.objects.filter(pk=queued.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1))
+        fresh = claim_task(queued.pk, 'другой')
+        self.assertEqual(fresh.attempts, 2)
+        Worker(threads=0).execute(stale)
+        self.assertEqual(Task.objects.get(pk=queued.pk).status, Task.RUNNING)
+        Worker(threads=0).execute(fresh)
+        self.assertEqual(Task.objects.get(pk=queued.pk).status, Task.DONE)
+
+    @override_settings(TASKS_EAGER=True)
+    def test_eager(self):
+        """В режиме TASKS_EAGER задача выполняется сразу."""
+        queued = enqueue(record, ('сразу',))
+        self.assertEqual(calls, ['сразу'])
+        self.assertEqual(queued.status, Task.DONE)
+
+    def test_run_worker_command(self):
+        enqueue(record, ('из команды',))
+        call_command('run_worker', threads=0, once=True, stdout=StringIO())
+        self.assertEqual(calls, ['из команды'])
+
+    def test_admin_changelist(self):
+        enqueue(record, ('в админке',))
+        admin = User.objects.create_superuser(
+            username='testadmin', email='admin@example.com',
+            password='password')
+        client = Client()
+        client.force_login(admin)
+        response = client.get(reverse('admin:core_task_changelist'))
+        self.assertContains(response, 'tests.record')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_ASYNC=True)
+class AsyncThumbnailTest(TestCase):
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_thumbnail_created_by_worker(self):
+        """Пока миниатюры нет, отдаётся исходная картинка, а создаёт
+        миниатюру одна задача.
+        """
+        name = default_storage.save('posts/small.gif',
+                                    ContentFile(SMALL_GIF))
+        image = get_thumbnail(name, '960x339', crop='center')
+        self.assertEqual(image.name, name)
+        get_thumbnail(name, '960x339', crop='center')
+        self.assertEqual(Task.objects.filter(
+            name='core.tasks.create_thumbnail').count(), 1)
+        Worker(threads=0).work_off()
+        image = get_thumbnail(name, '960x339', crop='center')
+        self.assertNotEqual(image.name, name)
+        self.assertTrue(default_storage.exists(image.name))
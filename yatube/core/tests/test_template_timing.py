@@ -0,0 +1,41 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Post, User
+
+
+@override_settings(TEMPLATE_TIMING=True)
+class TemplateTimingTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='testauthor')
+        Post.objects.create(author=cls.author, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_include_timing_reported(self):
+        """Время include попадает в заголовок Server-Timing и лог."""
+        with self.assertLogs('core.template_timing', 'INFO') as logs:
+            response = self.client.get(reverse('posts:index'))
+        self.assertIn("include 'includes/posts/article.html' x1",
+                      response['Server-Timing'])
+        self.assertIn('template posts/index.html', response['Server-Timing'])
+        self.assertIn('/ ', logs.output[0])
+
+    def test_custom_filter_timed(self):
+        """Фильтры подключаемых библиотек замеряются отдельно."""
+        client = Client()
+        client.force_login(self.author)
+        with self.assertLogs('core.template_timing', 'INFO'):
+            response = client.get(reverse('posts:post_create'))
+        self.assertIn('filter addclass', response['Server-Timing'])
+
+    @override_settings(TEMPLATE_TIMING=False)
+    def test_disabled_by_default(self):
+        """Без TEMPLATE_TIMING заголовок не добавляется."""
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('Server-Timing'))
@@ -0,0 +1,18 @@
+from django.contrib import admin
+from django.urls import path
+
+from . import admin as views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('profiles/', admin.site.admin_view(views.profile_list),
+         name='profile_list'),
+    path('profiles/<str:name>/', admin.site.admin_view(views.profile_detail),
+         name='profile_detail'),
+    path('profiles/<str:name>/<str:kind>/',
+         admin.site.admin_view(views.profile_download),
+         name='profile_download'),
+    path('memory/', admin.site.admin_view(views.memory_report),
+         name='memory_report'),
+]
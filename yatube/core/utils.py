@@ -0,0 +1,8 @@
+import random
+
+
+def new_generation():
+    """Начальное значение счётчика поколения. Оно случайно, чтобы после
+    очистки кеша счётчик не совпал с одним из прежних значений.
+    """
+    return random.getrandbits(48)
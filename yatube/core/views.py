@@ -1,5 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
 
+from .metrics import registry, render_metrics
+
 
 def page_not_found(request, exception):
     return render(request, 'core/404.html', {'path': request.path}, status=404)
@@ -15,3 +21,17 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def metrics(request):
+    """Метрики отдаются только с токеном METRICS_TOKEN в заголовке
+    Authorization: адрес клиента за прокси ничего не говорит.
+    """
+    token = settings.METRICS_TOKEN
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if not token or not hmac.compare_digest(header.encode(),
+                                            f'Bearer {token}'.encode()):
+        return HttpResponseForbidden()
+    registry.flush()
+    return HttpResponse(render_metrics(),
+                        content_type='text/plain; version=0.0.4')
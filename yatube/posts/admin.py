@@ -1,29 +1,129 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.shortcuts import render
+from django.urls import path
 
-from .models import Comment, Group, Post
+from core.admin import LargeTableAdmin
 
+from .deletion import schedule_deletion
+from .duplicates import duplicate_index
+from .models import Comment, DeletionJob, Group, Post, Tag
 
-class PostAdmin(admin.ModelAdmin):
+
+def delete_in_background(modeladmin, request, queryset):
+    """Скрывает выбранные объекты сразу, а удаляет их пачками в
+    фоне, не собирая весь каскад в памяти запроса.
+    """
+    for obj in queryset:
+        schedule_deletion(obj)
+    modeladmin.message_user(
+        request, f'Поставлено в очередь на удаление: {len(queryset)}',
+        messages.SUCCESS)
+
+
+delete_in_background.short_description = 'Удалить в фоне'
+
+
+class BackgroundDeletionMixin:
+    """Кнопка «Удалить» на странице объекта тоже удаляет в фоне, а
+    страница подтверждения не собирает каскад. Стандартное действие
+    delete_selected убрано: его заменяет delete_in_background.
+    """
+    actions = (delete_in_background,)
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def get_deleted_objects(self, objs, request):
+        return ([str(obj) for obj in objs],
+                {self.opts.verbose_name_plural: len(objs)}, set(), [])
+
+    def delete_model(self, request, obj):
+        schedule_deletion(obj)
+
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            schedule_deletion(obj)
+
+
+class PostAdmin(BackgroundDeletionMixin, LargeTableAdmin):
     list_display = ('pk', 'text', 'pub_date', 'author', 'group')
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     list_editable = ('group',)
+    autocomplete_fields = ('author', 'group')
+    readonly_fields = ('tags', 'mentions')
     empty_value_display = '-пусто-'
 
+    def get_urls(self):
+        return [
+            path('duplicates/',
+                 self.admin_site.admin_view(self.duplicates_view),
+                 name='posts_post_duplicates'),
+        ] + super().get_urls()
+
+    def duplicates_view(self, request):
+        clusters = duplicate_index.get_clusters()
+        keys = [key for cluster in clusters for key in cluster]
+        objects = {
+            'post': Post.objects.in_bulk(
+                [pk for kind, pk in keys if kind == 'post']),
+            'comment': Comment.objects.in_bulk(
+                [pk for kind, pk in keys if kind == 'comment']),
+        }
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Похожие посты и комментарии',
+            'clusters': [[objects[kind][pk] for kind, pk in cluster
+                          if pk in objects[kind]]
+                         for cluster in clusters],
+        }
+        return render(request, 'admin/posts/duplicates.html', context)
+
 
-class GroupAdmin(admin.ModelAdmin):
+class GroupAdmin(BackgroundDeletionMixin, LargeTableAdmin):
     list_display = ('pk', 'title', 'description')
     search_fields = ('title',)
     empty_value_display = '-пусто-'
 
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ('pk', 'text', 'author', 'created')
-    search_fields = ('title', 'author',)
-    list_filter = ('created', 'author',)
+    list_select_related = ('author',)
+    search_fields = ('text', 'author__username')
+    list_filter = ('created',)
+    raw_id_fields = ('post',)
+    autocomplete_fields = ('author',)
     empty_value_display = '-пусто-'
 
 
+class TagAdmin(LargeTableAdmin):
+    list_display = ('pk', 'name', 'posts_count')
+    search_fields = ('name',)
+    readonly_fields = ('posts_count',)
+
+
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'kind', 'object_repr', 'status', 'progress_display',
+                    'created', 'finished')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('kind', 'object_id', 'object_repr', 'status',
+                       'total', 'deleted', 'error', 'created', 'finished')
+
+    def has_add_permission(self, request):
+        return False
+
+    def progress_display(self, obj):
+        return f'{obj.progress}% ({obj.deleted} из {obj.total})'
+
+    progress_display.short_description = 'Прогресс'
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Comment, CommentAdmin)
+admin.site.register(Tag, TagAdmin)
+admin.site.register(DeletionJob, DeletionJobAdmin)
@@ -0,0 +1,84 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.models import F
+
+logger = logging.getLogger(__name__)
+
+
+class ViewCounter:
+    """Копит просмотры постов в памяти процесса и записывает их в базу
+    пачкой раз в VIEW_COUNTER_FLUSH_INTERVAL секунд или после
+    VIEW_COUNTER_FLUSH_THRESHOLD просмотров. Запись делается после
+    ответа, по сигналу request_finished, и не задерживает страницу.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = Counter()
+        self._pending_total = 0
+        self._last_flush = time.monotonic()
+
+    def increment(self, post_id):
+        with self._lock:
+            self._pending[post_id] += 1
+            self._pending_total += 1
+
+    def flush_if_due(self):
+        with self._lock:
+            due = self._pending_total and (
+                self._pending_total >= settings.VIEW_COUNTER_FLUSH_THRESHOLD
+                or time.monotonic() - self._last_flush
+                >= settings.VIEW_COUNTER_FLUSH_INTERVAL)
+        if due:
+            self.flush()
+
+    def pending(self, post_id):
+        return self._pending.get(post_id, 0)
+
+    def discard(self, post_id=None):
+        with self._lock:
+            if post_id is None:
+                self._pending.clear()
+            else:
+                self._pending.pop(post_id, None)
+            self._pending_total = sum(self._pending.values())
+
+    def flush(self):
+        """Записывает накопленные просмотры. Если база недоступна,
+        просмотры возвращаются в буфер до следующей попытки, а запрос,
+        во время которого случилась запись, не падает.
+        """
+        with self._lock:
+            pending = self._pending
+            self._pending = Counter()
+            self._pending_total = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+        post_ids_by_delta = defaultdict(list)
+        for post_id, delta in pending.items():
+            post_ids_by_delta[delta].append(post_id)
+        posts = apps.get_model('posts', 'Post')._base_manager
+        try:
+            with transaction.atomic():
+                for delta, post_ids in post_ids_by_delta.items():
+                    posts.filter(pk__in=post_ids).update(
+                        views=F('views') + delta)
+        except DatabaseError as error:
+            logger.warning('Не удалось сохранить просмотры постов: %s', error)
+            with self._lock:
+                self._pending.update(pending)
+                self._pending_total += sum(pending.values())
+
+
+view_counter = ViewCounter()
+
+
+atexit.register(view_counter.flush)
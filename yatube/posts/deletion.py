@@ -0,0 +1,133 @@
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.middleware import invalidate_page_cache
+from core.taskqueue import enqueue
+
+from .models import (Comment, DeletionJob, Follow, FollowSuggestion, Group,
+                     Notification, OutdatedSuggestions, Post, User)
+
+
+def get_kind(obj):
+    for model, kind in ((User, DeletionJob.USER),
+                        (Group, DeletionJob.GROUP),
+                        (Post, DeletionJob.POST)):
+        if isinstance(obj, model):
+            return kind
+    raise TypeError(f'Фоновое удаление {type(obj).__name__} не '
+                    f'поддерживается')
+
+
+def get_target(job):
+    model = {DeletionJob.USER: User,
+             DeletionJob.GROUP: Group,
+             DeletionJob.POST: Post}[job.kind]
+    return model._base_manager.filter(pk=job.object_id).first()
+
+
+def unset_group(pks):
+    Post._base_manager.filter(pk__in=pks).update(group=None)
+    invalidate_page_cache()
+
+
+def get_steps(job):
+    """Зависимые строки в порядке удаления. Каждый шаг — queryset и
+    действие над пачкой ключей; шаги вычисляются заново по состоянию
+    базы, поэтому прерванное удаление просто продолжается.
+    """
+    object_id = job.object_id
+    if job.kind == DeletionJob.USER:
+        mentions = Post.mentions.through.objects
+        return [
+            (Comment._base_manager.filter(post__author_id=object_id), None),
+            (Comment._base_manager.filter(author_id=object_id)
+             .exclude(post__author_id=object_id), None),
+            (Follow.objects.filter(user_id=object_id), None),
+            (Follow.objects.filter(author_id=object_id), None),
+            (Notification.objects.filter(user_id=object_id), None),
+            (Notification.objects.filter(post__author_id=object_id), None),
+            (FollowSuggestion.objects.filter(user_id=object_id), None),
+            (FollowSuggestion.objects.filter(author_id=object_id), None),
+            (OutdatedSuggestions.objects.filter(user_id=object_id), None),
+            (mentions.filter(user_id=object_id), None),
+            (mentions.filter(post__author_id=object_id), None),
+            (Post._base_manager.filter(author_id=object_id), None),
+        ]
+    if job.kind == DeletionJob.GROUP:
+        return [(Post._base_manager.filter(group_id=object_id),
+                 unset_group)]
+    return [(Comment._base_manager.filter(post_id=object_id), None),
+            (Notification.objects.filter(post_id=object_id), None)]
+
+
+def hide(kind, obj):
+    """Сразу убирает объект и его содержимое из выдачи."""
+    if kind == DeletionJob.USER:
+        obj.is_active = False
+        obj.save(update_fields=['is_active'])
+        Post.objects.filter(author=obj).update(is_removed=True)
+        Comment.objects.filter(
+            Q(author=obj) | Q(post__author=obj)).update(is_removed=True)
+    else:
+        type(obj)._base_manager.filter(pk=obj.pk).update(is_removed=True)
+        if kind == DeletionJob.POST:
+            Comment.objects.filter(post=obj).update(is_removed=True)
+    invalidate_page_cache()
+
+
+def schedule_deletion(obj):
+    """Скрывает объект и создаёт задание на удаление пачками."""
+    kind = get_kind(obj)
+    with transaction.atomic():
+        hide(kind, obj)
+        job = DeletionJob(kind=kind, object_id=obj.pk,
+                          object_repr=str(obj)[:200])
+        job.total = sum(queryset.count() for queryset, _
+                        in get_steps(job)) + 1
+        job.save()
+        enqueue('posts.tasks.process_deletion', (job.pk,))
+    return job
+
+
+def process_batch(job, batch_size):
+    """Удаляет одну пачку зависимых строк, а когда их не осталось —
+    сам объект. Возвращает True, пока работа не закончена.
+    """
+    for queryset, action in get_steps(job):
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            continue
+        with transaction.atomic():
+            if action is None:
+                queryset.model._base_manager.filter(pk__in=pks).delete()
+            else:
+                action(pks)
+            job.deleted += len(pks)
+            job.status = DeletionJob.RUNNING
+            job.save(update_fields=['deleted', 'status'])
+        return True
+    with transaction.atomic():
+        target = get_target(job)
+        if target is not None:
+            target.delete()
+        job.deleted += 1
+        job.status = DeletionJob.DONE
+        job.finished = timezone.now()
+        job.save(update_fields=['deleted', 'status', 'finished'])
+    return False
+
+
+def process_job(job, batch_size, max_batches=None):
+    batches = 0
+    try:
+        while max_batches is None or batches < max_batches:
+            batches += 1
+            if not process_batch(job, batch_size):
+                break
+    except Exception as error:
+        job.status = DeletionJob.FAILED
+        job.error = repr(error)
+        job.save(update_fields=['status', 'error'])
+        raise
+    return batches
@@ -0,0 +1,188 @@
+import random
+import re
+import zlib
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+
+from core.changelog import RELOAD, SharedIndex
+
+from .models import Comment, Post
+
+SHINGLE_SIZE = 5
+BANDS = 16
+ROWS = 4
+PERMUTATIONS = BANDS * ROWS
+PRIME = (1 << 61) - 1
+_random = random.Random(20220520)
+HASH_A = _random.randrange(1, PRIME)
+HASH_B = _random.randrange(0, PRIME)
+NON_WORD_RE = re.compile(r'\W+')
+
+
+def get_shingles(text):
+    """Символьные шинглы нормализованного текста: регистр, пунктуация и
+    лишние пробелы не мешают узнать почти одинаковые тексты.
+    """
+    text = NON_WORD_RE.sub(' ', text.lower()).strip()
+    return {zlib.crc32(text[start:start + SHINGLE_SIZE].encode())
+            for start in range(len(text) - SHINGLE_SIZE + 1)}
+
+
+def get_signature(shingles):
+    """MinHash-сигнатура хешированием в одну перестановку: каждый шингл
+    хешируется один раз и попадает в одну из PERMUTATIONS корзин, где
+    запоминается минимум. Пустые корзины заполняются из соседних
+    (densification), чтобы сигнатуры коротких текстов были сравнимы.
+    """
+    bins = [None] * PERMUTATIONS
+    for shingle in shingles:
+        value = (HASH_A * shingle + HASH_B) % PRIME
+        position, rest = value % PERMUTATIONS, value // PERMUTATIONS
+        if bins[position] is None or rest < bins[position]:
+            bins[position] = rest
+    signature = []
+    for position in range(PERMUTATIONS):
+        offset = 0
+        while bins[(position + offset) % PERMUTATIONS] is None:
+            offset += 1
+        signature.append(
+            (bins[(position + offset) % PERMUTATIONS], offset))
+    return tuple(signature)
+
+
+def get_bands(signature):
+    return [(band, hash(signature[band * ROWS:(band + 1) * ROWS]))
+            for band in range(BANDS)]
+
+
+def get_similarity(first, second):
+    return sum(a == b for a, b in zip(first, second)) / PERMUTATIONS
+
+
+class DuplicateIndex(SharedIndex):
+    """MinHash/LSH индекс последних постов и комментариев. Тексты с
+    похожей сигнатурой попадают хотя бы в одну общую корзину, поэтому
+    проверка нового текста не зависит от размера истории.
+
+    Сохранённые и удалённые тексты других процессов индекс узнаёт из
+    журнала изменений и перешинглирует только их, так что проверка в
+    форме не перечитывает историю.
+    """
+    name = 'duplicates'
+
+    def __init__(self):
+        super().__init__()
+        self._signatures = None
+        self._buckets = None
+
+    def _load(self):
+        self._signatures = OrderedDict()
+        self._buckets = defaultdict(set)
+        size = settings.DUPLICATE_INDEX_SIZE
+        posts = Post.objects.using('default')
+        comments = Comment.objects.using('default')
+        items = [(('post', pk), text, date) for pk, text, date
+                 in posts.values_list('pk', 'text', 'pub_date')
+                 .order_by('-pub_date')[:size]]
+        items += [(('comment', pk), text, date) for pk, text, date
+                  in comments.values_list('pk', 'text', 'created')
+                  .order_by('-created')[:size]]
+        items.sort(key=lambda item: item[2])
+        for key, text, _ in items[-size:]:
+            self._add(key, text)
+
+    def _refresh(self, keys):
+        keys = [(kind, int(pk)) for kind, pk
+                in (key.split(':') for key in keys)]
+        texts = {}
+        for kind, model in (('post', Post), ('comment', Comment)):
+            pks = [pk for key_kind, pk in keys if key_kind == kind]
+            if pks:
+                texts.update(((kind, pk), text) for pk, text
+                             in model.objects.using('default')
+                             .filter(pk__in=pks).values_list('pk', 'text'))
+        for key in keys:
+            self._remove(key)
+            if key in texts:
+                self._add(key, texts[key])
+
+    def _add(self, key, text):
+        shingles = get_shingles(text)
+        if len(shingles) < settings.DUPLICATE_MIN_SHINGLES:
+            return
+        self._remove(key)
+        signature = get_signature(shingles)
+        self._signatures[key] = signature
+        for band in get_bands(signature):
+            self._buckets[band].add(key)
+        while len(self._signatures) > settings.DUPLICATE_INDEX_SIZE:
+            self._remove(next(iter(self._signatures)))
+
+    def _remove(self, key):
+        signature = self._signatures.pop(key, None)
+        if signature is None:
+            return
+        for band in get_bands(signature):
+            self._buckets[band].discard(key)
+            if not self._buckets[band]:
+                del self._buckets[band]
+
+    def text_changed(self, kind, pk):
+        self.changed(f'{kind}:{pk}')
+
+    def find_duplicates(self, text, exclude=None):
+        """Возвращает ключи текстов, похожих на данный не меньше чем на
+        DUPLICATE_THRESHOLD по оценке коэффициента Жаккара.
+        """
+        shingles = get_shingles(text)
+        if len(shingles) < settings.DUPLICATE_MIN_SHINGLES:
+            return []
+        signature = get_signature(shingles)
+        index = self.current()
+        with index._lock:
+            candidates = set()
+            for band in get_bands(signature):
+                candidates.update(index._buckets.get(band, ()))
+            candidates.discard(exclude)
+            return [key for key in candidates
+                    if get_similarity(signature, index._signatures[key])
+                    >= settings.DUPLICATE_THRESHOLD]
+
+    def get_clusters(self):
+        """Группы похожих текстов, собранные по общим корзинам."""
+        index = self.current()
+        with index._lock:
+            parents = {}
+
+            def find(key):
+                while parents.get(key, key) != key:
+                    key = parents[key]
+                return key
+
+            for keys in index._buckets.values():
+                keys = list(keys)
+                for key in keys[1:]:
+                    if (get_similarity(index._signatures[keys[0]],
+                                       index._signatures[key])
+                            >= settings.DUPLICATE_THRESHOLD):
+                        parents[find(key)] = find(keys[0])
+            clusters = defaultdict(set)
+            for key in parents:
+                clusters[find(key)].update((key, find(key)))
+        return sorted((sorted(keys) for keys in clusters.values()
+                       if len(keys) > 1), key=len, reverse=True)
+
+    def size(self):
+        return len(self.current()._signatures)
+
+
+duplicate_index = DuplicateIndex()
+
+
+def rebuild_duplicate_index():
+    """Заставляет все процессы, включая этот, перечитать индекс из
+    базы.
+    """
+    duplicate_index.changed(RELOAD)
+    return duplicate_index.size()
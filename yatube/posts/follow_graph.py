@@ -0,0 +1,108 @@
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from functools import reduce
+from operator import or_
+
+from django.db.models import Q
+
+from core.changelog import SharedIndex
+
+from .models import Follow
+
+REFRESH_CHUNK = 100
+
+
+def contains(ids, value):
+    position = bisect_left(ids, value)
+    return position < len(ids) and ids[position] == value
+
+
+def insert(ids, value):
+    position = bisect_left(ids, value)
+    if position == len(ids) or ids[position] != value:
+        ids.insert(position, value)
+
+
+def remove(ids, value):
+    position = bisect_left(ids, value)
+    if position < len(ids) and ids[position] == value:
+        del ids[position]
+
+
+class FollowGraph(SharedIndex):
+    """Граф подписок в памяти процесса: для каждого пользователя
+    отсортированный массив авторов и для каждого автора отсортированный
+    массив подписчиков.
+
+    Граф загружается из posts_follow при первом обращении. Подписка и
+    отписка попадают в граф после фиксации транзакции, а другие процессы
+    перечитывают только изменённые пары из журнала.
+    """
+    name = 'follow_graph'
+
+    def __init__(self):
+        super().__init__()
+        self._following = None
+        self._followers = None
+
+    def _load(self):
+        following = defaultdict(lambda: array('q'))
+        followers = defaultdict(lambda: array('q'))
+        # Граф читается из основной базы, даже если запрос обслуживается
+        # репликой: отставшая копия осталась бы в памяти надолго.
+        edges = (Follow.objects.using('default')
+                 .order_by('user_id', 'author_id')
+                 .values_list('user_id', 'author_id').iterator())
+        for user_id, author_id in edges:
+            following[user_id].append(author_id)
+            followers[author_id].append(user_id)
+        for author_id, user_ids in followers.items():
+            followers[author_id] = array('q', sorted(user_ids))
+        self._following = following
+        self._followers = followers
+
+    def _refresh(self, keys):
+        pairs = [tuple(map(int, key.split(':'))) for key in keys]
+        existing = set()
+        for start in range(0, len(pairs), REFRESH_CHUNK):
+            condition = reduce(or_, (
+                Q(user_id=user_id, author_id=author_id)
+                for user_id, author_id in pairs[start:start + REFRESH_CHUNK]))
+            existing.update(Follow.objects.using('default').filter(condition)
+                            .values_list('user_id', 'author_id'))
+        for user_id, author_id in pairs:
+            change = insert if (user_id, author_id) in existing else remove
+            change(self._following[user_id], author_id)
+            change(self._followers[author_id], user_id)
+
+    def _graph(self):
+        graph = self.current()
+        return graph._following, graph._followers
+
+    def is_following(self, user_id, author_id):
+        following, _ = self._graph()
+        return contains(following.get(user_id, ()), author_id)
+
+    def following(self, user_id):
+        following, _ = self._graph()
+        return following.get(user_id, array('q'))
+
+    def followers(self, author_id):
+        _, followers = self._graph()
+        return followers.get(author_id, array('q'))
+
+    def followers_count(self, author_id):
+        return len(self.followers(author_id))
+
+    def following_count(self, user_id):
+        return len(self.following(user_id))
+
+    def common_following(self, user_id, other_id):
+        return set(self.following(user_id)) & set(self.following(other_id))
+
+    def edge_changed(self, user_id, author_id):
+        self.changed(f'{user_id}:{author_id}')
+
+
+follow_graph = FollowGraph()
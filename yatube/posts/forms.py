@@ -1,9 +1,33 @@
 from django import forms
 
+from .duplicates import duplicate_index
 from .models import Comment, Post
 
+DUPLICATE_ERROR = ('Почти такой же текст уже недавно публиковался. '
+                   'Повторы похожи на спам.')
 
-class PostForm(forms.ModelForm):
+
+class DuplicateTextMixin:
+    """Отклоняет текст, почти повторяющий недавний пост или комментарий.
+
+    Сравнение идёт со всеми авторами, а не только со своими текстами:
+    спам рассылают с многих аккаунтов, и у каждого из них повтор был бы
+    первым. Короткие реплики вроде «Спасибо!» короче
+    DUPLICATE_MIN_SHINGLES шинглов и не проверяются, поэтому совпадения
+    между разными людьми в обычной переписке не мешают.
+    """
+    duplicate_kind = None
+
+    def clean_text(self):
+        text = self.cleaned_data['text']
+        exclude = (self.duplicate_kind, self.instance.pk)
+        if duplicate_index.find_duplicates(text, exclude):
+            raise forms.ValidationError(DUPLICATE_ERROR)
+        return text
+
+
+class PostForm(DuplicateTextMixin, forms.ModelForm):
+    duplicate_kind = 'post'
 
     class Meta:
         model = Post
@@ -15,7 +39,8 @@ class PostForm(forms.ModelForm):
         }
 
 
-class CommentForm(forms.ModelForm):
+class CommentForm(DuplicateTextMixin, forms.ModelForm):
+    duplicate_kind = 'comment'
 
     class Meta:
         model = Comment
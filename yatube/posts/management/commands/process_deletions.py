@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from posts.deletion import process_job
+from posts.models import DeletionJob
+
+
+class Command(BaseCommand):
+    help = 'Удаляет пачками объекты, поставленные в очередь на удаление'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int,
+                            default=settings.DELETION_BATCH_SIZE,
+                            help='Сколько строк удалять за транзакцию')
+        parser.add_argument('--max-batches', type=int, default=None,
+                            help='Сколько пачек обработать за запуск')
+
+    def handle(self, *args, **options):
+        jobs = DeletionJob.objects.filter(
+            status__in=(DeletionJob.PENDING, DeletionJob.RUNNING)
+        ).order_by('created')
+        for job in jobs:
+            process_job(job, options['batch_size'], options['max_batches'])
+            self.stdout.write(f'{job}: {job.get_status_display()}, '
+                              f'{job.progress}%')
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from posts.duplicates import duplicate_index, rebuild_duplicate_index
+
+
+class Command(BaseCommand):
+    help = 'Перестраивает индекс похожих постов и комментариев'
+
+    def handle(self, *args, **options):
+        size = rebuild_duplicate_index()
+        clusters = duplicate_index.get_clusters()
+        self.stdout.write(f'В индексе {size} текстов, '
+                          f'групп похожих: {len(clusters)}')
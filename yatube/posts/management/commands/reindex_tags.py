@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.tags import reindex_posts
+
+
+class Command(BaseCommand):
+    help = ('Заполняет теги и упоминания для всех постов, включая '
+            'старые, и пересчитывает счётчики тегов')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Сколько постов обрабатывать за раз')
+
+    def handle(self, *args, **options):
+        count = reindex_posts(options['batch_size'])
+        self.stdout.write(f'Проиндексировано постов: {count}')
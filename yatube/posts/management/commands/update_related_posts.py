@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts.related import update_all_related_posts
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает похожие для всех постов, включая написанные '
+            'до появления списков')
+
+    def handle(self, *args, **options):
+        count = update_all_related_posts()
+        self.stdout.write(f'Пересчитаны похожие для {count} постов')
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts.suggestions import refresh_dirty
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает рекомендации авторов для пользователей, '
+            'чьи подписки изменились')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true',
+                            help='Пересчитать рекомендации для всех')
+
+    def handle(self, *args, **options):
+        count = refresh_dirty(refresh_all=options['all'])
+        self.stdout.write(f'Обновлены рекомендации для {count} '
+                          f'пользователей')
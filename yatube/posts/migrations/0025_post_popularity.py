@@ -0,0 +1,34 @@
+# Generated by Django 2.2.16 on 2026-10-19 09:09
+
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import migrations, models
+
+EPOCH = datetime(2022, 1, 1, tzinfo=timezone.utc)
+
+
+def set_initial_popularity(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    rate = math.log(2) / settings.POPULARITY_HALF_LIFE.total_seconds()
+    for post in Post.objects.only('pk', 'pub_date').iterator():
+        Post.objects.filter(pk=post.pk).update(
+            popularity=rate * (post.pub_date - EPOCH).total_seconds())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0024_tags_and_mentions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='popularity',
+            field=models.FloatField(blank=True, db_index=True, editable=False, null=True, verbose_name='Популярность'),
+        ),
+        migrations.RunPython(set_initial_popularity,
+                             migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 2.2.16 on 2026-10-19 10:04
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0030_outdated_suggestions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='outdatedsuggestions',
+            name='user',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
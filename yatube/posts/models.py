@@ -1,21 +1,86 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils.safestring import mark_safe
 
+from core.querycache import CachedQuerySet
+
+from .counters import view_counter
+from .rendering import RENDERER_VERSION, TAG_MAX_LENGTH, render_text
 
 User = get_user_model()
 
 
-class Group(models.Model):
+class RenderedTextModel(models.Model):
+    """Хранит рядом с исходным текстом готовый HTML и версию
+    рендерера, которой он получен.
+    """
+    html_source = 'text'
+    html_target = 'text_html'
+
+    html_version = models.PositiveSmallIntegerField(default=0,
+                                                    editable=False)
+
+    class Meta:
+        abstract = True
+
+    def render_html(self):
+        setattr(self, self.html_target,
+                render_text(getattr(self, self.html_source)))
+        self.html_version = RENDERER_VERSION
+
+    def save(self, *args, **kwargs):
+        self.render_html()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and self.html_source in update_fields:
+            kwargs['update_fields'] = {*update_fields, self.html_target,
+                                       'html_version'}
+        super().save(*args, **kwargs)
+
+    @property
+    def html(self):
+        if self.html_version != RENDERER_VERSION:
+            self.render_html()
+            type(self)._default_manager.filter(pk=self.pk).update(**{
+                self.html_target: getattr(self, self.html_target),
+                'html_version': self.html_version,
+            })
+        return mark_safe(getattr(self, self.html_target))
+
+
+class VisibleManager(models.Manager.from_queryset(CachedQuerySet)):
+    """Не показывает объекты, скрытые до фонового удаления."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_removed=False)
+
+
+class Group(RenderedTextModel):
+    html_source = 'description'
+    html_target = 'description_html'
+
     title = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
     description = models.TextField()
+    description_html = models.TextField(blank=True, editable=False)
+    is_removed = models.BooleanField(default=False, editable=False)
+
+    objects = VisibleManager()
 
     def __str__(self):
         return self.title
 
 
-class Post(models.Model):
+class Tag(models.Model):
+    name = models.CharField(max_length=TAG_MAX_LENGTH, unique=True)
+    posts_count = models.PositiveIntegerField(default=0, db_index=True)
+
+    def __str__(self):
+        return f'#{self.name}'
+
+
+class Post(RenderedTextModel):
     text = models.TextField(verbose_name='Текст')
+    text_html = models.TextField(blank=True, editable=False)
     pub_date = models.DateTimeField(auto_now_add=True,
                                     verbose_name='Дата публикации')
     author = models.ForeignKey(User,
@@ -32,15 +97,40 @@ class Post(models.Model):
     image = models.ImageField(upload_to='posts/',
                               blank=True,
                               verbose_name='Изображение в посте')
+    tags = models.ManyToManyField(Tag,
+                                  blank=True,
+                                  related_name='posts',
+                                  verbose_name='Теги')
+    mentions = models.ManyToManyField(User,
+                                      blank=True,
+                                      related_name='mentioned_in',
+                                      verbose_name='Упоминания')
+    popularity = models.FloatField(null=True,
+                                   blank=True,
+                                   editable=False,
+                                   db_index=True,
+                                   verbose_name='Популярность')
+    views = models.PositiveIntegerField(default=0,
+                                        editable=False,
+                                        verbose_name='Просмотры')
+    is_removed = models.BooleanField(default=False, editable=False)
+
+    objects = VisibleManager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = (models.Index(fields=['pub_date', 'id'],
+                                name='post_pub_date_id_idx'), )
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def view_count(self):
+        return self.views + view_counter.pending(self.pk)
+
 
-class Comment(models.Model):
+class Comment(RenderedTextModel):
     post = models.ForeignKey(Post,
                              on_delete=models.CASCADE,
                              related_name='comments')
@@ -48,7 +138,11 @@ class Comment(models.Model):
                                on_delete=models.CASCADE,
                                related_name='comments')
     text = models.TextField(verbose_name='Текст комментария')
+    text_html = models.TextField(blank=True, editable=False)
     created = models.DateTimeField(auto_now_add=True)
+    is_removed = models.BooleanField(default=False, editable=False)
+
+    objects = VisibleManager()
 
     class Meta:
         ordering = ['-created']
@@ -72,3 +166,122 @@ class Follow(models.Model):
 
     def __str__(self):
         return f'Подписка {self.user.username} на {self.author.username}'
+
+
+class Notification(models.Model):
+    """Новый пост автора, на которого подписан пользователь. Копится
+    до отправки дайджеста.
+    """
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='notifications')
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='+')
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = (models.UniqueConstraint(
+            fields=['user', 'post'], name='unique_notification'), )
+
+
+class FollowSuggestion(models.Model):
+    user = models.ForeignKey(User,
+                             on_delete=models.CASCADE,
+                             related_name='follow_suggestions')
+    author = models.ForeignKey(User,
+                               on_delete=models.CASCADE,
+                               related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['-score']
+        constraints = (models.UniqueConstraint(
+            fields=['user', 'author'], name='unique_follow_suggestion'), )
+
+    def __str__(self):
+        return f'Рекомендация {self.author_id} для {self.user_id}'
+
+
+class OutdatedSuggestions(models.Model):
+    """Отметка, что подписки пользователя изменились и рекомендации
+    нужно пересчитать. Отметки только добавляются, поэтому параллельные
+    запросы не теряют друг друга.
+
+    Отметка ставится и при удалении подписки каскадом вместе с самим
+    пользователем, поэтому ограничения внешнего ключа в базе нет:
+    отметки удалённых пользователей пропускаются при пересчёте.
+    """
+    user = models.ForeignKey(User,
+                             on_delete=models.DO_NOTHING,
+                             db_constraint=False,
+                             related_name='+')
+
+
+class RelatedPost(models.Model):
+    """Похожий пост. Списки считаются в фоне при сохранении поста,
+    поэтому страница поста только читает их.
+    """
+    post = models.ForeignKey(Post,
+                             on_delete=models.CASCADE,
+                             related_name='related_links')
+    related = models.ForeignKey(Post,
+                                on_delete=models.CASCADE,
+                                related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['-score']
+        constraints = (models.UniqueConstraint(
+            fields=['post', 'related'], name='unique_related_post'), )
+
+
+class DeletionJob(models.Model):
+    """Фоновое удаление пользователя, группы или поста вместе со всем,
+    что от них зависит.
+    """
+    USER = 'user'
+    GROUP = 'group'
+    POST = 'post'
+    KIND_CHOICES = ((USER, 'Пользователь'),
+                    (GROUP, 'Группа'),
+                    (POST, 'Пост'))
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = ((PENDING, 'Ожидает'),
+                      (RUNNING, 'Выполняется'),
+                      (DONE, 'Завершено'),
+                      (FAILED, 'Ошибка'))
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES,
+                            verbose_name='Что удаляется')
+    object_id = models.PositiveIntegerField()
+    object_repr = models.CharField(max_length=200, verbose_name='Объект')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES,
+                              default=PENDING, db_index=True,
+                              verbose_name='Состояние')
+    total = models.PositiveIntegerField(default=0,
+                                        verbose_name='Всего строк')
+    deleted = models.PositiveIntegerField(default=0,
+                                          verbose_name='Удалено строк')
+    error = models.TextField(blank=True, verbose_name='Ошибка')
+    created = models.DateTimeField(auto_now_add=True,
+                                   verbose_name='Создано')
+    finished = models.DateTimeField(null=True, blank=True,
+                                    verbose_name='Завершено')
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'фоновое удаление'
+        verbose_name_plural = 'фоновые удаления'
+
+    def __str__(self):
+        return f'Удаление {self.object_repr}'
+
+    @property
+    def progress(self):
+        if not self.total:
+            return 100 if self.status == self.DONE else 0
+        return min(100, self.deleted * 100 // self.total)
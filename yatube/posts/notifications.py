@@ -0,0 +1,93 @@
+import time
+from itertools import groupby
+
+from django.conf import settings
+from django.template.loader import render_to_string
+
+from core.models import OutgoingEmail
+from core.outbox import queue_emails
+from core.taskqueue import enqueue
+
+from .models import Follow, Notification, Post
+
+
+def schedule_digests():
+    """Одна рассылка дайджестов на окно NOTIFICATION_DIGEST_INTERVAL:
+    все посты за окно попадут в одно письмо каждому подписчику.
+    """
+    interval = settings.NOTIFICATION_DIGEST_INTERVAL
+    now = time.time()
+    window = int(now // interval)
+    enqueue('posts.tasks.send_digests', key=f'send_digests:{window}',
+            delay=(window + 1) * interval - now)
+
+
+def fan_out(post_id):
+    """Записывает уведомление о посте каждому подписчику автора.
+    Подписчики читаются по ключу пачками, так что память не зависит от
+    их числа.
+    """
+    post = Post.objects.filter(pk=post_id).only('author_id').first()
+    if post is None:
+        return 0
+    size = settings.NOTIFICATION_BATCH_SIZE
+    last_pk = 0
+    count = 0
+    while True:
+        follows = list(Follow.objects.filter(
+            author_id=post.author_id, pk__gt=last_pk,
+        ).order_by('pk').values_list('pk', 'user_id')[:size])
+        if not follows:
+            break
+        Notification.objects.bulk_create(
+            [Notification(user_id=user_id, post_id=post_id)
+             for _, user_id in follows], ignore_conflicts=True)
+        count += len(follows)
+        last_pk = follows[-1][0]
+    if count:
+        schedule_digests()
+    return count
+
+
+def build_digest(user, posts):
+    limit = settings.NOTIFICATION_DIGEST_SIZE
+    context = {
+        'user': user,
+        'posts': posts[:limit],
+        'more': max(0, len(posts) - limit),
+        'count': len(posts),
+        'site_url': settings.SITE_URL,
+    }
+    subject = ''.join(render_to_string(
+        'posts/emails/digest_subject.txt', context).splitlines())
+    return OutgoingEmail(
+        to=user.email, subject=subject,
+        body=render_to_string('posts/emails/digest.txt', context))
+
+
+def send_digests():
+    """Сворачивает накопленные уведомления в одно письмо на
+    пользователя и кладёт письма в outbox. Возвращает число писем.
+    """
+    size = settings.NOTIFICATION_BATCH_SIZE
+    sent = 0
+    while True:
+        user_ids = list(Notification.objects.order_by('user_id').values_list(
+            'user_id', flat=True).distinct()[:size])
+        if not user_ids:
+            return sent
+        notifications = list(Notification.objects.filter(
+            user_id__in=user_ids,
+        ).select_related('user', 'post__author').order_by('user_id',
+                                                          '-post_id'))
+        emails = []
+        for user, items in groupby(notifications, lambda item: item.user):
+            posts = [item.post for item in items if not item.post.is_removed]
+            if posts and user.email and user.is_active:
+                emails.append(build_digest(user, posts))
+        queue_emails(emails)
+        sent += len(emails)
+        # Уведомления, пришедшие во время рассылки, ждут следующей.
+        Notification.objects.filter(
+            user_id__in=user_ids,
+            pk__lte=max(item.pk for item in notifications)).delete()
@@ -0,0 +1,106 @@
+import math
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, FloatField, Value, When
+from django.db.models.functions import Exp, Greatest, Least, Ln
+from django.utils import timezone
+
+from core.querycache import get_table_generations
+
+from .models import Post
+
+# Очки хранятся в логарифмической шкале относительно фиксированной эпохи:
+# вклад события весом w в момент t равен ln(w) + rate * (t - EPOCH).
+# Так порядок постов не меняется со временем, и пересчитывать его
+# при каждом запросе не нужно.
+EPOCH = datetime(2022, 1, 1, tzinfo=dt_timezone.utc)
+COMMENT_WEIGHT = 1
+FOLLOW_WEIGHT = 2
+
+
+def get_decay_rate():
+    return math.log(2) / settings.POPULARITY_HALF_LIFE.total_seconds()
+
+
+def get_event_score(weight, moment=None):
+    moment = moment or timezone.now()
+    return (math.log(weight)
+            + get_decay_rate() * (moment - EPOCH).total_seconds())
+
+
+def add_score(score):
+    """Выражение для UPDATE: ln(e^popularity + e^score), посчитанное
+    без переполнения, или score, если очков ещё нет.
+    """
+    score = Value(score, output_field=FloatField())
+    high = Greatest(F('popularity'), score)
+    low = Least(F('popularity'), score)
+    return Case(When(popularity=None, then=score),
+                default=high + Ln(Value(1.0) + Exp(low - high)),
+                output_field=FloatField())
+
+
+def get_top_key(group_id=None):
+    """Ключ топа включает поколение таблицы постов: любая запись в
+    неё, включая новые очки, уводит чтения на новый ключ. Закешированный
+    список не правится на месте, поэтому одновременные обновления не
+    затирают друг друга, а топ, собранный до записи, остаётся под
+    старым ключом.
+    """
+    generation, = get_table_generations([Post._meta.db_table])
+    return f'popular:top:{group_id or "all"}:{generation}'
+
+
+def build_top(group_id=None):
+    # Топ кешируется для всех процессов, поэтому строится по основной
+    # базе, а не по реплике, которая могла отстать.
+    post_list = Post.objects.using('default').exclude(popularity=None)
+    if group_id is not None:
+        post_list = post_list.filter(group_id=group_id)
+    return list(post_list.order_by('-popularity')
+                .values_list('popularity', 'pk')[:settings.POPULAR_TOP_SIZE])
+
+
+def get_top(group_id=None):
+    key = get_top_key(group_id)
+    top = cache.get(key)
+    if top is None:
+        top = build_top(group_id)
+        cache.set(key, top, settings.POPULAR_TOP_TIMEOUT)
+    return top
+
+
+def record_engagement(post, weight):
+    """Добавляет посту очки за событие. Очки складываются в самом
+    UPDATE, поэтому одновременные события не теряют друг друга; новое
+    значение читается в той же транзакции.
+    """
+    with transaction.atomic():
+        post_row = Post.objects.filter(pk=post.pk)
+        post_row.update(popularity=add_score(get_event_score(weight)))
+        post.popularity = post_row.values_list('popularity', flat=True)[0]
+
+
+class PopularPostList:
+    """Ленивый список популярных постов: посты загружаются только
+    для запрошенной пагинатором страницы.
+    """
+
+    def __init__(self, group=None):
+        self.group = group
+        self.post_ids = [post_id for _, post_id
+                         in get_top(group.pk if group else None)]
+
+    def __len__(self):
+        return len(self.post_ids)
+
+    def __getitem__(self, index):
+        post_ids = self.post_ids[index]
+        posts = Post.objects.in_bulk(post_ids)
+        return [posts[post_id] for post_id in post_ids
+                if post_id in posts
+                and (self.group is None
+                     or posts[post_id].group_id == self.group.pk)]
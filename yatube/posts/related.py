@@ -0,0 +1,159 @@
+import heapq
+import math
+import re
+import zlib
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from core.changelog import SharedIndex
+
+from .models import Post, RelatedPost
+
+TOKEN_RE = re.compile(r'\w{3,}')
+HASH_BUCKETS = 2 ** 20
+# Слова, встречающиеся чаще чем в этой доле постов, не помогают искать
+# похожие и только раздувают список кандидатов.
+MAX_DOCUMENT_FREQUENCY = 0.5
+
+
+def vectorize(text):
+    """Хешированный мешок слов: номер корзины -> частота."""
+    return Counter(zlib.crc32(token.encode()) % HASH_BUCKETS
+                   for token in TOKEN_RE.findall(text.lower()))
+
+
+class RelatedPostsIndex(SharedIndex):
+    """TF-IDF индекс текстов постов с инвертированными списками по
+    корзинам слов, чтобы сравнивать пост только с постами, у которых
+    есть общие слова.
+
+    Индекс держат процессы, считающие похожие посты: воркер задач и
+    команда update_related_posts. Сохранённые и удалённые посты они
+    узнают из журнала изменений и перечитывают только их.
+    """
+    name = 'related_posts'
+
+    def __init__(self):
+        super().__init__()
+        self._vectors = None
+        self._postings = None
+        self._document_frequency = None
+
+    def _load(self):
+        self._vectors = {}
+        self._postings = defaultdict(set)
+        self._document_frequency = Counter()
+        texts = (Post.objects.using('default')
+                 .values_list('pk', 'text').iterator())
+        for post_id, text in texts:
+            self._add(post_id, text)
+
+    def _refresh(self, keys):
+        post_ids = [int(key) for key in keys]
+        texts = dict(Post.objects.using('default').filter(pk__in=post_ids)
+                     .values_list('pk', 'text'))
+        for post_id in post_ids:
+            self._remove(post_id)
+            if post_id in texts:
+                self._add(post_id, texts[post_id])
+
+    def _add(self, post_id, text):
+        vector = vectorize(text)
+        self._vectors[post_id] = vector
+        self._document_frequency.update(vector.keys())
+        for bucket in vector:
+            self._postings[bucket].add(post_id)
+
+    def _remove(self, post_id):
+        vector = self._vectors.pop(post_id, None)
+        if vector is None:
+            return
+        self._document_frequency.subtract(vector.keys())
+        for bucket in vector:
+            self._postings[bucket].discard(post_id)
+
+    def post_changed(self, post_id):
+        self.changed(str(post_id))
+
+    def _weigh(self, vector, total):
+        frequency = self._document_frequency
+        return {bucket: count * math.log((total + 1) / (frequency[bucket] + 1))
+                for bucket, count in vector.items()}
+
+    def similar(self, post_id, count):
+        """Пары (идентификатор, близость) самых похожих постов. Индекс
+        должен быть загружен: вызывается у результата current().
+        """
+        with self._lock:
+            vector = self._vectors.get(post_id)
+            if not vector:
+                return []
+            total = len(self._vectors)
+            max_frequency = max(2, MAX_DOCUMENT_FREQUENCY * total)
+            query = self._weigh(vector, total)
+            query_norm = math.sqrt(sum(w * w for w in query.values()))
+            candidates = set()
+            for bucket in query:
+                if self._document_frequency[bucket] <= max_frequency:
+                    candidates.update(self._postings[bucket])
+            candidates.discard(post_id)
+            scores = []
+            for candidate_id in candidates:
+                weights = self._weigh(self._vectors[candidate_id], total)
+                norm = math.sqrt(sum(w * w for w in weights.values()))
+                dot = sum(weight * weights.get(bucket, 0)
+                          for bucket, weight in query.items())
+                if dot > 0 and norm and query_norm:
+                    scores.append((dot / (norm * query_norm), candidate_id))
+        return [(candidate_id, score) for score, candidate_id
+                in heapq.nlargest(count, scores)]
+
+
+related_index = RelatedPostsIndex()
+
+
+def store_related(index, post_id):
+    similar = index.similar(post_id, settings.RELATED_POSTS_COUNT)
+    # Индекс может ещё не знать об удалении поста другим процессом.
+    existing = set(Post._base_manager.filter(
+        pk__in=[related_id for related_id, _ in similar])
+        .values_list('pk', flat=True))
+    similar = [(related_id, score) for related_id, score in similar
+               if related_id in existing]
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id=post_id).delete()
+        RelatedPost.objects.bulk_create([
+            RelatedPost(post_id=post_id, related_id=related_id, score=score)
+            for related_id, score in similar])
+    return similar
+
+
+def update_related_posts(post_id):
+    """Пересчитывает похожие для сохранённого поста и для постов,
+    к которым он оказался ближе всего: новый пост может войти и в их
+    списки.
+    """
+    related_index.refresh([str(post_id)])
+    index = related_index.current()
+    if not Post.objects.filter(pk=post_id).exists():
+        return
+    for related_id, _ in store_related(index, post_id):
+        store_related(index, related_id)
+
+
+def update_all_related_posts():
+    index = related_index.current()
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    for post_id in post_ids:
+        store_related(index, post_id)
+    return len(post_ids)
+
+
+def get_related_posts(post):
+    """Похожие посты, заранее посчитанные при сохранении."""
+    post_ids = list(RelatedPost.objects.filter(post=post)
+                    .values_list('related_id', flat=True))
+    posts = Post.objects.in_bulk(post_ids)
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
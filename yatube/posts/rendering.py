@@ -0,0 +1,46 @@
+import re
+
+from django.urls import reverse
+from django.utils.html import urlize
+from django.utils.text import normalize_newlines
+
+# Увеличивается при любом изменении правил разметки: сохранённый HTML
+# со старой версией перерисовывается при первом обращении.
+RENDERER_VERSION = 2
+
+TAG_MAX_LENGTH = 100
+HASHTAG_RE = re.compile(r'(?<![\w&/])#(\w+)')
+MENTION_RE = re.compile(r'(?<![\w/])@([\w.+-]*\w)')
+LINK_RE = re.compile(r'(<a [^>]*>.*?</a>)')
+
+
+def extract_hashtags(text):
+    return {tag.lower() for tag in HASHTAG_RE.findall(text)
+            if len(tag) <= TAG_MAX_LENGTH}
+
+
+def extract_mentions(text):
+    return set(MENTION_RE.findall(text))
+
+
+def link_hashtag(match):
+    url = reverse('posts:tag_posts', args=(match[1].lower(),))
+    return f'<a href="{url}">#{match[1]}</a>'
+
+
+def link_mention(match):
+    url = reverse('posts:profile', args=(match[1],))
+    return f'<a href="{url}">@{match[1]}</a>'
+
+
+def render_text(text):
+    """Превращает пользовательский текст в безопасный HTML:
+    экранирует разметку, делает кликабельными ссылки, #теги и
+    @упоминания и переносит строки.
+    """
+    html = urlize(normalize_newlines(text), nofollow=True, autoescape=True)
+    parts = LINK_RE.split(html)
+    for number in range(0, len(parts), 2):
+        parts[number] = MENTION_RE.sub(
+            link_mention, HASHTAG_RE.sub(link_hashtag, parts[number]))
+    return ''.join(parts).replace('\n', '<br>')
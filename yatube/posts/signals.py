@@ -0,0 +1,162 @@
+import logging
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete, pre_save)
+from django.dispatch import receiver
+from sorl.thumbnail import delete as delete_thumbnails
+
+from core.middleware import invalidate_page_cache, page_cache_hit
+from core.taskqueue import enqueue
+
+from . import ranking, suggestions
+from .counters import view_counter
+from .duplicates import duplicate_index
+from .follow_graph import follow_graph
+from .related import related_index
+from .models import (Comment, Follow, FollowSuggestion, Group, Post, Tag,
+                     User)
+from .rendering import extract_hashtags, extract_mentions
+
+logger = logging.getLogger(__name__)
+
+
+@receiver([post_save, post_delete], sender=Post)
+@receiver([post_save, post_delete], sender=Group)
+@receiver([post_save, post_delete], sender=Comment)
+@receiver([post_save, post_delete], sender=Follow)
+def clear_page_cache(**kwargs):
+    invalidate_page_cache()
+
+
+@receiver(post_save, sender=Post)
+def index_tags_and_mentions(instance, **kwargs):
+    names = extract_hashtags(instance.text)
+    if names:
+        Tag.objects.bulk_create([Tag(name=name) for name in names],
+                                ignore_conflicts=True)
+    instance.tags.set(Tag.objects.filter(name__in=names))
+    instance.mentions.set(User.objects.filter(
+        username__in=extract_mentions(instance.text)))
+
+
+@receiver(m2m_changed, sender=Post.tags.through)
+def update_tag_counts(instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and not reverse:
+        release_post_tags(instance)
+        return
+    if action not in ('post_add', 'post_remove'):
+        return
+    delta = 1 if action == 'post_add' else -1
+    if reverse:
+        Tag.objects.filter(pk=instance.pk).update(
+            posts_count=F('posts_count') + delta * len(pk_set))
+    else:
+        Tag.objects.filter(pk__in=pk_set).update(
+            posts_count=F('posts_count') + delta)
+
+
+@receiver(pre_delete, sender=Post)
+def release_post_tags(instance, **kwargs):
+    Tag.objects.filter(posts=instance).update(
+        posts_count=F('posts_count') - 1)
+
+
+@receiver(pre_save, sender=Post)
+def set_initial_popularity(instance, **kwargs):
+    if instance.popularity is None:
+        instance.popularity = ranking.get_event_score(1)
+
+
+@receiver(post_save, sender=Post)
+def notify_followers(instance, created, **kwargs):
+    if created:
+        enqueue('posts.tasks.notify_followers', (instance.pk,),
+                key=f'notify_followers:{instance.pk}')
+
+
+@receiver(post_delete, sender=Post)
+def delete_post_image(instance, **kwargs):
+    """Удаляет файл картинки и её миниатюры после фиксации транзакции,
+    чтобы откат удаления не оставил пост без картинки.
+    """
+    if not instance.image:
+        return
+
+    def delete_files():
+        try:
+            delete_thumbnails(instance.image)
+        except (OSError, SuspiciousFileOperation) as error:
+            logger.warning('Не удалось удалить картинку %s: %s',
+                           instance.image.name, error)
+
+    transaction.on_commit(delete_files)
+
+
+@receiver(post_delete, sender=Post)
+def discard_post_views(instance, **kwargs):
+    view_counter.discard(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+def rank_commented_post(instance, created, **kwargs):
+    if created:
+        ranking.record_engagement(instance.post, ranking.COMMENT_WEIGHT)
+
+
+@receiver(post_save, sender=Follow)
+def rank_followed_author(instance, created, **kwargs):
+    if not created:
+        return
+    latest_post = Post.objects.filter(author_id=instance.author_id).first()
+    if latest_post is not None:
+        ranking.record_engagement(latest_post, ranking.FOLLOW_WEIGHT)
+
+
+@receiver(page_cache_hit)
+def count_cached_post_view(view_name, kwargs, **extra):
+    if view_name == 'posts:post_detail':
+        view_counter.increment(kwargs['post_id'])
+
+
+@receiver(request_finished)
+def flush_view_counter(**kwargs):
+    view_counter.flush_if_due()
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def mark_suggestions_outdated(instance, **kwargs):
+    FollowSuggestion.objects.filter(user_id=instance.user_id,
+                                    author_id=instance.author_id).delete()
+    suggestions.mark_dirty(instance.user_id)
+
+
+@receiver([post_save, post_delete], sender=Follow)
+def update_follow_edge(instance, **kwargs):
+    follow_graph.edge_changed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Post)
+def update_related_posts(instance, **kwargs):
+    related_index.post_changed(instance.pk)
+    enqueue('posts.tasks.update_related_posts', (instance.pk,))
+
+
+@receiver(post_delete, sender=Post)
+def remove_related_text(instance, **kwargs):
+    related_index.post_changed(instance.pk)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_save, sender=Comment)
+def index_duplicate_text(sender, instance, **kwargs):
+    duplicate_index.text_changed(sender._meta.model_name, instance.pk)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Comment)
+def remove_duplicate_text(sender, instance, **kwargs):
+    duplicate_index.text_changed(sender._meta.model_name, instance.pk)
@@ -0,0 +1,88 @@
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+
+from .models import Follow, FollowSuggestion, OutdatedSuggestions, User
+
+FRIEND_OF_FRIEND_WEIGHT = 1.0
+
+
+def mark_dirty(user_id):
+    OutdatedSuggestions.objects.create(user_id=user_id)
+
+
+def load_follow_graph():
+    """Читает таблицу подписок целиком в разреженные списки смежности."""
+    following = defaultdict(set)
+    followers = defaultdict(set)
+    edges = Follow.objects.values_list('user_id', 'author_id').iterator()
+    for user_id, author_id in edges:
+        following[user_id].add(author_id)
+        followers[author_id].add(user_id)
+    return following, followers
+
+
+def score_candidates(user_id, following, followers):
+    """Оценивает авторов для пользователя: авторов, на которых подписаны
+    его авторы (друзья друзей), и авторов читателей с похожими
+    подписками (косинусная близость строк матрицы подписок).
+    """
+    followed = following.get(user_id, set())
+    scores = Counter()
+    for author_id in followed:
+        for candidate in following.get(author_id, ()):
+            scores[candidate] += FRIEND_OF_FRIEND_WEIGHT
+    overlaps = Counter()
+    for author_id in followed:
+        overlaps.update(followers[author_id])
+    overlaps.pop(user_id, None)
+    for other_id, common in overlaps.items():
+        similarity = common / math.sqrt(len(followed)
+                                        * len(following[other_id]))
+        for candidate in following[other_id]:
+            scores[candidate] += similarity
+    for author_id in followed | {user_id}:
+        scores.pop(author_id, None)
+    return scores.most_common(settings.FOLLOW_SUGGESTIONS_COUNT)
+
+
+def refresh_suggestions(user_ids=None):
+    """Пересчитывает рекомендации для указанных пользователей или,
+    если никто не указан, для всех подписчиков.
+    """
+    following, followers = load_follow_graph()
+    if user_ids is None:
+        user_ids = set(following)
+    for user_id in user_ids:
+        suggestions = [
+            FollowSuggestion(user_id=user_id, author_id=author_id,
+                             score=score)
+            for author_id, score
+            in score_candidates(user_id, following, followers)
+        ]
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id=user_id).delete()
+            FollowSuggestion.objects.bulk_create(suggestions)
+    return len(user_ids)
+
+
+def refresh_dirty(refresh_all=False):
+    """Пересчитывает рекомендации пользователей с отметками и снимает
+    отметки. Снимаются только прочитанные: отметки, добавленные во
+    время пересчёта, дождутся следующего запуска.
+    """
+    last_id = OutdatedSuggestions.objects.aggregate(
+        last_id=Max('pk'))['last_id']
+    if last_id is None and not refresh_all:
+        return 0
+    marks = OutdatedSuggestions.objects.filter(pk__lte=last_id or 0)
+    user_ids = None
+    if not refresh_all:
+        user_ids = set(User.objects.filter(
+            pk__in=marks.values('user_id')).values_list('pk', flat=True))
+    count = refresh_suggestions(user_ids)
+    marks.delete()
+    return count
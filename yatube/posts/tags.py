@@ -0,0 +1,64 @@
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Post, Tag, User
+from .rendering import extract_hashtags, extract_mentions
+
+
+def index_batch(posts):
+    """Заново заполняет теги и упоминания пачки постов. Строки связей
+    пишутся напрямую, без m2m_changed, поэтому счётчики тегов после
+    этого нужно пересчитать.
+    """
+    names = {post.pk: extract_hashtags(post.text) for post in posts}
+    usernames = {post.pk: extract_mentions(post.text) for post in posts}
+    all_names = set().union(*names.values())
+    Tag.objects.bulk_create([Tag(name=name) for name in all_names],
+                            ignore_conflicts=True)
+    tag_ids = dict(Tag.objects.filter(name__in=all_names)
+                   .values_list('name', 'pk'))
+    user_ids = dict(User.objects.filter(
+        username__in=set().union(*usernames.values()))
+        .values_list('username', 'pk'))
+    tags = Post.tags.through
+    mentions = Post.mentions.through
+    with transaction.atomic():
+        tags.objects.filter(post_id__in=names).delete()
+        tags.objects.bulk_create([
+            tags(post_id=post_id, tag_id=tag_ids[name])
+            for post_id, post_names in names.items()
+            for name in post_names])
+        mentions.objects.filter(post_id__in=usernames).delete()
+        mentions.objects.bulk_create([
+            mentions(post_id=post_id, user_id=user_ids[username])
+            for post_id, post_usernames in usernames.items()
+            for username in post_usernames if username in user_ids])
+
+
+def recount_tags():
+    """Пересчитывает Tag.posts_count одним запросом по таблице связей."""
+    counts = (Post.tags.through.objects.filter(tag_id=OuterRef('pk'))
+              .order_by().values('tag_id').annotate(count=Count('*'))
+              .values('count'))
+    Tag.objects.update(posts_count=Coalesce(
+        Subquery(counts, output_field=IntegerField()), 0))
+
+
+def reindex_posts(batch_size):
+    """Индексирует теги и упоминания всех постов, в том числе
+    созданных до появления индекса. Посты читаются пачками по
+    возрастанию ключа. Возвращает число обработанных постов.
+    """
+    last_pk = 0
+    count = 0
+    while True:
+        posts = list(Post._base_manager.filter(pk__gt=last_pk)
+                     .order_by('pk').only('pk', 'text')[:batch_size])
+        if not posts:
+            break
+        index_batch(posts)
+        last_pk = posts[-1].pk
+        count += len(posts)
+    recount_tags()
+    return count
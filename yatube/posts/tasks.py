@@ -0,0 +1,38 @@
+from django.conf import settings
+
+from core.taskqueue import enqueue, task
+
+from . import notifications, related
+from .deletion import process_job
+from .models import DeletionJob
+
+
+@task(priority=-10)
+def process_deletion(job_id):
+    """Обрабатывает часть пачек и ставит продолжение следующей
+    задачей, чтобы одно большое удаление не держало воркер дольше
+    тайм-аута видимости. Упавшее задание при повторе задачи
+    продолжается с места остановки.
+    """
+    job = DeletionJob.objects.filter(pk=job_id).first()
+    if job is None or job.status == DeletionJob.DONE:
+        return
+    process_job(job, settings.DELETION_BATCH_SIZE,
+                settings.DELETION_BATCHES_PER_TASK)
+    if job.status != DeletionJob.DONE:
+        enqueue(process_deletion, (job_id,))
+
+
+@task()
+def notify_followers(post_id):
+    notifications.fan_out(post_id)
+
+
+@task(priority=-5)
+def send_digests():
+    notifications.send_digests()
+
+
+@task(priority=-5)
+def update_related_posts(post_id):
+    related.update_related_posts(post_id)
@@ -0,0 +1,123 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..deletion import process_job, schedule_deletion
+from ..follow_graph import follow_graph
+from ..models import (Comment, DeletionJob, Follow, FollowSuggestion, Group,
+                      OutdatedSuggestions, Post, User)
+
+
+class BackgroundDeletionTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='testauthor')
+        cls.reader = User.objects.create_user(username='testreader')
+        cls.group = Group.objects.create(title='Тестовая группа',
+                                         slug='test-slug',
+                                         description='Тестовое описание')
+
+    def setUp(self):
+        cache.clear()
+        self.posts = [Post.objects.create(author=self.author,
+                                          group=self.group,
+                                          text=f'Тестовый пост {number}')
+                      for number in range(3)]
+        Comment.objects.create(post=self.posts[0], author=self.reader,
+                               text='Комментарий читателя')
+        Comment.objects.create(post=self.posts[0], author=self.author,
+                               text='Комментарий автора')
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def test_user_hidden_then_deleted_in_batches(self):
+        """Пользователь скрывается сразу и удаляется пачками."""
+        job = schedule_deletion(self.author)
+        self.assertFalse(Post.objects.exists())
+        self.assertEqual(Comment.objects.count(), 0)
+        response = self.client.get(reverse('posts:index'))
+        self.assertEqual(len(response.context['page_obj']), 0)
+        self.assertEqual(job.total, 2 + 1 + 3 + 1)
+        self.assertEqual(process_job(job, batch_size=2, max_batches=1), 1)
+        self.assertEqual(job.status, DeletionJob.RUNNING)
+        process_job(job, batch_size=2)
+        self.assertEqual(job.status, DeletionJob.DONE)
+        self.assertEqual(job.progress, 100)
+        self.assertFalse(User.objects.filter(pk=self.author.pk).exists())
+        self.assertFalse(Post._base_manager.exists())
+        self.assertFalse(Comment._base_manager.exists())
+        self.assertFalse(follow_graph.is_following(self.reader.pk,
+                                                   self.author.pk))
+
+    def test_user_rows_deleted_in_batches(self):
+        """Рекомендации, отметки и упоминания пользователя удаляются
+        пачками, а не каскадом вместе с ним.
+        """
+        mention = Post.objects.create(author=self.reader,
+                                      text='Привет, @testauthor')
+        FollowSuggestion.objects.create(user=self.author, author=self.reader,
+                                        score=1)
+        FollowSuggestion.objects.create(user=self.reader, author=self.author,
+                                        score=1)
+        OutdatedSuggestions.objects.create(user=self.author)
+        job = schedule_deletion(self.author)
+        self.assertEqual(job.total, 2 + 1 + 2 + 1 + 1 + 3 + 1)
+        process_job(job, batch_size=2)
+        self.assertFalse(mention.mentions.exists())
+        self.assertFalse(FollowSuggestion.objects.exists())
+        self.assertFalse(
+            OutdatedSuggestions.objects.filter(user=self.author).exists())
+
+    def test_group_posts_kept(self):
+        """При удалении группы её посты остаются без группы."""
+        job = schedule_deletion(self.group)
+        response = self.client.get(
+            reverse('posts:group_list', args=(self.group.slug,)))
+        self.assertEqual(response.status_code, 404)
+        call_command('process_deletions', stdout=StringIO())
+        job.refresh_from_db()
+        self.assertEqual(job.status, DeletionJob.DONE)
+        self.assertEqual(Post.objects.filter(group=None).count(), 3)
+        self.assertFalse(Group._base_manager.exists())
+
+    def test_admin_action(self):
+        """Действие админки ставит пост в очередь на удаление."""
+        admin = User.objects.create_superuser(
+            username='testadmin', email='admin@example.com',
+            password='password')
+        client = Client()
+        client.force_login(admin)
+        post = self.posts[0]
+        client.post(reverse('admin:posts_post_changelist'), {
+            'action': 'delete_in_background',
+            '_selected_action': [post.pk]})
+        job = DeletionJob.objects.get()
+        self.assertEqual((job.kind, job.object_id), (DeletionJob.POST,
+                                                     post.pk))
+        self.assertFalse(Post.objects.filter(pk=post.pk).exists())
+        response = client.get(reverse('admin:posts_deletionjob_changelist'))
+        self.assertContains(response, '0% (0 из 3)')
+
+    def test_admin_delete_button(self):
+        """Кнопка удаления на странице объекта удаляет в фоне."""
+        admin = User.objects.create_superuser(
+            username='testadmin', email='admin@example.com',
+            password='password')
+        client = Client()
+        client.force_login(admin)
+        url = reverse('admin:auth_user_delete', args=(self.author.pk,))
+        response = client.get(url)
+        self.assertNotContains(response, 'Тестовый пост')
+        client.post(url, {'post': 'yes'})
+        job = DeletionJob.objects.get()
+        self.assertEqual((job.kind, job.object_id), (DeletionJob.USER,
+                                                     self.author.pk))
+        self.assertTrue(User.objects.filter(pk=self.author.pk).exists())
+        response = client.get(reverse('admin:posts_post_changelist'))
+        actions = [name for name, _
+                   in response.context['action_form'].fields['action'].choices]
+        self.assertNotIn('delete_selected', actions)
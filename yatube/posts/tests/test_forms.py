@@ -2,11 +2,13 @@ import shutil
 import tempfile
 
 from django.conf import settings
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
 
-from ..models import Post, User
+from ..forms import DUPLICATE_ERROR, CommentForm, PostForm
+from ..models import Comment, Post, User
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
@@ -113,3 +115,52 @@ class CommentFormTests(TestCase):
                               kwargs={'post_id': self.post.pk}))
         self.assertTrue(self.post.comments.filter(
             text=form_data['text']).exists())
+
+
+class DuplicateTextTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.admin = User.objects.create_superuser(
+            username='testadmin', email='admin@example.com',
+            password='password')
+        cls.spam = ('Купите дешёвые часы прямо сейчас! Скидка 90% только '
+                    'сегодня, пишите в личку, доставка по всей стране.')
+        cls.post = Post.objects.create(author=cls.user, text=cls.spam)
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_near_duplicate_post_rejected(self):
+        """Почти повторяющий недавний текст пост не создаётся."""
+        posts_count = Post.objects.count()
+        response = self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': self.spam.upper().replace('!', '!!')})
+        self.assertFormError(response, 'form', 'text', DUPLICATE_ERROR)
+        self.assertEqual(Post.objects.count(), posts_count)
+
+    def test_near_duplicate_comment_rejected(self):
+        """Комментарий, повторяющий недавний текст, отклоняется."""
+        form = CommentForm(data={'text': self.spam.replace('часы', 'часики')})
+        self.assertFalse(form.is_valid())
+
+    def test_post_can_be_edited(self):
+        """Правка поста не считается повтором его самого."""
+        form = PostForm(data={'text': self.spam + ' Спешите!'},
+                        instance=self.post)
+        self.assertTrue(form.is_valid())
+
+    def test_duplicates_admin_page(self):
+        """Страница групп похожих текстов доступна в админке."""
+        Comment.objects.create(post=self.post, author=self.user,
+                               text=self.spam)
+        client = Client()
+        client.force_login(self.admin)
+        response = client.get(reverse('admin:posts_post_duplicates'))
+        self.assertEqual(len(response.context['clusters']), 1)
+        self.assertEqual(len(response.context['clusters'][0]), 2)
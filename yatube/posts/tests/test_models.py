@@ -1,6 +1,7 @@
 from django.test import TestCase
 
 from ..models import Group, Post, User
+from ..rendering import RENDERER_VERSION
 
 
 class PostModelTest(TestCase):
@@ -27,3 +28,31 @@ class PostModelTest(TestCase):
         for object, str_value in objects_name.items():
             with self.subTest(object=object):
                 self.assertEqual(object.__str__(), str_value)
+
+
+class RenderedTextTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+
+    def test_html_rendered_on_save(self):
+        """При сохранении поста текст превращается в безопасный HTML."""
+        post = Post.objects.create(
+            author=self.user,
+            text='<b>жирный</b>\nhttps://example.com',
+        )
+        self.assertEqual(post.html_version, RENDERER_VERSION)
+        self.assertIn('&lt;b&gt;', post.text_html)
+        self.assertIn('<br>', post.text_html)
+        self.assertIn('<a href="https://example.com"', post.text_html)
+
+    def test_outdated_html_rerendered_lazily(self):
+        """HTML устаревшей версии перерисовывается при обращении."""
+        post = Post.objects.create(author=self.user, text='Старый текст')
+        Post.objects.filter(pk=post.pk).update(text_html='', html_version=0)
+        post.refresh_from_db()
+        self.assertEqual(post.html, 'Старый текст')
+        post.refresh_from_db()
+        self.assertEqual(post.html_version, RENDERER_VERSION)
+        self.assertEqual(post.text_html, 'Старый текст')
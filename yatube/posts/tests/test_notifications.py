@@ -0,0 +1,49 @@
+from django.test import TestCase, override_settings
+
+from core.models import OutgoingEmail
+
+from ..models import Follow, Notification, Post, User
+from ..notifications import fan_out, send_digests
+
+
+@override_settings(NOTIFICATION_BATCH_SIZE=2, NOTIFICATION_DIGEST_SIZE=2)
+class DigestTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='testauthor')
+        cls.other = User.objects.create_user(username='otherauthor')
+        cls.readers = [
+            User.objects.create_user(username=f'reader{number}',
+                                     email=f'reader{number}@example.com')
+            for number in range(3)]
+        cls.silent = User.objects.create_user(username='noemail')
+        for reader in cls.readers + [cls.silent]:
+            Follow.objects.create(user=reader, author=cls.author)
+        Follow.objects.create(user=cls.readers[0], author=cls.other)
+
+    def test_posts_coalesced_into_digest(self):
+        """Все новые посты подписок приходят одним письмом."""
+        posts = [Post.objects.create(author=self.author,
+                                     text=f'Тестовый пост {number}')
+                 for number in range(3)]
+        posts.append(Post.objects.create(author=self.other,
+                                         text='Пост другого автора'))
+        for post in posts:
+            fan_out(post.pk)
+        self.assertEqual(Notification.objects.count(), 3 * 4 + 1)
+        self.assertEqual(send_digests(), 3)
+        self.assertFalse(Notification.objects.exists())
+        email = OutgoingEmail.objects.get(to='reader0@example.com')
+        self.assertIn('4', email.subject)
+        self.assertIn('Пост другого автора', email.body)
+        self.assertIn('И ещё 2', email.body)
+        self.assertFalse(OutgoingEmail.objects.filter(to='').exists())
+
+    def test_removed_post_not_sent(self):
+        post = Post.objects.create(author=self.author, text='Скрытый пост')
+        fan_out(post.pk)
+        Post.objects.filter(pk=post.pk).update(is_removed=True)
+        self.assertEqual(send_digests(), 0)
+        self.assertFalse(Notification.objects.exists())
@@ -1,14 +1,28 @@
+import math
 import shutil
 import tempfile
+from io import StringIO
+from unittest.mock import patch
 
 from django import forms
 from django.conf import settings
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import Client, TestCase, override_settings
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.test import (Client, TestCase, TransactionTestCase,
+                         override_settings)
 from django.urls import reverse
 
-from ..models import Comment, Follow, Group, Post, User
+from core.taskqueue import Worker
+
+from .. import ranking
+from ..counters import view_counter
+from ..duplicates import DuplicateIndex, rebuild_duplicate_index
+from ..follow_graph import FollowGraph, follow_graph
+from ..models import (Comment, Follow, FollowSuggestion, Group, Post,
+                      RelatedPost, Tag, User)
+from ..related import RelatedPostsIndex, get_related_posts
 from ..utils import POSTS_COUNT
 
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
@@ -209,6 +223,41 @@ class PostPaginatorTest(TestCase):
                         len(response.context['page_obj']),
                         POSTS_COUNT if page_number == 1 else self.POSTS_DELTA)
 
+    def test_feed_fragments(self):
+        """Фрагмент ленты продолжает первую страницу по её курсору."""
+        feeds = (
+            ('posts:index', 'posts:index_fragment', {}),
+            ('posts:group_list', 'posts:group_fragment',
+             {'slug': self.group.slug}),
+            ('posts:profile', 'posts:profile_fragment',
+             {'username': self.author.username}),
+        )
+        for page_name, fragment_name, kwargs in feeds:
+            with self.subTest(fragment_name=fragment_name):
+                cache.clear()
+                response = self.client.get(reverse(page_name, kwargs=kwargs))
+                page_obj = response.context['page_obj']
+                self.assertContains(response, 'data-next-cursor')
+                response = self.client.get(
+                    reverse(fragment_name, kwargs=kwargs),
+                    {'cursor': page_obj.next_cursor})
+                posts = response.context['page_obj']
+                self.assertEqual(len(posts), self.POSTS_DELTA)
+                self.assertFalse(set(posts) & set(page_obj))
+                self.assertFalse(response.has_header('X-Next-Cursor'))
+                self.assertNotContains(response, '<html')
+
+    def test_follow_fragment_next_cursor(self):
+        """Фрагмент ленты подписок сообщает курсор следующей порции."""
+        user = User.objects.create_user(username='testuser')
+        Follow.objects.create(user=user, author=self.author)
+        client = Client()
+        client.force_login(user)
+        response = client.get(reverse('posts:follow_fragment'))
+        self.assertEqual(len(response.context['page_obj']), POSTS_COUNT)
+        self.assertEqual(response['X-Next-Cursor'],
+                         response.context['page_obj'].next_cursor)
+
 
 class PostGroupProfileTests(TestCase):
 
@@ -326,3 +375,436 @@ class CacheTest(TestCase):
         cache.clear()
         response = self.client.get(reverse('posts:index'))
         self.assertNotContains(response, self.post.text)
+
+
+class TagMentionTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.author = User.objects.create_user(username='testauthor')
+        cls.post = Post.objects.create(author=cls.author,
+                                       text='Пишу про #Django для @testuser')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_tags_and_mentions_indexed_on_save(self):
+        """Теги и упоминания извлекаются из текста при сохранении."""
+        tag = Tag.objects.get(name='django')
+        self.assertEqual(tag.posts_count, 1)
+        self.assertEqual(list(self.user.mentioned_in.all()), [self.post])
+        self.post.text = 'Пишу про #python'
+        self.post.save()
+        tag.refresh_from_db()
+        self.assertEqual(tag.posts_count, 0)
+        self.assertFalse(self.user.mentioned_in.exists())
+        self.post.delete()
+        self.assertEqual(Tag.objects.get(name='python').posts_count, 0)
+
+    def test_existing_posts_reindexed(self):
+        """Команда заполняет индекс для постов, сохранённых до него."""
+        old_post = Post.objects.create(author=self.user, text='Старый пост')
+        Post.objects.filter(pk=old_post.pk).update(
+            text='Старый пост про #django и #python для @testauthor')
+        Post.tags.through.objects.filter(post=self.post).delete()
+        Tag.objects.update(posts_count=7)
+        call_command('reindex_tags', batch_size=1, stdout=StringIO())
+        self.assertEqual(
+            dict(Tag.objects.values_list('name', 'posts_count')),
+            {'django': 2, 'python': 1})
+        self.assertEqual(list(self.author.mentioned_in.all()), [old_post])
+        self.assertEqual(list(self.user.mentioned_in.all()), [self.post])
+
+    def test_tag_and_mentions_pages_contain_post(self):
+        """Страницы тега и упоминаний содержат пост."""
+        for url in (reverse('posts:tag_posts', args=('django',)),
+                    reverse('posts:mentions', args=(self.user,))):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(list(response.context['page_obj']),
+                                 [self.post])
+        response = self.client.get(reverse('posts:post_detail',
+                                           args=(self.post.pk,)))
+        self.assertContains(
+            response, reverse('posts:tag_posts', args=('django',)))
+
+    def test_tag_page_paginated_by_cursor(self):
+        """Лента тега листается по курсору без пропусков и повторов."""
+        posts = [Post.objects.create(author=self.author,
+                                     text=f'Пост #django {number}')
+                 for number in range(POSTS_COUNT + 2)]
+        url = reverse('posts:tag_posts', args=('django',))
+        first_page = self.client.get(url).context['page_obj']
+        self.assertEqual(len(first_page), POSTS_COUNT)
+        second_page = self.client.get(
+            url, {'cursor': first_page.next_cursor}).context['page_obj']
+        self.assertEqual(len(second_page), 3)
+        self.assertIsNone(second_page.next_cursor)
+        self.assertEqual({post.pk for post in first_page + second_page},
+                         {post.pk for post in posts} | {self.post.pk})
+
+
+class PopularPostsTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.author = User.objects.create_user(username='testauthor')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.old_post = Post.objects.create(author=cls.author,
+                                           text='Старый пост',
+                                           group=cls.group)
+        cls.new_post = Post.objects.create(author=cls.author,
+                                           text='Новый пост',
+                                           group=cls.group)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_commented_post_ranked_higher(self):
+        """Комментарии поднимают пост в популярном."""
+        url = reverse('posts:popular')
+        response = self.client.get(url)
+        self.assertEqual(response.context['page_obj'][0], self.new_post)
+        for number in range(3):
+            Comment.objects.create(post=self.old_post, author=self.user,
+                                   text=f'Комментарий {number}')
+        for url in (reverse('posts:popular'),
+                    reverse('posts:group_popular', args=(self.group.slug,))):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(list(response.context['page_obj']),
+                                 [self.old_post, self.new_post])
+
+    def test_scores_added_in_update(self):
+        """Очки складываются в базе как ln(e^a + e^b)."""
+        Post.objects.filter(pk=self.old_post.pk).update(popularity=10.0)
+        with patch.object(ranking, 'get_event_score', return_value=9.0):
+            ranking.record_engagement(self.old_post, ranking.COMMENT_WEIGHT)
+        self.old_post.refresh_from_db()
+        self.assertAlmostEqual(self.old_post.popularity,
+                               math.log(math.exp(10) + math.exp(9)))
+
+    def test_top_rebuilt_after_bulk_update(self):
+        """Очки, записанные в обход событий, тоже меняют топ."""
+        self.client.force_login(self.user)
+        self.client.get(reverse('posts:popular'))
+        Post.objects.filter(pk=self.old_post.pk).update(popularity=1e6)
+        response = self.client.get(reverse('posts:popular'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.old_post, self.new_post])
+
+    def test_page_of_missing_posts_empty(self):
+        """Страница топа, все посты которой уже удалены, пуста."""
+        missing_top = [(1.0, 0)] * (POSTS_COUNT + 1)
+        with patch.object(ranking, 'get_top', return_value=missing_top):
+            response = self.client.get(reverse('posts:popular'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['page_obj']), [])
+        self.assertIsNone(response.context['page_obj'].next_cursor)
+
+    def test_deleted_post_leaves_popular(self):
+        """Удалённый пост пропадает из популярного."""
+        self.client.get(reverse('posts:popular'))
+        Post.objects.get(pk=self.new_post.pk).delete()
+        response = self.client.get(reverse('posts:popular'))
+        self.assertEqual(list(response.context['page_obj']),
+                         [self.old_post])
+
+
+class ViewCounterTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='testauthor')
+        cls.post = Post.objects.create(author=cls.author,
+                                       text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+        view_counter.discard()
+
+    def test_views_buffered_until_flush(self):
+        """Просмотры копятся в памяти и видны до записи в базу."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        for _ in range(3):
+            self.client.get(url)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.views, 0)
+        self.assertEqual(post.view_count, 3)
+        view_counter.flush()
+        post.refresh_from_db()
+        self.assertEqual(post.views, 3)
+        self.assertEqual(post.view_count, 3)
+
+    @override_settings(VIEW_COUNTER_FLUSH_THRESHOLD=2)
+    def test_views_flushed_on_threshold(self):
+        """При достижении порога просмотры записываются в базу."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).views, 2)
+
+    def test_failed_flush_keeps_views(self):
+        """Ошибка базы при записи не теряет просмотры."""
+        url = reverse('posts:post_detail', args=(self.post.pk,))
+        self.client.get(url)
+        with patch('django.db.models.query.QuerySet.update',
+                   side_effect=DatabaseError('database is locked')):
+            with self.assertLogs('posts.counters', 'WARNING'):
+                view_counter.flush()
+        self.assertEqual(view_counter.pending(self.post.pk), 1)
+        view_counter.flush()
+        self.assertEqual(Post.objects.get(pk=self.post.pk).views, 1)
+
+
+class FollowSuggestionTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.friend = User.objects.create_user(username='testfriend')
+        cls.author = User.objects.create_user(username='testauthor')
+        cls.other_author = User.objects.create_user(username='otherauthor')
+        Follow.objects.create(user=cls.user, author=cls.friend)
+        Follow.objects.create(user=cls.friend, author=cls.author)
+        Follow.objects.create(user=cls.friend, author=cls.other_author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def test_suggestions_shown_on_follow_index(self):
+        """Рекомендации авторов выводятся в ленте подписок."""
+        call_command('update_suggestions', '--all', stdout=StringIO())
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertEqual(
+            {suggestion.author for suggestion
+             in response.context['suggestions']},
+            {self.author, self.other_author})
+
+    def test_only_changed_users_refreshed(self):
+        """Пересчитываются только пользователи с новыми подписками
+        и подписка убирает автора из рекомендаций."""
+        call_command('update_suggestions', '--all', stdout=StringIO())
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertFalse(FollowSuggestion.objects.filter(
+            user=self.user, author=self.author).exists())
+        # Отметки хранятся в базе, а не в кеше процесса.
+        cache.clear()
+        with patch('posts.suggestions.score_candidates',
+                   return_value=[]) as score_candidates:
+            call_command('update_suggestions', stdout=StringIO())
+        self.assertEqual(
+            [call_args[0][0] for call_args in score_candidates.call_args_list],
+            [self.user.pk])
+
+    def test_follower_can_be_deleted(self):
+        """Удаление подписчика не ломается на отметке его рекомендаций."""
+        follower = User.objects.create_user(username='follower')
+        Follow.objects.create(user=follower, author=self.author)
+        follower.delete()
+        connection.check_constraints()
+        with patch('posts.suggestions.score_candidates',
+                   return_value=[]) as score_candidates:
+            call_command('update_suggestions', stdout=StringIO())
+        self.assertNotIn(
+            follower.pk,
+            [call_args[0][0] for call_args in score_candidates.call_args_list])
+
+
+@override_settings(CHANGE_LOG_POLL_INTERVAL=0)
+class SharedIndexTests(TransactionTestCase):
+    """Индексы в памяти видят изменения, сделанные другим процессом.
+    Другой процесс изображает отдельный экземпляр индекса.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser')
+        self.author = User.objects.create_user(username='testauthor')
+
+    def test_follow_graph_follows_commits(self):
+        """Подписка попадает в граф после фиксации, откат не оставляет
+        ребра, а другой процесс перечитывает только изменённые пары.
+        """
+        this_process = FollowGraph()
+        other_process = FollowGraph()
+        for graph in (this_process, other_process):
+            self.assertFalse(graph.is_following(self.user.pk,
+                                                self.author.pk))
+        with patch.object(follow_graph, 'changed', this_process.changed):
+            with transaction.atomic():
+                follow = Follow.objects.create(user=self.user,
+                                               author=self.author)
+                self.assertTrue(this_process.is_following(self.user.pk,
+                                                          self.author.pk))
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    Follow.objects.create(user=self.author, author=self.user)
+                    raise RuntimeError
+            with patch.object(FollowGraph, '_load',
+                              side_effect=AssertionError('Полная загрузка')):
+                for graph in (this_process, other_process):
+                    self.assertTrue(graph.is_following(self.user.pk,
+                                                       self.author.pk))
+                    self.assertFalse(graph.is_following(self.author.pk,
+                                                        self.user.pk))
+                follow.delete()
+                for graph in (this_process, other_process):
+                    self.assertEqual(graph.followers_count(self.author.pk), 0)
+        with override_settings(CHANGE_LOG_POLL_INTERVAL=60):
+            with self.assertNumQueries(0):
+                other_process.is_following(self.user.pk, self.author.pk)
+
+    def test_related_index_follows_commits(self):
+        """Другой процесс перечитывает только сохранённые посты."""
+        other_process = RelatedPostsIndex()
+        Post.objects.create(author=self.author,
+                            text='Прогулка по горам в августе')
+        other_process.current()
+        with patch.object(RelatedPostsIndex, '_load',
+                          side_effect=AssertionError('Полная загрузка')):
+            post = Post.objects.create(
+                author=self.author,
+                text='Рецепт борща со свёклой и капустой')
+            similar_post = Post.objects.create(
+                author=self.author,
+                text='Борщ без свёклы: рецепт с капустой')
+            similar = other_process.current().similar(similar_post.pk, 5)
+            self.assertEqual([post_id for post_id, _ in similar], [post.pk])
+            post.delete()
+            self.assertEqual(
+                other_process.current().similar(similar_post.pk, 5), [])
+
+    def test_duplicate_index_follows_commits(self):
+        """Другой процесс перешинглирует только сохранённые тексты, а
+        пересборка индекса заставляет его перечитать всё.
+        """
+        other_process = DuplicateIndex()
+        text = ('Купите дешёвые часы прямо сейчас! Скидка 90% только '
+                'сегодня, пишите в личку, доставка по всей стране.')
+        self.assertEqual(other_process.find_duplicates(text), [])
+        with patch.object(DuplicateIndex, '_load',
+                          side_effect=AssertionError('Полная загрузка')):
+            post = Post.objects.create(author=self.author, text=text)
+            self.assertEqual(other_process.find_duplicates(text),
+                             [('post', post.pk)])
+            comment = Comment.objects.create(post=post, author=self.user,
+                                             text=text.upper())
+            self.assertEqual(
+                sorted(other_process.find_duplicates(text)),
+                [('comment', comment.pk), ('post', post.pk)])
+            comment.delete()
+            self.assertEqual(other_process.find_duplicates(text),
+                             [('post', post.pk)])
+        Post.objects.filter(pk=post.pk).update(text='Другой текст')
+        self.assertEqual(other_process.find_duplicates(text),
+                         [('post', post.pk)])
+        rebuild_duplicate_index()
+        self.assertEqual(other_process.find_duplicates(text), [])
+
+
+class FollowGraphTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser')
+        cls.author = User.objects.create_user(username='testauthor')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_graph_follows_signals(self):
+        """Граф подписок обновляется при подписке и отписке."""
+        self.assertFalse(follow_graph.is_following(self.user.pk,
+                                                   self.author.pk))
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        self.assertTrue(follow_graph.is_following(self.user.pk,
+                                                  self.author.pk))
+        self.assertEqual(follow_graph.followers_count(self.author.pk), 1)
+        follow.delete()
+        self.assertFalse(follow_graph.is_following(self.user.pk,
+                                                   self.author.pk))
+        self.assertEqual(follow_graph.followers_count(self.author.pk), 0)
+
+    def test_json_follow_and_unfollow(self):
+        """JSON-подписка идемпотентна и возвращает новое состояние."""
+        client = Client()
+        client.force_login(self.user)
+        url = reverse('posts:profile_follow_json', args=(self.author,))
+        for _ in range(2):
+            response = client.post(url)
+            self.assertEqual(response.json(),
+                             {'following': True, 'followers_count': 1})
+        self.assertEqual(Follow.objects.count(), 1)
+        response = client.post(
+            reverse('posts:profile_unfollow_json', args=(self.author,)))
+        self.assertEqual(response.json(),
+                         {'following': False, 'followers_count': 0})
+        self.assertFalse(Follow.objects.exists())
+
+    def test_json_follow_requires_post(self):
+        """JSON-подписка не выполняется GET-запросом и на себя."""
+        client = Client()
+        client.force_login(self.user)
+        response = client.get(
+            reverse('posts:profile_follow_json', args=(self.author,)))
+        self.assertEqual(response.status_code, 405)
+        response = client.post(
+            reverse('posts:profile_follow_json', args=(self.user,)))
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Follow.objects.exists())
+
+
+class RelatedPostsTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='testauthor')
+        cls.post = Post.objects.create(
+            author=cls.author, text='Рецепт борща со свёклой и капустой')
+        cls.similar_post = Post.objects.create(
+            author=cls.author, text='Борщ без свёклы: рецепт с капустой')
+        cls.other_post = Post.objects.create(
+            author=cls.author, text='Прогулка по горам в августе')
+
+    def setUp(self):
+        cache.clear()
+        Worker(threads=0).work_off()
+
+    def test_related_posts_shown_on_detail(self):
+        """На странице поста выводятся похожие по тексту посты."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=(self.post.pk,)))
+        self.assertEqual(response.context['related_posts'],
+                         [self.similar_post])
+
+    def test_new_post_related_on_write(self):
+        """Похожие нового поста считаются в фоне после сохранения и
+        попадают в списки его соседей.
+        """
+        new_post = Post.objects.create(author=self.author,
+                                       text='Прогулка по горам весной')
+        self.assertEqual(get_related_posts(new_post), [])
+        Worker(threads=0).work_off()
+        with self.assertNumQueries(2):
+            self.assertEqual(get_related_posts(new_post), [self.other_post])
+        self.assertEqual(get_related_posts(self.other_post), [new_post])
+
+    def test_existing_posts_backfilled(self):
+        """Команда считает похожие для уже написанных постов."""
+        RelatedPost.objects.all().delete()
+        call_command('update_related_posts', stdout=StringIO())
+        self.assertEqual(get_related_posts(self.similar_post), [self.post])
@@ -6,8 +6,13 @@ app_name = 'posts'
 
 urlpatterns = [
     path('', views.index, name='index'),
+    path('popular/', views.popular, name='popular'),
     path('group/<slug:slug>/', views.group_post, name='group_list'),
+    path('group/<slug:slug>/popular/', views.group_popular,
+         name='group_popular'),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('tag/<str:name>/', views.tag_posts, name='tag_posts'),
+    path('mentions/<str:username>/', views.mentions, name='mentions'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_update'),
@@ -18,4 +23,14 @@ urlpatterns = [
          name='profile_follow'),
     path('profile/<str:username>/unfollow/', views.profile_unfollow,
          name='profile_unfollow'),
+    path('profile/<str:username>/follow.json', views.profile_follow_json,
+         name='profile_follow_json'),
+    path('profile/<str:username>/unfollow.json', views.profile_unfollow_json,
+         name='profile_unfollow_json'),
+    path('fragments/index/', views.index_fragment, name='index_fragment'),
+    path('fragments/group/<slug:slug>/', views.group_fragment,
+         name='group_fragment'),
+    path('fragments/profile/<str:username>/', views.profile_fragment,
+         name='profile_fragment'),
+    path('fragments/follow/', views.follow_fragment, name='follow_fragment'),
 ]
@@ -1,9 +1,56 @@
+from datetime import datetime, timezone
+
 from django.core.paginator import Paginator
+from django.db.models import Q
+
+from core.loaders import load_related
 
 POSTS_COUNT = 10
+CURSOR_DATE_FORMAT = '%Y%m%d%H%M%S%f'
 
 
 def get_page_obj(request, post_list, count=POSTS_COUNT):
     paginator = Paginator(post_list, count)
     page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+    page_obj = paginator.get_page(page_number)
+    page_obj.object_list = load_related(page_obj.object_list,
+                                        'author', 'group')
+    # Ленивый список может отбросить посты страницы, которых уже нет
+    # в базе, и страница окажется пустой.
+    page_obj.next_cursor = (make_cursor(page_obj.object_list[-1])
+                            if page_obj.has_next() and page_obj.object_list
+                            else None)
+    return page_obj
+
+
+class CursorPage(list):
+    """Страница ленты, листаемой по ключу (pub_date, id) без OFFSET."""
+
+    def __init__(self, posts, next_cursor):
+        super().__init__(posts)
+        self.next_cursor = next_cursor
+
+
+def make_cursor(post):
+    return f'{post.pub_date.strftime(CURSOR_DATE_FORMAT)}-{post.pk}'
+
+
+def parse_cursor(cursor):
+    try:
+        pub_date, pk = cursor.split('-')
+        pub_date = datetime.strptime(pub_date, CURSOR_DATE_FORMAT)
+        return pub_date.replace(tzinfo=timezone.utc), int(pk)
+    except (AttributeError, ValueError):
+        return None
+
+
+def get_cursor_page(request, post_list, count=POSTS_COUNT):
+    post_list = post_list.order_by('-pub_date', '-pk')
+    cursor = parse_cursor(request.GET.get('cursor'))
+    if cursor is not None:
+        pub_date, pk = cursor
+        post_list = post_list.filter(
+            Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk))
+    posts = load_related(post_list[:count + 1], 'author', 'group')
+    next_cursor = make_cursor(posts[count - 1]) if len(posts) > count else None
+    return CursorPage(posts[:count], next_cursor)
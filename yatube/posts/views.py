@@ -1,55 +1,117 @@
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError, transaction
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.views.decorators.http import require_POST
 
+from core.loaders import get_identity_map, load_related
+from core.querycache import cached
+from core.ratelimit import ratelimit
+
+from .counters import view_counter
+from .follow_graph import follow_graph
 from .forms import CommentForm, PostForm
-from .models import Group, Follow, Post, User
-from .utils import get_page_obj
+from .models import Group, Follow, Post, Tag, User
+from .ranking import PopularPostList
+from .related import get_related_posts
+from .utils import get_cursor_page, get_page_obj
+
+TRENDING_TAGS_COUNT = 10
+# Дальше список авторов в IN перестаёт помещаться в лимит параметров
+# SQLite, и лента подписок строится подзапросом.
+FOLLOW_INDEX_MAX_AUTHORS = 500
+
+
+def get_follow_suggestions(user):
+    if not user.is_authenticated:
+        return []
+    return load_related(
+        user.follow_suggestions.all()[:settings.FOLLOW_SUGGESTIONS_SHOWN],
+        'author')
 
 
 def index(request):
-    post_list = Post.objects.select_related('group', 'author').all()
+    post_list = Post.objects.cached()
     page_obj = get_page_obj(request, post_list)
     context = {'page_obj': page_obj}
     return render(request, 'posts/index.html', context)
 
 
 def group_post(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    group = get_object_or_404(Group.objects.cached(), slug=slug)
+    get_identity_map().add(group)
+    post_list = group.posts.cached()
     page_obj = page_obj = get_page_obj(request, post_list)
     context = {'page_obj': page_obj, 'group': group}
     return render(request, 'posts/group_list.html', context)
 
 
+def popular(request):
+    page_obj = get_page_obj(request, PopularPostList())
+    context = {'page_obj': page_obj, 'popular': True}
+    return render(request, 'posts/index.html', context)
+
+
+def group_popular(request, slug):
+    group = get_object_or_404(Group.objects.cached(), slug=slug)
+    get_identity_map().add(group)
+    page_obj = get_page_obj(request, PopularPostList(group))
+    context = {'page_obj': page_obj, 'group': group, 'popular': True}
+    return render(request, 'posts/group_list.html', context)
+
+
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = Post.objects.filter(author=author)
+    author = get_object_or_404(cached(User.objects.all()),
+                               username=username)
+    get_identity_map().add(author)
+    post_list = Post.objects.filter(author=author).cached()
     page_obj = page_obj = get_page_obj(request, post_list)
-
-    if (request.user.is_authenticated
-        and Follow.objects.filter(user=request.user,
-                                  author=author).exists()):
-        following = True
-    else:
-        following = False
+    following = (request.user.is_authenticated
+                 and follow_graph.is_following(request.user.pk, author.pk))
     context = {'author': author,
                'page_obj': page_obj,
-               'following': following}
+               'following': following,
+               'followers_count': follow_graph.followers_count(author.pk),
+               'suggestions': get_follow_suggestions(request.user)}
     return render(request, 'posts/profile.html', context)
 
 
+def tag_posts(request, name):
+    tag = get_object_or_404(Tag, name=name.lower())
+    page_obj = get_cursor_page(request, tag.posts.all())
+    trending_tags = Tag.objects.filter(
+        posts_count__gt=0).order_by('-posts_count')[:TRENDING_TAGS_COUNT]
+    context = {'tag': tag,
+               'page_obj': page_obj,
+               'trending_tags': trending_tags}
+    return render(request, 'posts/tag_list.html', context)
+
+
+def mentions(request, username):
+    user = get_object_or_404(cached(User.objects.all()), username=username)
+    get_identity_map().add(user)
+    page_obj = get_cursor_page(request, user.mentioned_in.all())
+    context = {'mentioned': user, 'page_obj': page_obj}
+    return render(request, 'posts/mentions.html', context)
+
+
 def post_detail(request, post_id):
-    post = get_object_or_404(Post.objects.select_related(), pk=post_id)
-    comments = post.comments.all()
+    post = get_object_or_404(Post, pk=post_id)
+    view_counter.increment(post.pk)
+    load_related([post], 'author', 'group')
+    comments = load_related(post.comments.all(), 'author')
     form = CommentForm()
     context = {'title': post.text,
                'post': post,
                'form': form,
-               'comments': comments}
+               'comments': comments,
+               'related_posts': get_related_posts(post)}
     return render(request, 'posts/post_detail.html', context)
 
 
 @login_required
+@ratelimit('post_create', methods=('POST',))
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
     if not form.is_valid():
@@ -77,6 +139,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@ratelimit('add_comment')
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -88,30 +151,113 @@ def add_comment(request, post_id):
     return redirect('posts:post_detail', post_id=post_id)
 
 
+def get_follow_post_list(user):
+    author_ids = follow_graph.following(user.pk)
+    if len(author_ids) <= FOLLOW_INDEX_MAX_AUTHORS:
+        post_list = Post.objects.filter(author_id__in=list(author_ids))
+    else:
+        post_list = Post.objects.filter(author__following__user=user)
+    return post_list.cached()
+
+
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
+    post_list = get_follow_post_list(request.user)
     page_obj = get_page_obj(request, post_list)
-    context = {'page_obj': page_obj}
+    context = {'page_obj': page_obj,
+               'suggestions': get_follow_suggestions(request.user)}
     return render(request, 'posts/follow.html', context)
 
 
+def follow_author(user, author):
+    """Подписывает пользователя на автора одним INSERT; повторная
+    подписка упирается в unique_follow и ничего не меняет.
+    """
+    if user == author:
+        return
+    try:
+        with transaction.atomic():
+            Follow.objects.create(user=user, author=author)
+    except IntegrityError:
+        pass
+
+
+def unfollow_author(user, author):
+    Follow.objects.filter(user=user, author=author).delete()
+
+
 @login_required
+@ratelimit('follow')
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
-    if (request.user != author
-            and not Follow.objects.filter(user=request.user,
-                                          author=author).exists()):
-        Follow.objects.create(user=request.user,
-                              author=author)
+    follow_author(request.user, author)
     return redirect('posts:profile', author)
 
 
 @login_required
+@ratelimit('follow')
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    follow = Follow.objects.filter(user=request.user,
-                                   author=author)
-    if follow:
-        follow.delete()
+    unfollow_author(request.user, author)
     return redirect('posts:profile', author)
+
+
+def get_follow_state(user, author):
+    return JsonResponse({
+        'following': follow_graph.is_following(user.pk, author.pk),
+        'followers_count': follow_graph.followers_count(author.pk),
+    })
+
+
+@require_POST
+@login_required
+@ratelimit('follow', json=True)
+def profile_follow_json(request, username):
+    author = get_object_or_404(User, username=username)
+    if request.user == author:
+        return JsonResponse({'error': 'Нельзя подписаться на себя'},
+                            status=400)
+    follow_author(request.user, author)
+    return get_follow_state(request.user, author)
+
+
+@require_POST
+@login_required
+@ratelimit('follow', json=True)
+def profile_unfollow_json(request, username):
+    author = get_object_or_404(User, username=username)
+    unfollow_author(request.user, author)
+    return get_follow_state(request.user, author)
+
+
+def render_feed_fragment(request, post_list):
+    """Только карточки постов следующей страницы ленты: курсор
+    следующей страницы передаётся в заголовке X-Next-Cursor.
+    """
+    page_obj = get_cursor_page(request, post_list)
+    response = render(request, 'includes/posts/article_list.html',
+                      {'page_obj': page_obj})
+    if page_obj.next_cursor:
+        response['X-Next-Cursor'] = page_obj.next_cursor
+    return response
+
+
+def index_fragment(request):
+    return render_feed_fragment(request, Post.objects.cached())
+
+
+def group_fragment(request, slug):
+    group = get_object_or_404(Group.objects.cached(), slug=slug)
+    return render_feed_fragment(request, group.posts.cached())
+
+
+def profile_fragment(request, username):
+    author = get_object_or_404(cached(User.objects.all()),
+                               username=username)
+    return render_feed_fragment(
+        request, Post.objects.filter(author=author).cached())
+
+
+@login_required
+def follow_fragment(request):
+    return render_feed_fragment(request, get_follow_post_list(request.user))
@@ -0,0 +1,38 @@
+// Подписка и отписка без перезагрузки профиля. Без JavaScript кнопки
+// остаются обычными ссылками.
+document.addEventListener('DOMContentLoaded', function () {
+  document.querySelectorAll('[data-follow-url]').forEach(function (button) {
+    button.addEventListener('click', function (event) {
+      event.preventDefault();
+      if (button.dataset.busy) {
+        return;
+      }
+      button.dataset.busy = 'true';
+      var following = button.dataset.following === 'true';
+      var url = following ? button.dataset.unfollowUrl : button.dataset.followUrl;
+      fetch(url, {
+        method: 'POST',
+        credentials: 'same-origin',
+        headers: {'X-CSRFToken': button.dataset.csrf},
+      }).then(function (response) {
+        if (!response.ok) {
+          throw new Error(response.status);
+        }
+        return response.json();
+      }).then(function (state) {
+        button.dataset.following = state.following ? 'true' : 'false';
+        button.textContent = state.following ? 'Отписаться' : 'Подписаться';
+        button.classList.toggle('btn-light', state.following);
+        button.classList.toggle('btn-primary', !state.following);
+        var count = document.getElementById('followers-count');
+        if (count) {
+          count.textContent = state.followers_count;
+        }
+      }).catch(function () {
+        window.location.reload();
+      }).finally(function () {
+        delete button.dataset.busy;
+      });
+    });
+  });
+});
@@ -0,0 +1,48 @@
+// Бесконечная лента: когда конец страницы попадает в область видимости,
+// следующие посты догружаются фрагментом по курсору. Без JavaScript
+// остаётся обычный пагинатор.
+document.addEventListener('DOMContentLoaded', function () {
+  var sentinel = document.querySelector('[data-feed-url]');
+  if (!sentinel || !('IntersectionObserver' in window)) {
+    return;
+  }
+  var paginator = document.querySelector('nav[aria-label="Page navigation"]');
+  if (paginator) {
+    paginator.hidden = true;
+  }
+  var loading = false;
+  var observer = new IntersectionObserver(function (entries) {
+    if (loading || !entries[0].isIntersecting) {
+      return;
+    }
+    loading = true;
+    var url = sentinel.dataset.feedUrl + '?cursor=' +
+      encodeURIComponent(sentinel.dataset.nextCursor);
+    fetch(url, {credentials: 'same-origin'}).then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.status);
+      }
+      var cursor = response.headers.get('X-Next-Cursor');
+      return response.text().then(function (html) {
+        sentinel.insertAdjacentHTML('beforebegin', html);
+        if (cursor) {
+          sentinel.dataset.nextCursor = cursor;
+          // Повторное наблюдение проверит, не виден ли конец ленты снова.
+          observer.unobserve(sentinel);
+          observer.observe(sentinel);
+        } else {
+          observer.disconnect();
+          sentinel.remove();
+        }
+      });
+    }).catch(function () {
+      observer.disconnect();
+      if (paginator) {
+        paginator.hidden = false;
+      }
+    }).finally(function () {
+      loading = false;
+    });
+  }, {rootMargin: '600px'});
+  observer.observe(sentinel);
+});
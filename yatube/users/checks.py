@@ -0,0 +1,19 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Tags, Warning, register
+
+W001 = Warning(
+    'USER_CACHE_ALIAS указывает на кеш в памяти процесса.',
+    hint=('Пользователи и сессии кешируются в каждом процессе отдельно: '
+          'смена пароля или блокировка не дойдёт до остальных процессов '
+          'до USER_CACHE_TIMEOUT. Укажите общий кеш (Memcached, Redis).'),
+    id='users.W001',
+)
+
+
+@register(Tags.caches, Tags.security, deploy=True)
+def check_user_cache(app_configs, **kwargs):
+    if isinstance(caches[settings.USER_CACHE_ALIAS], LocMemCache):
+        return [W001]
+    return []
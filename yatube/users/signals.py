@@ -0,0 +1,12 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .backends import invalidate_cached_user
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=User)
+def clear_cached_user(instance, **kwargs):
+    invalidate_cached_user(instance.pk)
@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.test import Client, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import User
+
+from ..backends import CachedModelBackend
+from ..checks import W001, check_user_cache
+
+
+class CachedModelBackendTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='testuser',
+                                            password='old-password')
+
+    def setUp(self):
+        cache.clear()
+        self.backend = CachedModelBackend()
+
+    def test_user_loaded_from_cache(self):
+        """Повторная загрузка пользователя не обращается к базе."""
+        self.backend.get_user(self.user.pk)
+        with self.assertNumQueries(0):
+            user = self.backend.get_user(self.user.pk)
+        self.assertEqual(user, self.user)
+
+    def test_password_change_invalidates_cache(self):
+        """Смена пароля сбрасывает закешированного пользователя."""
+        self.backend.get_user(self.user.pk)
+        self.user.set_password('new-password')
+        self.user.save()
+        user = self.backend.get_user(self.user.pk)
+        self.assertTrue(user.check_password('new-password'))
+
+    def test_authorized_request_skips_session_and_user_queries(self):
+        """Авторизованный запрос не читает сессию и пользователя из базы."""
+        client = Client()
+        client.force_login(self.user)
+        url = reverse('about:author')
+        client.get(url)
+        with self.assertNumQueries(0):
+            client.get(url)
+
+
+class UserCacheCheckTest(SimpleTestCase):
+
+    def test_local_cache_reported(self):
+        """check --deploy предупреждает о кеше в памяти процесса."""
+        self.assertEqual(check_user_cache(None), [W001])
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'shared': {
+            'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+    }, USER_CACHE_ALIAS='shared')
+    def test_shared_cache_accepted(self):
+        self.assertEqual(check_user_cache(None), [])
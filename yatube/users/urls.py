@@ -8,6 +8,7 @@ from django.contrib.auth.views import (LoginView, LogoutView,
 from django.urls import path
 
 from . import views
+from .forms import QueuedPasswordResetForm
 
 app_name = 'users'
 
@@ -36,6 +37,7 @@ urlpatterns = [
         name='password_change_done'),
     path('password_reset/',
          PasswordResetView.as_view(
+             form_class=QueuedPasswordResetForm,
              template_name='users/password_reset_form.html'),
          name='password_reset_form'),
     path('password_reset/done/',
@@ -1,4 +1,5 @@
 import os
+from datetime import timedelta
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
@@ -28,11 +29,19 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.slow_queries.SlowQueryMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.AnonymousPageCacheMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.loaders.IdentityMapMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.routers.ReplicaRoutingMiddleware',
+    'core.profiling.ProfilingMiddleware',
+    'core.template_timing.TemplateTimingMiddleware',
+    'core.memory.MemoryProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -42,7 +51,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.backends.InstrumentedDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -58,6 +67,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
+TEST_RUNNER = 'yatube.test_runner.DiscoverRunner'
 
 DATABASES = {
     'default': {
@@ -65,6 +75,33 @@ DATABASES = {
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
     }
 }
+# Реплики только для чтения. Локально это копии файла основной базы,
+# которые обновляет manage.py sync_replicas; в тестах они смотрят в
+# тестовую основную базу.
+DATABASE_REPLICAS = [
+    f'replica{number}'
+    for number in range(1, int(os.environ.get('YATUBE_REPLICAS', 0)) + 1)]
+for alias in DATABASE_REPLICAS:
+    DATABASES[alias] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, f'db.{alias}.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+# Чтения каких представлений можно отдать реплике. Данные в ней
+# отстают от основной базы, и такие страницы могут попасть в кеш
+# страниц с опозданием на время репликации.
+REPLICA_VIEWS = (
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:follow_index',
+    'posts:*_fragment',
+    'admin:*_changelist',
+)
+REPLICA_PIN_SECONDS = 5
+REPLICA_PIN_COOKIE = 'read_primary_until'
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -94,17 +131,177 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+# Пользователи и сессии кешируются здесь. Если процессов несколько, кеш
+# должен быть общим (Memcached, Redis): иначе смену пароля, блокировку
+# или выход увидит только один процесс, а остальные будут пускать по
+# старым данным до USER_CACHE_TIMEOUT. Об этом предупреждает
+# manage.py check --deploy.
+USER_CACHE_ALIAS = 'default'
+USER_CACHE_TIMEOUT = 300
+
+# Сессии читаются из кеша и только при промахе из базы. Для полностью
+# бездисковых сессий можно указать
+# 'django.contrib.sessions.backends.signed_cookies'.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = USER_CACHE_ALIAS
+
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
 
 EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
 EMAIL_FILE_PATH = os.path.join(BASE_DIR, 'sent_emails')
+# Письма копятся в outbox и уходят пачками раз в EMAIL_BATCH_INTERVAL
+# секунд через одно соединение.
+EMAIL_BATCH_SIZE = 100
+EMAIL_BATCH_INTERVAL = 10
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_SENDING_TIMEOUT = 300
+
+# Новые посты подписок приходят одним письмом за окно.
+NOTIFICATION_DIGEST_INTERVAL = 60 * 60
+NOTIFICATION_DIGEST_SIZE = 10
+NOTIFICATION_BATCH_SIZE = 500
+SITE_URL = 'http://127.0.0.1:8000'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.backends.InstrumentedLocMemCache',
     }
 }
+
+PAGE_CACHE_TIMEOUT = 60
+PAGE_CACHE_VIEWS = (
+    'posts:index',
+    'posts:group_list',
+    'posts:profile',
+    'posts:post_detail',
+    'posts:popular',
+    'posts:group_popular',
+    'posts:tag_posts',
+    'posts:mentions',
+    'posts:index_fragment',
+    'posts:group_fragment',
+    'posts:profile_fragment',
+)
+
+# Поколения таблиц должны быть общими для всех процессов: в бою это
+# общий кеш, иначе check --deploy выдаст core.W001.
+QUERY_CACHE_ALIAS = 'default'
+QUERY_CACHE_TIMEOUT = 300
+QUERY_CACHE_MAX_ROWS = 100
+
+# Индексы в памяти процесса (граф подписок, похожие посты, дубликаты)
+# догоняют другие процессы по журналу изменений: процесс опрашивает его
+# не чаще раза в CHANGE_LOG_POLL_INTERVAL секунд и перечитывает только
+# изменённые ключи. Записи хранятся CHANGE_LOG_RETENTION секунд;
+# процесс, который дольше не опрашивал журнал или отстал больше чем на
+# CHANGE_LOG_MAX_KEYS ключей, перечитывает индекс целиком.
+CHANGE_LOG_POLL_INTERVAL = 1
+CHANGE_LOG_RETENTION = 60 * 60
+CHANGE_LOG_MAX_KEYS = 1000
+
+POPULARITY_HALF_LIFE = timedelta(hours=24)
+POPULAR_TOP_SIZE = 100
+POPULAR_TOP_TIMEOUT = 600
+
+VIEW_COUNTER_FLUSH_INTERVAL = 30
+VIEW_COUNTER_FLUSH_THRESHOLD = 100
+
+FOLLOW_SUGGESTIONS_COUNT = 20
+FOLLOW_SUGGESTIONS_SHOWN = 5
+
+RELATED_POSTS_COUNT = 5
+
+DUPLICATE_INDEX_SIZE = 10000
+DUPLICATE_MIN_SHINGLES = 20
+DUPLICATE_THRESHOLD = 0.8
+
+# Счётчики лимитов должны быть общими для всех процессов: в бою это
+# общий кеш, иначе check --deploy выдаст core.W002.
+RATE_LIMIT_CACHE_ALIAS = 'default'
+# Область: (число запросов, длина окна в секундах).
+RATE_LIMITS = {
+    'post_create': (20, 60),
+    'add_comment': (60, 60),
+    'follow': (120, 60),
+}
+
+# Доля запросов, которые профилируются без явного запроса.
+PROFILING_SAMPLE_RATE = 0
+PROFILING_SAMPLE_INTERVAL = 0.005
+PROFILING_QUERY_PARAM = '_profile'
+PROFILING_DIR = os.path.join(BASE_DIR, 'profiles')
+PROFILING_MAX_FILES = 50
+
+METRICS_ENABLED = True
+# Общий каталог для файлов метрик всех процессов одной машины:
+# завершившиеся процессы узнаются по PID.
+METRICS_DIR = os.environ.get('METRICS_DIR',
+                             os.path.join(BASE_DIR, 'metrics'))
+METRICS_FLUSH_INTERVAL = 5
+# /metrics отдаётся только с заголовком «Authorization: Bearer <токен>»;
+# без токена метрики закрыты.
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+THUMBNAIL_BACKEND = 'core.backends.InstrumentedThumbnailBackend'
+# Недостающие миниатюры создаёт воркер очереди (manage.py run_worker),
+# а до тех пор показывается исходная картинка.
+THUMBNAIL_ASYNC = False
+
+# Фоновые задачи. Без TASKS_EAGER их выполняет воркер
+# (manage.py run_worker), и пока он не запущен, не уходят даже письма
+# сброса пароля. TASKS_EAGER выполняет задачи сразу при постановке, без
+# воркера, в том числе отложенные.
+TASKS_EAGER = False
+TASKS_WORKER_THREADS = 4
+TASKS_POLL_INTERVAL = 1
+TASKS_VISIBILITY_TIMEOUT = 300
+TASKS_RETRY_BASE_DELAY = 10
+TASKS_RETRY_MAX_DELAY = 3600
+TASKS_RETENTION = 7 * 24 * 60 * 60
+
+# Фоновое удаление: строк за транзакцию и пачек за одну задачу.
+DELETION_BATCH_SIZE = 500
+DELETION_BATCHES_PER_TASK = 20
+
+# Замер времени каждого include и тега; заметно замедляет рендеринг.
+TEMPLATE_TIMING = False
+TEMPLATE_TIMING_HEADER_SIZE = 10
+
+# tracemalloc замедляет процесс, поэтому замеры памяти включаются явно.
+MEMORY_PROFILING = False
+MEMORY_PROFILING_SAMPLE_RATE = 0.01
+MEMORY_PROFILING_QUERY_PARAM = '_memory'
+MEMORY_PROFILING_FRAMES = 1
+MEMORY_PROFILING_TOP = 10
+MEMORY_PROFILING_DIR = os.path.join(BASE_DIR, 'memory_profiles')
+MEMORY_PROFILING_MAX_FILES = 200
+MEMORY_LEAK_WINDOW = 5
+MEMORY_LEAK_MIN_BYTES = 1024 * 1024
+
+# Дальше списки в админке показывают оценку числа строк.
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+# Запросы дольше стольких секунд пишутся в журнал; None отключает.
+SLOW_QUERY_THRESHOLD = 0.1
+# Каждый процесс пишет в свой файл рядом: slow_queries.<pid>.jsonl.
+SLOW_QUERY_LOG = os.path.join(BASE_DIR, 'logs', 'slow_queries.jsonl')
+SLOW_QUERY_LOG_MAX_BYTES = 10 * 1024 * 1024
+SLOW_QUERY_LOG_BACKUP_COUNT = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'core.template_timing': {'handlers': ['console'], 'level': 'INFO'},
+        'core.memory': {'handlers': ['console'], 'level': 'INFO'},
+        'core.taskqueue': {'handlers': ['console'], 'level': 'INFO'},
+        'core.outbox': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
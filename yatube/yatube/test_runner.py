@@ -0,0 +1,14 @@
+from django.test.runner import DiscoverRunner as BaseDiscoverRunner
+
+from posts.counters import view_counter
+
+
+class DiscoverRunner(BaseDiscoverRunner):
+    """Перед удалением тестовой базы выбрасывает просмотры, которые
+    тесты не записали: иначе их при выходе записал бы atexit, уже в
+    рабочую базу.
+    """
+
+    def teardown_databases(self, old_config, **kwargs):
+        view_counter.discard()
+        super().teardown_databases(old_config, **kwargs)